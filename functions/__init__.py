@@ -1,5 +1,13 @@
 from .weather import (
     getUltraSrtFcst,
+    prefetchForecasts,
+)
+from .grid import (
+    location_grid,
+    get_user_grids,
+)
+from .cache import (
+    forecast_cache,
 )
 from .remind import (
     register_medication_remind,
@@ -12,10 +20,40 @@ from .remind import (
 )
 from .emergency import (
     getHospBasisList,
+    refreshHospitalSnapshot,
+)
+from .hospital_index import (
+    hospital_index,
+)
+from .hospital_cache import (
+    hospital_detail_cache,
 )
 from .device import (
     send_message,
     call_contact,
     launch_specific_app,
-    openFontSizeSettings
+    openFontSizeSettings,
+)
+from .tools import (
+    tool_registry,
+)
+from .run_state import (
+    run_state_store,
+)
+from .run_queue import (
+    run_queue,
+)
+from .context import (
+    ToolContext,
+)
+from .memory import (
+    compact_conversations,
+)
+from .response_cache import (
+    response_cache,
+)
+from .device_command import (
+    DEVICE_COMMAND_FAST_PATH,
+    match_device_command,
+    run_device_command,
 )
\ No newline at end of file
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# 날씨 예보 캐시
+# 1차 : 프로세스 내 LRU (dict)
+# 2차 : 로컬 파일 (./weather_data), api 서버와 message.py 가 같이 사용함
+# 키 : (nx, ny, base_date, base_time), 만료 시간은 기상청 발표 주기(30분)에 맞춤
+FORECAST_INTERVAL = timedelta(minutes=30)
+# base_time 이후 api 에서 조회 가능해지기까지 걸리는 시간
+FORECAST_DELAY = timedelta(minutes=15)
+
+def forecastExpiry(base_datetime: datetime):
+    # 다음 발표분이 조회 가능해지는 시점에 만료, 다음 슬롯은 새로운 키를 사용함
+    return base_datetime + FORECAST_INTERVAL + FORECAST_DELAY
+
+class ForecastCache:
+    def __init__(self, cache_dir: str = './weather_data', max_entries: int = 1024, max_files: int = 10000):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _filename(self, key):
+        return os.path.join(self.cache_dir, "_".join(str(part) for part in key) + ".json")
+
+    def _remember(self, key, expires_at, value):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+
+        filepath = self._filename(key)
+        try:
+            with open(filepath, 'r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) <= now:
+            return None
+        self._remember(key, entry['expires_at'], entry['data'])
+        return entry['data']
+
+    def set(self, key, value, expires_at: datetime):
+        expires_at = expires_at.timestamp()
+        self._remember(key, expires_at, value)
+
+        # 다른 프로세스가 쓰는 도중의 파일을 읽지 않도록 임시파일에 쓴 뒤 교체
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump({'expires_at': expires_at, 'data': value}, file, ensure_ascii=False)
+            os.replace(tmp_path, self._filename(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def get_or_load(self, key, loader, expires_at: datetime):
+        """
+        캐시에 없으면 await loader() 결과를 저장 후 반환
+        같은 키로 동시에 들어온 요청은 하나만 loader 를 실행하고 나머지는 그 결과를 기다림
+        loader 가 None 을 반환하면 캐시하지 않음
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            if value is not None:
+                self.set(key, value, expires_at)
+            return value
+        finally:
+            if not future.done():
+                future.set_result(value)
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def evict_expired(self):
+        """
+        만료된 캐시 파일 삭제, 파일 수가 max_files 를 넘으면 오래된 순서로 삭제
+        반환 : 삭제한 파일 수
+        """
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (expires_at, _) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+
+        if not os.path.isdir(self.cache_dir):
+            return 0
+
+        removed = 0
+        remaining = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            try:
+                if entry.name.endswith('.json'):
+                    try:
+                        with open(entry.path, 'r', encoding='utf-8') as file:
+                            expires_at = json.load(file).get('expires_at', 0)
+                    except ValueError:
+                        expires_at = 0
+                else:
+                    # 이전 형식(.xml) 캐시 및 남겨진 임시파일
+                    expires_at = entry.stat().st_mtime + (FORECAST_INTERVAL + FORECAST_DELAY).total_seconds()
+                if expires_at <= now:
+                    os.remove(entry.path)
+                    removed += 1
+                else:
+                    remaining.append((entry.stat().st_mtime, entry.path))
+            except OSError:
+                continue
+
+        if len(remaining) > self.max_files:
+            remaining.sort()
+            for _, path in remaining[:len(remaining) - self.max_files]:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
+
+forecast_cache = ForecastCache()
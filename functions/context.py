@@ -0,0 +1,36 @@
+from sqlalchemy.orm import Session
+from models import User, AssistantThread, UserSchedule
+
+SCHEDULE_FIELDS = ("morning_time", "breakfast_time", "lunch_time", "dinner_time", "bedtime_time")
+
+# run 마다 한번만 조회하는 사용자 정보, 모든 tool 에 전달됨
+# 동기 tool 은 다른 스레드의 별도 세션에서 실행되므로 ORM 객체 대신 값만 담아둠
+class ToolContext:
+    def __init__(self, thread_id: str, user_id: int = None, latitude: float = None, longitude: float = None,
+                 fcm_token: str = None, schedule: dict = None):
+        self.thread_id = thread_id
+        self.user_id = user_id
+        self.latitude = latitude
+        self.longitude = longitude
+        self.fcm_token = fcm_token
+        self.schedule = schedule
+
+    @classmethod
+    def load(cls, db: Session, thread_id: str, user: User = None):
+        """
+        user 가 주어지면 (엔드포인트에서 이미 조회한 경우) 스레드 조인 없이 사용
+        """
+        if user is None:
+            user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
+        if user is None:
+            return cls(thread_id)
+
+        schedule = db.query(UserSchedule).filter(UserSchedule.user_id == user.user_id).first()
+        return cls(
+            thread_id=thread_id,
+            user_id=user.user_id,
+            latitude=user.latitude,
+            longitude=user.longitude,
+            fcm_token=user.fcm_token,
+            schedule={field: getattr(schedule, field) for field in SCHEDULE_FIELDS} if schedule else None
+        )
@@ -1,16 +1,27 @@
 from firebase_admin import credentials, messaging, initialize_app
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from models import User, AssistantThread
+from .tools import tool
+from .context import ToolContext
 
 cred = credentials.Certificate("fcm_key.json")
 initialize_app(cred)
 
-def openFontSizeSettings(db: Session, thread_id):
+# 실행할 수 있는 앱 이름 -> 패키지 이름
+APP_PACKAGES = {
+    "카카오톡": "com.kakao.talk",
+    "카메라": "com.sec.android.app.camera",
+    "문자": "com.samsung.android.messaging",
+    "전화": "com.samsung.android.dialer",
+    "사진첩": "com.sec.android.gallery3d",
+    "갤러리": "com.sec.android.gallery3d",
+    "네이버밴드": "com.nhn.android.band"
+}
+
+@tool(description="휴대폰의 글자 크기 설정 화면을 엽니다.", concurrency="device")
+def openFontSizeSettings(db: Session, context: ToolContext):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-
-        if user.fcm_token is None:
+        if context.fcm_token is None:
             return {"status": "failed", "message": "User has no FCM token"}
         
         data = messaging.Message(
@@ -22,7 +33,7 @@ def openFontSizeSettings(db: Session, thread_id):
             android=messaging.AndroidConfig(
                 direct_boot_ok=True,
             ),
-            token = user.fcm_token,
+            token = context.fcm_token,
         )
         response = messaging.send(data)
 
@@ -36,11 +47,10 @@ def openFontSizeSettings(db: Session, thread_id):
         db.rollback()
         return {"status": "failed", "message": f"예상치 못한 오류가 발생했습니다: {str(e)}"}
 
-def send_message(db: Session, thread_id, contact_name: str, content: str):
+@tool(description="연락처에 문자 메세지를 보냅니다.", concurrency="device")
+def send_message(db: Session, context: ToolContext, contact_name: str, content: str):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-
-        if user.fcm_token is None:
+        if context.fcm_token is None:
             return {"status": "failed", "message": "User has no FCM token"}
         
         data = messaging.Message(
@@ -52,7 +62,7 @@ def send_message(db: Session, thread_id, contact_name: str, content: str):
             android=messaging.AndroidConfig(
                 direct_boot_ok=True,
             ),
-            token = user.fcm_token,
+            token = context.fcm_token,
         )
         response = messaging.send(data)
 
@@ -67,11 +77,10 @@ def send_message(db: Session, thread_id, contact_name: str, content: str):
         return {"status": "failed", "message": f"예상치 못한 오류가 발생했습니다: {str(e)}"}
 
 
-def call_contact(db: Session, thread_id, contact_name: str):
+@tool(description="연락처에 전화를 겁니다.", concurrency="device")
+def call_contact(db: Session, context: ToolContext, contact_name: str):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-
-        if user.fcm_token is None:
+        if context.fcm_token is None:
             return {"status": "failed", "message": "User has no FCM token"}
         
         data = messaging.Message(
@@ -83,7 +92,7 @@ def call_contact(db: Session, thread_id, contact_name: str):
             android=messaging.AndroidConfig(
                 direct_boot_ok=True,
             ),
-            token = user.fcm_token,
+            token = context.fcm_token,
         )
         response = messaging.send(data)
 
@@ -99,36 +108,25 @@ def call_contact(db: Session, thread_id, contact_name: str):
     
     
 
-def launch_specific_app(db: Session, thread_id, app_name: str, activity_name: str=None):
+@tool(description="휴대폰의 앱을 실행합니다.", concurrency="device")
+def launch_specific_app(db: Session, context: ToolContext, app_name: str, activity_name: str=None):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-
-        if user.fcm_token is None:
+        if context.fcm_token is None:
             return {"status": "error", "message": "User has no FCM token"}
 
-        if app_name not in app_name_mapping:
+        if app_name not in APP_PACKAGES:
             return {"status": "error", "message": "App not found"}
 
-        app_name_mapping = {
-            "카카오톡": "com.kakao.talk",
-            "카메라": "com.sec.android.app.camera",
-            "문자": "com.samsung.android.messaging",
-            "전화": "com.samsung.android.dialer",
-            "사진첩": "com.sec.android.gallery3d",
-            "갤러리": "com.sec.android.gallery3d",
-            "네이버밴드": "com.nhn.android.band"
-        }
-
         data = messaging.Message(
             data={
                 'type': 'launchSpecificApp',
-                'title': app_name_mapping[app_name],
+                'title': APP_PACKAGES[app_name],
                 'body': activity_name if activity_name else 'none',
             },
             android=messaging.AndroidConfig(
                 direct_boot_ok=True,
             ),
-            token = user.fcm_token,
+            token = context.fcm_token,
         )
         response = messaging.send(data)
 
@@ -0,0 +1,83 @@
+import re
+from sqlalchemy.orm import Session
+from utils.config import variables
+from .tools import tool_registry
+from .context import ToolContext
+from .device import APP_PACKAGES
+
+# 기기 제어 명령 빠른 처리
+# "글씨 크게 해줘", "카톡 열어줘", "아들한테 전화해줘" 처럼 확실한 명령은 assistant run 없이 규칙으로 찾아서
+# 바로 FCM 을 보내고 정해진 확인 문구로 답변함
+# 질문이나 부정 표현이 섞이거나, 다른 요청이 이어지는 등 애매한 문장은 기존처럼 모델이 처리함
+DEVICE_COMMAND_FAST_PATH = getattr(variables, 'DEVICE_COMMAND_FAST_PATH', False)
+MAX_COMMAND_LENGTH = 30
+
+APP_ALIASES = {
+    "카톡": "카카오톡",
+    "밴드": "네이버밴드",
+    "사진": "사진첩",
+}
+LAUNCH_VERBS = ("열어", "켜", "실행", "틀어")
+FONT_TARGETS = ("글씨", "글자")
+FONT_VERBS = ("크게", "작게", "키워", "줄여", "바꿔", "조절", "설정")
+# 모델에게 넘겨야 하는 표현 (질문, 부정, 지난 일이나 나중 일)
+UNSURE_WORDS = ("?", "어떻게", "왜", "방법", "할까", "말까", "하지마", "하지 마", "말고", "안 ", "못 ",
+                "누구", "어디", "언제", "뭐", "무슨", "어제", "아까", "내일", "나중", "이따", "했")
+# 인용("~라고", "~다고") 이 들어간 문장은 다른 사람에게 전하는 말일 수 있음
+QUOTATIVE_WORDS = ("라고", "다고")
+# "날씨 알려주고 카톡 켜줘", "사진첩 열어서 보여줘" 처럼 앞에 다른 요청이 이어지는 어절
+CONNECTIVE_ENDING = re.compile(r"(고|서|면|는데|지만)$")
+ADDRESS_PATTERN = re.compile(r"^(애비야|애비)\s*")
+# 이름은 띄어쓰기 없는 한 어절만 허용
+CALL_PATTERN = re.compile(r"^(?:(?:우리|내|제)\s+)?(?P<name>[가-힣A-Za-z0-9]{1,10})\s*(?:에게|한테|께)\s*전화\s*(?:를\s*)?(?:좀\s*)?(?:걸어|해|연결해)(?:줘|주세요|줄래)$")
+# 부탁하는 말로 끝나는 명령 동사만 처리 ("카톡 켜" 처럼 끝이 애매한 문장은 모델이 처리)
+COMMAND_ENDING = re.compile(r"(해|열어|켜|실행해|틀어|키워|줄여|바꿔)(줘|주세요|줄래|봐)$")
+
+FAILED_REPLY = "죄송해요. 휴대폰에 명령을 보내지 못했어요. 잠시 후 다시 말씀해주세요."
+
+def has_final_consonant(word: str):
+    code = ord(word[-1]) - 0xAC00
+    return 0 <= code < 11172 and code % 28 != 0
+
+def match_device_command(text: str):
+    """
+    반환 : (tool 이름, 인자, 확인 문구), 확실한 명령이 아니면 None
+    """
+    text = ADDRESS_PATTERN.sub("", text.strip()).rstrip(".! ")
+    if not text or len(text) > MAX_COMMAND_LENGTH or any(word in text for word in UNSURE_WORDS):
+        return None
+    if any(word in text.replace(" ", "") for word in QUOTATIVE_WORDS):
+        return None
+    if any(CONNECTIVE_ENDING.search(word) for word in text.split()[:-1]):
+        return None
+
+    match = CALL_PATTERN.match(text)
+    if match:
+        name = match.group("name").strip()
+        return "call_contact", {"contact_name": name}, f"{name}에게 전화를 걸어드릴게요."
+
+    compact = text.replace(" ", "")
+    if not COMMAND_ENDING.search(compact):
+        return None
+    if any(target in compact for target in FONT_TARGETS) and any(verb in compact for verb in FONT_VERBS):
+        return "openFontSizeSettings", {}, "글자 크기 설정 화면을 열어드렸어요. 원하시는 크기로 바꿔보세요."
+
+    if any(verb in compact for verb in LAUNCH_VERBS):
+        names = [name for name in APP_PACKAGES if name in compact]
+        names += [APP_ALIASES[alias] for alias in APP_ALIASES if alias in compact and APP_ALIASES[alias] not in names]
+        # 앱 이름이 여러 개면 어떤 앱인지 확실하지 않음
+        if len(set(names)) == 1:
+            app_name = names[0]
+            return "launch_specific_app", {"app_name": app_name}, f"{app_name}{'을' if has_final_consonant(app_name) else '를'} 열어드릴게요."
+    return None
+
+async def run_device_command(db: Session, context: ToolContext, command):
+    """
+    명령의 tool 을 실행하고 사용자에게 보낼 답변 반환
+    """
+    name, arguments, reply = command
+    result = await tool_registry.call(name, db, context, arguments)
+    if not isinstance(result, dict) or result.get("status") != "success":
+        print(f"Device command {name} failed: {result}")
+        return FAILED_REPLY
+    return reply
@@ -1,11 +1,65 @@
-import os, json, requests
-import xmltodict
+import asyncio
+import xml.etree.ElementTree as ET
+import httpx
 from sqlalchemy.orm import Session
-from models import User, AssistantThread
 from utils.config import variables
+from .http_client import AsyncHttpClient
+from .hospital_cache import hospital_detail_cache
+from .hospital_index import hospital_index
+from .tools import tool
+from .context import ToolContext
 
 service_key = variables.KDATA_KEY
 
+# 병원 상세정보 조회는 병원마다 3건씩 동시에 호출, 전체 동시 호출 수는 DETAIL_CONCURRENCY 로 제한
+# 상세정보는 hospital_detail_cache 에 ykiho 기준으로 저장됨
+DETAIL_CONCURRENCY = 10
+hira_client = AsyncHttpClient(base_url='https://apis.data.go.kr/B551182', timeout=5.0, retries=1)
+
+# 로컬 검색 모드 : 진료과목별 병원 목록 스냅샷으로 주변 병원을 찾고, 스냅샷이 없거나 오래되면 원격 api 사용
+HOSPITAL_LOCAL_SEARCH = getattr(variables, 'HOSPITAL_LOCAL_SEARCH', False)
+SNAPSHOT_PAGE_SIZE = 1000
+SNAPSHOT_MAX_PAGES = 200
+_snapshot_refreshing = {}
+
+class HiraError(Exception):
+    pass
+
+def parseHiraItems(content: bytes, schema: dict):
+    """
+    HIRA api 응답의 <item> 들을 dict 리스트로 변환
+    item 이 하나여도 항상 리스트로 반환, schema({필드명: 변환함수}) 에 있는 필드만 꺼냄
+    정상 응답(resultCode 00)이 아니면 HiraError
+    """
+    root = ET.fromstring(content)
+    # 인증키, 트래픽 초과 오류는 HTTP 200 + OpenAPI_ServiceResponse 로 옴
+    if root.tag != 'response':
+        raise HiraError(f"{root.findtext('.//returnReasonCode')} {root.findtext('.//returnAuthMsg') or root.findtext('.//errMsg')}")
+    result_code = root.findtext('header/resultCode')
+    if result_code not in ('00', '0000'):
+        raise HiraError(f"{result_code} {root.findtext('header/resultMsg')}")
+    items = root.find('body/items')
+    if items is None:
+        return []
+    records = []
+    for item in items.iterfind('item'):
+        record = {}
+        for field in item:
+            convert = schema.get(field.tag)
+            if convert is not None:
+                record[field.tag] = convert(field.text) if field.text is not None else None
+        records.append(record)
+    return records
+
+def decodeHiraResponse(response: httpx.Response, schema: dict):
+    """
+    HTTP 상태와 resultCode 를 확인하고 item 리스트 반환
+    실패한 응답은 HiraError 로 올려서 상세정보 캐시에 저장되지 않게 함
+    """
+    if response.status_code != 200:
+        raise HiraError(f"API request failed with status {response.status_code}")
+    return parseHiraItems(response.content, schema)
+
 def returnFormat(status, message, data=None):
     return {
         "status" : status,
@@ -41,26 +95,40 @@ day_mapping = {
     'Sun': '일요일'
 }
 
+# 응답에서 사용하는 필드만 정의
+DtInfo_schema = {
+    **{key: str for key in DtInfo_mapping},
+    **{f'trmt{day}{suffix}': str for day in day_mapping for suffix in ('Start', 'End')},
+    'plcNm': str,
+    'plcDir': str,
+    'plcDist': str,
+}
+SpclDiagInfo_schema = {'srchCdNm': str}
+TrnsprtInfo_schema = {key: str for key in ('lineNo', 'trafNm', 'arivPlc', 'dir', 'dist')}
+HospBasis_schema = {
+    'yadmNm': str,
+    'addr': str,
+    'clCdNm': str,
+    'telno': str,
+    'distance': float,
+    'drTotCnt': int,
+    'XPos': str,
+    'YPos': str,
+    'ykiho': str,
+}
+
 
-def getDtInfo(hospCode):
-    url = 'https://apis.data.go.kr/B551182/MadmDtlInfoService2.7/getDtlInfo2.7'
+async def getDtInfo(hospCode, client: AsyncHttpClient = None):
+    client = client or hira_client
     params = {
         'serviceKey': service_key,
         'ykiho': hospCode,
     }
-    response = requests.get(url, params=params)
-    dict_x = xmltodict.parse(response.content)
-    json_x = json.loads(json.dumps(dict_x))
-
-    if (
-        'response' in json_x and
-        'body' in json_x['response'] and
-        'items' in json_x['response']['body'] and
-        json_x['response']['body']['items'] is not None
-    ):
-        items = json_x['response']['body']['items'].get('item', [])
-    else:
+    response = await client.get('/MadmDtlInfoService2.7/getDtlInfo2.7', params=params)
+    items = decodeHiraResponse(response, DtInfo_schema)
+    if not items:
         return []
+    items = items[0]
 
     results = {DtInfo_mapping.get(key, key): value for key, value in items.items() if key in DtInfo_mapping}
 
@@ -75,25 +143,14 @@ def getDtInfo(hospCode):
 
     return results
 
-def getSpclDiagInfo(hospCode):
-    url = 'https://apis.data.go.kr/B551182/MadmDtlInfoService2.7/getSpclDiagInfo2.7'
+async def getSpclDiagInfo(hospCode, client: AsyncHttpClient = None):
+    client = client or hira_client
     params = {
         'serviceKey': service_key,
         'ykiho': hospCode,
     }
-    response = requests.get(url, params=params)
-    dict_x = xmltodict.parse(response.content)
-    json_x = json.loads(json.dumps(dict_x))
-
-    if (
-        'response' in json_x and
-        'body' in json_x['response'] and
-        'items' in json_x['response']['body'] and
-        json_x['response']['body']['items'] is not None
-    ):
-        items = json_x['response']['body']['items'].get('item', [])
-    else:
-        return []
+    response = await client.get('/MadmDtlInfoService2.7/getSpclDiagInfo2.7', params=params)
+    items = decodeHiraResponse(response, SpclDiagInfo_schema)
     result = [
         {
             'srchCdNm': item['srchCdNm'],
@@ -101,69 +158,94 @@ def getSpclDiagInfo(hospCode):
         ]
     return result
 
-def getTrnsprtInfo(hospCode):
-    url = 'https://apis.data.go.kr/B551182/MadmDtlInfoService2.7/getTrnsprtInfo2.7'
+async def getTrnsprtInfo(hospCode, client: AsyncHttpClient = None):
+    client = client or hira_client
     params = {
         'serviceKey': service_key,
         'ykiho': hospCode,
     }
-    response = requests.get(url, params=params)
-    dict_x = xmltodict.parse(response.content)
-    json_x = json.loads(json.dumps(dict_x))
-
-    if (
-        'response' in json_x and
-        'body' in json_x['response'] and
-        'items' in json_x['response']['body'] and
-        json_x['response']['body']['items'] is not None
-    ):
-        items = json_x['response']['body']['items'].get('item', [])
-    else:
-        return []
+    response = await client.get('/MadmDtlInfoService2.7/getTrnsprtInfo2.7', params=params)
+    items = decodeHiraResponse(response, TrnsprtInfo_schema)
 
     result = [
         f"{item.get('lineNo', '정보 없음')} {item.get('trafNm', '정보 없음')} {item.get('arivPlc', '정보 없음')}에서 {item.get('dir', '정보 없음')} 병원까지의 거리: {item.get('dist', '정보 없음')}"
-        for item in items if isinstance(item, dict)
+        for item in items
     ]
     
     return result
 
-def getHospBasisList(dgsbjtCd, radius=30000, thread_id = None, db: Session = None):
-    user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-    
-    if user is None or user.latitude is None or user.longitude is None:
+async def refreshHospitalSnapshot(dgsbjtCd, client: AsyncHttpClient = None):
+    """
+    진료과목의 전국 병원 목록을 페이지 단위로 모두 받아 스냅샷 교체
+    반환 : 병원 수
+    """
+    client = client or hira_client
+    records = []
+    for page in range(1, SNAPSHOT_MAX_PAGES + 1):
+        params = {
+            'serviceKey': service_key,
+            'pageNo': page,
+            'numOfRows': SNAPSHOT_PAGE_SIZE,
+            'dgsbjtCd': dgsbjtCd,
+        }
+        response = await client.get('/hospInfoServicev2/getHospBasisList', params=params, timeout=30.0)
+        items = decodeHiraResponse(response, HospBasis_schema)
+        records.extend(items)
+        if len(items) < SNAPSHOT_PAGE_SIZE:
+            break
+    hospital_index.replace(dgsbjtCd, records)
+    return len(records)
+
+def scheduleHospitalSnapshotRefresh(dgsbjtCd):
+    # 요청 처리와 별개로 백그라운드에서 스냅샷 갱신, 진료과목당 하나만 실행
+    if dgsbjtCd in _snapshot_refreshing:
+        return
+    task = asyncio.ensure_future(refreshHospitalSnapshot(dgsbjtCd))
+    _snapshot_refreshing[dgsbjtCd] = task
+
+    def done(task):
+        _snapshot_refreshing.pop(dgsbjtCd, None)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Failed to refresh hospital snapshot {dgsbjtCd}: {task.exception()}")
+    task.add_done_callback(done)
+
+@tool(description="사용자 주변에서 진료과목(dgsbjtCd)에 맞는 병원을 찾습니다. radius 는 미터 단위입니다.", timeout=20.0, cacheable=True, cache_ttl=600)
+async def getHospBasisList(dgsbjtCd, radius=30000, context: ToolContext = None, db: Session = None):
+    if context.latitude is None or context.longitude is None:
         return returnFormat("105", "사용자 위치 정보가 없습니다.")
     
-    url = 'http://apis.data.go.kr/B551182/hospInfoServicev2/getHospBasisList'
-    params = {
-        'serviceKey': service_key,
-        'pageNo': 1,
-        'numOfRows': 10,
-        'zipCd': '', # 분류코드
-        'clCd': '', # 종별코드
-        'dgsbjtCd': dgsbjtCd,
-        'xPos': user.longitude,
-        'yPos': user.latitude,
-        'radius': radius
-    }
-    response = requests.get(url, params=params)
+    items = None
+    if HOSPITAL_LOCAL_SEARCH:
+        items = hospital_index.search(dgsbjtCd, context.latitude, context.longitude, radius=radius, k=10)
+        if items is None:
+            scheduleHospitalSnapshotRefresh(dgsbjtCd)
 
-    if response.status_code != 200:
-        return returnFormat("103", f"API request failed with status {response.status_code}")
+    if items is None:
+        params = {
+            'serviceKey': service_key,
+            'pageNo': 1,
+            'numOfRows': 10,
+            'zipCd': '', # 분류코드
+            'clCd': '', # 종별코드
+            'dgsbjtCd': dgsbjtCd,
+            'xPos': context.longitude,
+            'yPos': context.latitude,
+            'radius': radius
+        }
+        try:
+            response = await hira_client.get('/hospInfoServicev2/getHospBasisList', params=params)
+        except httpx.TransportError as e:
+            return returnFormat("103", f"API request failed: {str(e)}")
+        try:
+            items = decodeHiraResponse(response, HospBasis_schema)
+        except HiraError as e:
+            return returnFormat("103", str(e))
+        except ET.ParseError as e:
+            return returnFormat("102", f"Failed to parse XML response: {str(e)}")
     try:
-        dict_x = xmltodict.parse(response.content)
-        json_x = json.loads(json.dumps(dict_x))
-
-        if (
-            'response' in json_x and
-            'body' in json_x['response'] and
-            'items' in json_x['response']['body'] and
-            json_x['response']['body']['items'] is not None
-        ):
-            items = json_x['response']['body']['items'].get('item', [])
-        else:
+        if not items:
             return []
-        
+
         result = sorted(
             [
                 {
@@ -171,8 +253,8 @@ def getHospBasisList(dgsbjtCd, radius=30000, thread_id = None, db: Session = Non
                     '주소': item['addr'],
                     '유형명': item['clCdNm'],
                     '전화번호': item['telno'],
-                    '거리': round(float(item['distance'])),
-                    '전체의사수': int(item['drTotCnt']),
+                    '거리': round(item['distance']),
+                    '전체의사수': item['drTotCnt'],
                     'XPos': item['XPos'],
                     'YPos': item['YPos'],
                     '병원코드': item['ykiho']
@@ -182,21 +264,41 @@ def getHospBasisList(dgsbjtCd, radius=30000, thread_id = None, db: Session = Non
             key=lambda x: x['거리']
         )
 
-        for hospital in result:
-            hosp_code = hospital.pop('병원코드', None)
+        # 상세 정보, 특수진단 정보, 교통 정보를 모든 병원에 대해 동시에 조회
+        # 실패하거나 시간 초과된 항목은 비워두고 나머지 결과만 반환
+        semaphore = asyncio.Semaphore(DETAIL_CONCURRENCY)
+
+        async def fetch(func, hosp_code):
+            async with semaphore:
+                return await func(hosp_code)
+
+        async def fetch_cached(func, hosp_code):
+            # 캐시에 있으면 호출하지 않음
+            return await hospital_detail_cache.get_or_fetch(hosp_code, func.__name__, lambda code: fetch(func, code))
+
+        hosp_codes = [hospital.pop('병원코드', None) for hospital in result]
+        details = await asyncio.gather(*[
+            fetch_cached(func, hosp_code)
+            for hosp_code in hosp_codes
+            for func in (getDtInfo, getSpclDiagInfo, getTrnsprtInfo)
+        ], return_exceptions=True)
+
+        for i, hospital in enumerate(result):
+            detail_info, special_diag_info, trnsprt_info = details[i * 3:i * 3 + 3]
 
             # 상세 정보
-            detail_info = getDtInfo(hosp_code)
-            hospital.update(detail_info)
+            if isinstance(detail_info, dict):
+                hospital.update(detail_info)
 
             # 특수진단 정보
-            special_diag_info = getSpclDiagInfo(hosp_code)
-            hospital['특수진단정보'] = [info['srchCdNm'] for info in special_diag_info]
+            if isinstance(special_diag_info, list):
+                hospital['특수진단정보'] = [info['srchCdNm'] for info in special_diag_info]
+            else:
+                hospital['특수진단정보'] = []
 
             # 교통
-            trnsprt_info = getTrnsprtInfo(hosp_code)
-            hospital['교통정보'] = trnsprt_info
-            
+            hospital['교통정보'] = trnsprt_info if isinstance(trnsprt_info, list) else []
+
         return returnFormat("00", "NORMAL_SERVICE", result)
     
     except Exception as e:
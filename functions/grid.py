@@ -0,0 +1,166 @@
+import sqlite3
+import threading
+import numpy as np
+from datetime import datetime
+from sqlalchemy.orm import Session
+from models import User
+
+# 기상청 격자(nx, ny) 조회용 인메모리 공간 인덱스
+# location_grid.db 를 매 호출마다 전체 조회하지 않고, 최초 1회만 읽어서
+# 위경도를 BUCKET_SIZE 크기의 버킷으로 나눠 근처 버킷만 검사함
+EARTH_RADIUS = 6371.0
+BUCKET_SIZE = 0.1 # degree
+KM_PER_DEGREE = np.pi * EARTH_RADIUS / 180.0
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Haversine 공식을 이용한 거리 계산 (스칼라, 배열 모두 가능)
+    lat1_rad, lon1_rad = np.radians(lat1), np.radians(lon1)
+    lat2_rad, lon2_rad = np.radians(lat2), np.radians(lon2)
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+    a = np.sin(dlat / 2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS * c
+
+def _unit_vectors(latitudes, longitudes):
+    lat_rad = np.radians(latitudes)
+    lon_rad = np.radians(longitudes)
+    return np.stack([
+        np.cos(lat_rad) * np.cos(lon_rad),
+        np.cos(lat_rad) * np.sin(lon_rad),
+        np.sin(lat_rad)
+    ], axis=-1)
+
+class LocationGridIndex:
+    def __init__(self, db_path: str = 'database/location_grid.db', bucket_size: float = BUCKET_SIZE):
+        self.db_path = db_path
+        self.bucket_size = bucket_size
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            conn = sqlite3.connect(self.db_path)
+            try:
+                rows = conn.execute("SELECT x, y, latitude_s_per_100, longitude_s_per_100 FROM location_grid").fetchall()
+            finally:
+                conn.close()
+            rows = [row for row in rows if row[2] is not None and row[3] is not None]
+
+            self.x = np.array([row[0] for row in rows], dtype=np.int64)
+            self.y = np.array([row[1] for row in rows], dtype=np.int64)
+            self.lat = np.array([row[2] for row in rows], dtype=np.float64)
+            self.lon = np.array([row[3] for row in rows], dtype=np.float64)
+
+            # 버킷 -> 행 번호 목록 (행 번호는 DB 조회 순서를 유지)
+            self.buckets = {}
+            for i, key in enumerate(zip(self._bucket(self.lat).tolist(), self._bucket(self.lon).tolist())):
+                self.buckets.setdefault(key, []).append(i)
+            self.buckets = {key: np.array(idx, dtype=np.int64) for key, idx in self.buckets.items()}
+
+            self.max_abs_lat = float(np.max(np.abs(self.lat)))
+            self.max_ring = max(
+                int(np.ptp(self.lat) / self.bucket_size),
+                int(np.ptp(self.lon) / self.bucket_size)
+            ) + 1
+            self._loaded = True
+
+    def _bucket(self, value):
+        return np.floor(np.asarray(value) / self.bucket_size).astype(np.int64)
+
+    def _ring(self, lat_b, lon_b, ring):
+        if ring == 0:
+            keys = [(lat_b, lon_b)]
+        else:
+            keys = []
+            for d in range(-ring, ring + 1):
+                keys.extend([(lat_b - ring, lon_b + d), (lat_b + ring, lon_b + d)])
+            for d in range(-ring + 1, ring):
+                keys.extend([(lat_b + d, lon_b - ring), (lat_b + d, lon_b + ring)])
+        return [self.buckets[key] for key in keys if key in self.buckets]
+
+    def _brute_force(self, latitude, longitude):
+        distances = haversine(latitude, longitude, self.lat, self.lon)
+        i = int(np.argmin(distances))
+        return i, float(distances[i])
+
+    def nearest(self, latitude: float, longitude: float):
+        """
+        위경도에서 가장 가까운 격자 (nx, ny) 반환
+        """
+        if not self._loaded:
+            self._load()
+
+        lat_b = int(self._bucket(latitude))
+        lon_b = int(self._bucket(longitude))
+        best_i, best_dist = None, float('inf')
+
+        # 경도 1칸의 최소 거리는 가장 높은 위도에서 결정됨 (구면 오차 여유 1%)
+        max_lat = min(max(self.max_abs_lat, abs(latitude)) + self.bucket_size, 89.0)
+        cell_km = 0.99 * self.bucket_size * KM_PER_DEGREE * np.cos(np.radians(max_lat))
+
+        for ring in range(self.max_ring + 1):
+            # ring 칸 떨어진 버킷의 점은 최소 (ring - 1) 칸 만큼 떨어져있음
+            if best_i is not None and (ring - 1) * cell_km > best_dist:
+                break
+            candidates = self._ring(lat_b, lon_b, ring)
+            if not candidates:
+                continue
+            idx = np.concatenate(candidates)
+            distances = haversine(latitude, longitude, self.lat[idx], self.lon[idx])
+            # 전체 조회 시 먼저 나온 행이 선택되던 동작을 유지
+            for i, dist in zip(idx.tolist(), distances.tolist()):
+                if dist < best_dist or (dist == best_dist and i < best_i):
+                    best_i, best_dist = i, dist
+        else:
+            best_i = None
+
+        if best_i is None:
+            # 인덱스 범위 밖 (한반도 밖 좌표 등)
+            best_i, _ = self._brute_force(latitude, longitude)
+
+        return int(self.x[best_i]), int(self.y[best_i])
+
+    def nearest_many(self, latitudes, longitudes, chunk_size: int = 1024):
+        """
+        여러 위경도를 한번에 격자 (nx, ny) 배열로 변환
+        chunk_size 단위로 전체 격자와 거리를 비교함
+        """
+        if not self._loaded:
+            self._load()
+
+        latitudes = np.asarray(latitudes, dtype=np.float64).reshape(-1)
+        longitudes = np.asarray(longitudes, dtype=np.float64).reshape(-1)
+        nearest_idx = np.empty(latitudes.shape[0], dtype=np.int64)
+
+        # 구면 위 단위벡터의 내적이 클수록 대원거리가 짧으므로 행렬곱 한번으로 비교
+        points = _unit_vectors(self.lat, self.lon).T
+        queries = _unit_vectors(latitudes, longitudes)
+        for start in range(0, queries.shape[0], chunk_size):
+            nearest_idx[start:start + chunk_size] = np.argmax(queries[start:start + chunk_size] @ points, axis=1)
+
+        return self.x[nearest_idx], self.y[nearest_idx]
+
+location_grid = LocationGridIndex()
+
+def get_user_grids(db: Session, since: datetime = None):
+    """
+    위치 정보가 있는 사용자 전체를 한번에 격자로 변환
+    since 가 주어지면 그 이후 위치를 갱신한 사용자만 조회
+    반환 : {user_id: (nx, ny)}
+    """
+    query = db.query(User.user_id, User.latitude, User.longitude).filter(
+        User.latitude.isnot(None),
+        User.longitude.isnot(None)
+    )
+    if since is not None:
+        query = query.filter(User.last_update_location >= since)
+    rows = query.all()
+    if not rows:
+        return {}
+
+    user_ids = [row[0] for row in rows]
+    nx, ny = location_grid.nearest_many([row[1] for row in rows], [row[2] for row in rows])
+    return {user_id: (int(x), int(y)) for user_id, x, y in zip(user_ids, nx.tolist(), ny.tolist())}
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+# 병원 상세정보 캐시 (ykiho 기준)
+# 진료시간, 특수진단, 교통정보는 거의 바뀌지 않으므로 로컬 sqlite 에 저장해두고
+# ttl 이 지나기 전까지는 api 를 호출하지 않음, refresh_after 가 지난 항목은 응답 후 백그라운드에서 갱신
+class HospitalDetailCache:
+    def __init__(self, db_path: str = 'database/hospital_detail.db',
+                 ttl: timedelta = timedelta(days=7), refresh_after: timedelta = timedelta(days=1)):
+        self.db_path = db_path
+        self.ttl = ttl.total_seconds()
+        self.refresh_after = refresh_after.total_seconds()
+        self._conn = None
+        self._lock = threading.Lock()
+        self._refreshing = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def _get_conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hospital_detail ("
+                "ykiho TEXT NOT NULL, kind TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (ykiho, kind))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, ykiho: str, kind: str):
+        """
+        반환 : (data, 저장 후 경과 시간(초)) 또는 None
+        """
+        with self._lock:
+            row = self._get_conn().execute(
+                "SELECT data, updated_at FROM hospital_detail WHERE ykiho = ? AND kind = ?", (ykiho, kind)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def set(self, ykiho: str, kind: str, data):
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO hospital_detail (ykiho, kind, data, updated_at) VALUES (?, ?, ?, ?)",
+                (ykiho, kind, json.dumps(data, ensure_ascii=False), time.time())
+            )
+            conn.commit()
+
+    async def _refresh(self, ykiho: str, kind: str, fetch):
+        try:
+            self.set(ykiho, kind, await fetch(ykiho))
+            self.refreshes += 1
+        except Exception:
+            self.errors += 1
+        finally:
+            self._refreshing.pop((ykiho, kind), None)
+
+    async def get_or_fetch(self, ykiho: str, kind: str, fetch):
+        """
+        캐시에 있으면 반환, 없거나 ttl 이 지났으면 await fetch(ykiho) 결과를 저장 후 반환
+        fetch 에서 발생한 예외는 그대로 전달하고 저장하지 않음
+        """
+        cached = self.get(ykiho, kind) if ykiho else None
+        if cached is not None and cached[1] < self.ttl:
+            self.hits += 1
+            if cached[1] >= self.refresh_after and (ykiho, kind) not in self._refreshing:
+                self._refreshing[(ykiho, kind)] = asyncio.ensure_future(self._refresh(ykiho, kind, fetch))
+            return cached[0]
+
+        self.misses += 1
+        try:
+            data = await fetch(ykiho)
+        except Exception:
+            self.errors += 1
+            raise
+        if ykiho:
+            self.set(ykiho, kind, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            size = self._get_conn().execute("SELECT COUNT(*) FROM hospital_detail").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "size": size,
+        }
+
+    def purge_expired(self):
+        with self._lock:
+            conn = self._get_conn()
+            removed = conn.execute("DELETE FROM hospital_detail WHERE updated_at < ?", (time.time() - self.ttl,)).rowcount
+            conn.commit()
+        return removed
+
+hospital_detail_cache = HospitalDetailCache()
@@ -0,0 +1,106 @@
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from datetime import timedelta
+from .grid import haversine
+
+# 진료과목(dgsbjtCd)별 병원 목록 스냅샷과 인메모리 위치 인덱스
+# 스냅샷이 max_age 보다 오래되었거나 없으면 search() 가 None 을 반환하고 원격 api 를 사용함
+class HospitalIndex:
+    def __init__(self, db_path: str = 'database/hospital_detail.db', max_age: timedelta = timedelta(days=7)):
+        self.db_path = db_path
+        self.max_age = max_age.total_seconds()
+        self._conn = None
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def _get_conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hospital_snapshot ("
+                "dgsbjtCd TEXT NOT NULL, ykiho TEXT NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (dgsbjtCd, ykiho))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hospital_snapshot_meta ("
+                "dgsbjtCd TEXT PRIMARY KEY, fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _build(self, records, fetched_at):
+        records = [record for record in records if record.get('XPos') and record.get('YPos')]
+        return {
+            'fetched_at': fetched_at,
+            'records': records,
+            'lon': np.array([float(record['XPos']) for record in records], dtype=np.float64),
+            'lat': np.array([float(record['YPos']) for record in records], dtype=np.float64),
+        }
+
+    def _load(self, dgsbjtCd: str):
+        index = self._indexes.get(dgsbjtCd)
+        if index is not None:
+            return index
+        with self._lock:
+            conn = self._get_conn()
+            meta = conn.execute("SELECT fetched_at FROM hospital_snapshot_meta WHERE dgsbjtCd = ?", (dgsbjtCd,)).fetchone()
+            if meta is None:
+                return None
+            rows = conn.execute("SELECT data FROM hospital_snapshot WHERE dgsbjtCd = ?", (dgsbjtCd,)).fetchall()
+        index = self._build([json.loads(row[0]) for row in rows], meta[0])
+        self._indexes[dgsbjtCd] = index
+        return index
+
+    def is_fresh(self, dgsbjtCd: str):
+        index = self._load(dgsbjtCd)
+        if index is not None and time.time() - index['fetched_at'] >= self.max_age:
+            # 다른 프로세스(message.py)가 갱신했을 수 있으므로 갱신 시각이 바뀐 경우에만 다시 읽음
+            with self._lock:
+                meta = self._get_conn().execute("SELECT fetched_at FROM hospital_snapshot_meta WHERE dgsbjtCd = ?", (dgsbjtCd,)).fetchone()
+            if meta is not None and meta[0] > index['fetched_at']:
+                self._indexes.pop(dgsbjtCd, None)
+                index = self._load(dgsbjtCd)
+        return index is not None and time.time() - index['fetched_at'] < self.max_age
+
+    def codes(self):
+        with self._lock:
+            return [row[0] for row in self._get_conn().execute("SELECT dgsbjtCd FROM hospital_snapshot_meta").fetchall()]
+
+    def replace(self, dgsbjtCd: str, records):
+        """
+        진료과목의 스냅샷을 records 로 교체
+        """
+        fetched_at = time.time()
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute("DELETE FROM hospital_snapshot WHERE dgsbjtCd = ?", (dgsbjtCd,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO hospital_snapshot (dgsbjtCd, ykiho, data) VALUES (?, ?, ?)",
+                [(dgsbjtCd, record['ykiho'], json.dumps(record, ensure_ascii=False)) for record in records if record.get('ykiho')]
+            )
+            conn.execute("INSERT OR REPLACE INTO hospital_snapshot_meta (dgsbjtCd, fetched_at) VALUES (?, ?)", (dgsbjtCd, fetched_at))
+            conn.commit()
+        self._indexes[dgsbjtCd] = self._build(records, fetched_at)
+
+    def search(self, dgsbjtCd: str, latitude: float, longitude: float, radius: float = 30000, k: int = 10):
+        """
+        radius(m) 안에서 가까운 순으로 최대 k 개 병원 반환, 각 항목에 distance(m) 포함
+        스냅샷이 없거나 오래된 경우 None
+        """
+        if not self.is_fresh(dgsbjtCd):
+            return None
+        index = self._indexes[dgsbjtCd]
+        if not index['records']:
+            return []
+
+        distances = haversine(latitude, longitude, index['lat'], index['lon']) * 1000.0
+        within = np.flatnonzero(distances <= radius)
+        if within.size > k:
+            within = within[np.argpartition(distances[within], k - 1)[:k]]
+        within = within[np.argsort(distances[within], kind='stable')]
+        return [{**index['records'][i], 'distance': float(distances[i])} for i in within.tolist()]
+
+hospital_index = HospitalIndex()
@@ -0,0 +1,72 @@
+import asyncio
+import httpx
+
+# 외부 공공데이터 api 호출용 비동기 클라이언트
+# 커넥션 풀을 공유하고, 요청마다 타임아웃과 제한된 횟수의 재시도를 적용함
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+async def close_on_shutdown(client: httpx.AsyncClient):
+    try:
+        yield
+    finally:
+        if not client.is_closed:
+            await client.aclose()
+
+class AsyncHttpClient:
+    def __init__(self, base_url: str = '', timeout: float = 5.0, connect_timeout: float = 3.0,
+                 retries: int = 1, backoff: float = 0.2, max_connections: int = 20, transport: httpx.AsyncBaseTransport = None):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.transport = transport # 테스트에서 httpx.MockTransport 사용
+        # 이벤트 루프 -> (client, closer)
+        self._clients = {}
+
+    def _get_client(self):
+        # httpx 커넥션은 이벤트 루프에 묶여있으므로 루프마다 따로 생성
+        # message.py 처럼 작업마다 asyncio.run 을 하는 경우 루프가 끝날 때 그 루프의 client 를 닫음
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is not None and not entry[0].is_closed:
+            return entry[0]
+        for closed_loop in [key for key in self._clients if key.is_closed()]:
+            del self._clients[closed_loop]
+        client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits, transport=self.transport)
+        closer = close_on_shutdown(client)
+        # 첫 실행으로 루프에 async generator 로 등록되고, asyncio.run 이 끝날 때 shutdown_asyncgens 에서 닫힘
+        loop.create_task(closer.__anext__())
+        self._clients[loop] = (client, closer)
+        return client
+
+    async def get(self, url: str, params: dict = None, timeout: float = None):
+        """
+        GET 요청, 네트워크 오류와 RETRY_STATUS 응답은 retries 만큼 재시도
+        마지막 시도도 실패하면 응답을 그대로 반환하거나 httpx.TransportError 를 발생시킴
+        """
+        client = self._get_client()
+        request_timeout = self.timeout if timeout is None else httpx.Timeout(timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                response = await client.get(url, params=params, timeout=request_timeout)
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    return response
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    async def aclose(self):
+        # 현재 루프의 client 닫기
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+            if not entry[0].is_closed:
+                await entry[0].aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+from models import AssistantThread, AssistantMessage, AssistantMemory
+from utils.config import variables
+
+# 대화 기억 압축
+# openai 스레드가 계속 길어지면 run 마다 입력 토큰과 지연 시간이 늘어나므로,
+# 요약되지 않은 메세지가 COMPACT_THRESHOLD 개를 넘은 스레드는 오래된 대화를 요약해 AssistantMemory 에 저장하고
+# 요약 + 최근 KEEP_RECENT 개 메세지로 시작하는 새 openai 스레드로 교체함
+# 로컬 대화 기록(assistant_messages)은 새 스레드로 옮겨서 그대로 유지
+COMPACT_THRESHOLD = 60
+KEEP_RECENT = 10
+# 대화 중인 스레드는 교체하지 않음
+COMPACT_IDLE = timedelta(minutes=30)
+# 요약에 전달하는 대화 길이 제한 (최근 대화 우선)
+SUMMARY_INPUT_CHARS = 20000
+MEMORY_MODEL = getattr(variables, 'OPENAI_MEMORY_MODEL', 'gpt-4o-mini')
+ROTATE_CHUNK_SIZE = 1000
+
+SUMMARY_INSTRUCTIONS = """
+당신은 시니어 도우미 '애비'의 대화 기록을 정리합니다.
+이전 요약과 새 대화를 합쳐서 앞으로의 대화에 필요한 내용만 짧게 정리하세요.
+어르신의 건강 상태, 복용 중인 약, 병원 일정, 가족과 연락처, 생활 습관, 좋아하는 것과 부탁한 내용을 우선으로 남기고
+인사나 날씨처럼 다시 필요하지 않은 내용은 제외하세요.
+"""
+
+def format_transcript(messages):
+    lines = []
+    size = 0
+    for message in reversed(messages):
+        if not message.content:
+            continue
+        line = f"{'어르신' if message.sender_type == 'user' else '애비'}: {message.content}"
+        size += len(line)
+        if size > SUMMARY_INPUT_CHARS:
+            break
+        lines.append(line)
+    return "\n".join(reversed(lines))
+
+async def summarize_messages(client, previous_summary: str, transcript: str):
+    response = await client.chat.completions.create(
+        model=MEMORY_MODEL,
+        messages=[
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": f"이전 요약:\n{previous_summary or '없음'}\n\n새 대화:\n{transcript}"},
+        ],
+    )
+    return response.choices[0].message.content.strip()
+
+def find_compactable_threads(db: Session, threshold: int = COMPACT_THRESHOLD, idle: timedelta = COMPACT_IDLE):
+    """
+    요약되지 않은 메세지가 threshold 개를 넘고, idle 동안 대화가 없던 스레드
+    """
+    return db.query(AssistantThread).join(
+        AssistantMessage, AssistantMessage.thread_id == AssistantThread.thread_id
+    ).outerjoin(
+        AssistantMemory, AssistantMemory.user_id == AssistantThread.user_id
+    ).filter(or_(
+        AssistantMemory.last_message_id.is_(None),
+        AssistantMessage.message_id > AssistantMemory.last_message_id
+    )).group_by(AssistantThread.thread_id).having(
+        func.count(AssistantMessage.message_id) > threshold
+    ).having(
+        func.max(AssistantMessage.created_at) < datetime.utcnow() - idle
+    ).all()
+
+def rotate_thread(db: Session, old_thread_id: str, new_thread_id: str):
+    # assistant_threads.thread_id 는 메세지가 참조하는 키이므로 메세지 연결을 잠시 끊고 교체한 뒤 다시 연결 (한 트랜잭션)
+    message_ids = [row[0] for row in db.query(AssistantMessage.message_id).filter(AssistantMessage.thread_id == old_thread_id).all()]
+    db.query(AssistantMessage).filter(AssistantMessage.thread_id == old_thread_id).update({"thread_id": None}, synchronize_session=False)
+    db.query(AssistantThread).filter(AssistantThread.thread_id == old_thread_id).update(
+        {"thread_id": new_thread_id, "run_state": None, "run_id": None}, synchronize_session=False
+    )
+    for start in range(0, len(message_ids), ROTATE_CHUNK_SIZE):
+        db.query(AssistantMessage).filter(
+            AssistantMessage.message_id.in_(message_ids[start:start + ROTATE_CHUNK_SIZE])
+        ).update({"thread_id": new_thread_id}, synchronize_session=False)
+
+def latest_activity(db: Session, thread_id: str):
+    # 스레드의 마지막 메세지 (시각, id)
+    return tuple(db.query(func.max(AssistantMessage.created_at), func.max(AssistantMessage.message_id)).filter(
+        AssistantMessage.thread_id == thread_id
+    ).one())
+
+async def compact_thread(db: Session, client, thread: AssistantThread, keep_recent: int = KEEP_RECENT):
+    """
+    스레드의 오래된 대화를 요약하고 새 openai 스레드로 교체
+    반환 : 새 thread_id, 요약할 메세지가 없으면 None
+    """
+    old_thread_id = thread.thread_id
+    user_id = thread.user_id
+    memory = db.query(AssistantMemory).filter(AssistantMemory.user_id == user_id).first()
+
+    query = db.query(AssistantMessage).filter(AssistantMessage.thread_id == old_thread_id)
+    if memory is not None:
+        query = query.filter(AssistantMessage.message_id > memory.last_message_id)
+    messages = query.order_by(AssistantMessage.created_at, AssistantMessage.message_id).all()
+    split = max(len(messages) - keep_recent, 0)
+    old_messages, recent_messages = messages[:split], messages[split:]
+    if not old_messages:
+        return None
+    last_message_id = old_messages[-1].message_id
+    last_activity = latest_activity(db, old_thread_id)
+    previous_summary = memory.summary if memory else None
+    transcript = format_transcript(old_messages)
+    recent = [
+        {"role": "user" if message.sender_type == "user" else "assistant", "content": message.content}
+        for message in recent_messages if message.content
+    ]
+    # 요약, 스레드 생성은 오래 걸리므로 읽기 트랜잭션을 끝내고 진행 (교체 직전에 다시 확인)
+    db.commit()
+
+    summary = await summarize_messages(client, previous_summary, transcript)
+    seed = [{"role": "assistant", "content": f"이전 대화 요약입니다.\n{summary}"}] + recent
+    new_thread = await client.beta.threads.create(messages=seed)
+
+    try:
+        # 스레드 행을 잠가서 run 상태 갱신과 동시에 교체되지 않게 하고,
+        # 요약하는 동안 새 메세지가 들어왔으면 교체하지 않음 (다음 압축 때 다시 시도)
+        locked = db.query(AssistantThread).filter(AssistantThread.thread_id == old_thread_id).with_for_update().first()
+        if locked is None or latest_activity(db, old_thread_id) != last_activity:
+            db.rollback()
+            await client.beta.threads.delete(new_thread.id)
+            return None
+        memory = db.query(AssistantMemory).filter(AssistantMemory.user_id == user_id).first()
+        if memory is None:
+            db.add(AssistantMemory(user_id=user_id, summary=summary, last_message_id=last_message_id))
+        else:
+            memory.summary = summary
+            memory.last_message_id = last_message_id
+        rotate_thread(db, old_thread_id, new_thread.id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        await client.beta.threads.delete(new_thread.id)
+        raise
+
+    try:
+        await client.beta.threads.delete(old_thread_id)
+    except Exception as e:
+        print(f"Failed to delete old thread {old_thread_id}: {e}")
+    return new_thread.id
+
+async def compact_conversations(db: Session, client, threshold: int = COMPACT_THRESHOLD):
+    """
+    압축 대상 스레드를 하나씩 처리
+    반환 : 교체한 스레드 수
+    """
+    compacted = 0
+    for thread in find_compactable_threads(db, threshold=threshold):
+        try:
+            if await compact_thread(db, client, thread):
+                compacted += 1
+        except Exception as e:
+            print(f"Failed to compact thread {thread.thread_id}: {e}")
+    return compacted
@@ -2,12 +2,14 @@ from datetime import time, datetime, timedelta
 
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from models import User, HospitalReminder, MedicationReminder, AssistantThread, UserSchedule
+from models import HospitalReminder, MedicationReminder, UserSchedule
+from .tools import tool
+from .context import ToolContext
 
-def register_medication_remind(db: Session, thread_id, content: str, start_date: int, repeat_day: str, frequency: str, additional_info: str):
+@tool(description="복약 알림을 등록합니다.")
+def register_medication_remind(db: Session, context: ToolContext, content: str, start_date: int, repeat_day: str, frequency: str, additional_info: str):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
+        user_id = context.user_id
         
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
@@ -42,18 +44,18 @@ def register_medication_remind(db: Session, thread_id, content: str, start_date:
         db.rollback()
         return {"status": "failed", "message": f"예상치 못한 오류가 발생했습니다: {str(e)}"}
     
-def remove_medication_remind(db: Session, thread_id, reminder_id: int):
+@tool(description="복약 알림을 삭제합니다.")
+def remove_medication_remind(db: Session, context: ToolContext, reminder_id: int):
     try:
-        print(f"remove_medication_remind({thread_id}, {reminder_id})")
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
+        print(f"remove_medication_remind({context.thread_id}, {reminder_id})")
+        user_id = context.user_id
         
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
 
         # db에서 조회
         reminder = db.query(MedicationReminder).filter(MedicationReminder.reminder_id == reminder_id, 
-                                                       MedicationReminder.user_id == user.user_id).first()
+                                                       MedicationReminder.user_id == user_id).first()
         if reminder is None:
             return {"status": "failed", "message": f"리마인더를 찾지 못했습니다."}
         #db에서 삭제
@@ -70,10 +72,10 @@ def remove_medication_remind(db: Session, thread_id, reminder_id: int):
         return {"status": "failed", "message": f"예상치 못한 오류가 발생했습니다: {str(e)}"}
 
 # 약 복용 알림 정보 조회
-def get_medication_remind(db: Session, thread_id):
+@tool(description="등록된 복약 알림 목록을 조회합니다.")
+def get_medication_remind(db: Session, context: ToolContext):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
+        user_id = context.user_id
         
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
@@ -106,10 +108,10 @@ def get_medication_remind(db: Session, thread_id):
 
 
 
-def register_hospital_remind(db: Session, thread_id, content: str, year: int=datetime.now().year, month: int=datetime.now().month, day: int=datetime.now().day, day_num: int=0, hour: int=9, minute: int=0, additional_info: str=None):
+@tool(description="병원 방문 알림을 등록합니다.")
+def register_hospital_remind(db: Session, context: ToolContext, content: str, year: int=datetime.now().year, month: int=datetime.now().month, day: int=datetime.now().day, day_num: int=0, hour: int=9, minute: int=0, additional_info: str=None):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
+        user_id = context.user_id
         
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
@@ -141,10 +143,10 @@ def register_hospital_remind(db: Session, thread_id, content: str, year: int=dat
         return {"status": "failed", "message": f"예상치 못한 오류가 발생했습니다: {str(e)}"}
 
 # 병원 예약 알림 삭제
-def remove_hospital_remind(db: Session, thread_id, reminder_id: int):
+@tool(description="병원 방문 알림을 삭제합니다.")
+def remove_hospital_remind(db: Session, context: ToolContext, reminder_id: int):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
+        user_id = context.user_id
         
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
@@ -166,10 +168,10 @@ def remove_hospital_remind(db: Session, thread_id, reminder_id: int):
         return {"status": "failed", "message": f"예상치 못한 오류가 발생했습니다: {str(e)}"}
 
 # 병원 예약 정보 조회
-def get_hospital_remind(db: Session, thread_id):
+@tool(description="등록된 병원 방문 알림 목록을 조회합니다.")
+def get_hospital_remind(db: Session, context: ToolContext):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
+        user_id = context.user_id
         
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
@@ -184,11 +186,8 @@ def get_hospital_remind(db: Session, thread_id):
         return {"status": "failed", "message": f"예상치 못한 오류가 발생했습니다: {str(e)}"}
 
 # 식사시간 등록
-def set_default_meal_time(db: Session, thread_id):
+def set_default_meal_time(db: Session, user_id: int):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
-        
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
         
@@ -221,17 +220,18 @@ def set_default_meal_time(db: Session, thread_id):
 # RNN 모델을 사용해서 식사시간을 추정하는 것도 좋을 것 같음
 # 이에 대해서 적용하지말고 일단 의논해보도록
 # 이번 주는 해당 기능 연결 X
-def update_meal_time(db: Session, thread_id, eaten: bool, meal_type: str, minutes: int = 10):
+@tool(description="식사 여부와 식사 시간을 기록합니다.")
+def update_meal_time(db: Session, context: ToolContext, eaten: bool, meal_type: str, minutes: int = 10):
     try:
-        user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-        user_id = user.user_id
+        user_id = context.user_id
         
         if user_id is None:
             return {"status": "failed", "message": "사용자 정보가 없습니다."}
         
+        # context.schedule 은 run 시작 시점의 값이므로 수정할 행은 항상 다시 조회
         schedule = db.query(UserSchedule).filter(UserSchedule.user_id == user_id).first()
         if schedule is None:
-            set_default_meal_time(db, thread_id)
+            set_default_meal_time(db, user_id)
             return {"status": "failed", "message": "식사시간이 등록되어 있지 않아 기본값으로 설정되었습니다."}
         
         # 식사 여부에 따라 meal_time 조정
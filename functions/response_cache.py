@@ -0,0 +1,199 @@
+import re
+import threading
+import time
+import unicodedata
+import zlib
+import numpy as np
+from collections import OrderedDict
+from datetime import timedelta
+from utils.config import variables
+
+# 자주 반복되는 일반 질문(인사, 감사, 자기소개, 사용법)의 답변 캐시
+# 개인 정보나 tool 이 필요한 질문은 캐시하지 않고 항상 모델을 사용함
+# 답변은 사용자의 스레드 대화와 기억을 보고 만들어지므로(호칭, 이전 대화 언급 등) 사용자별로 따로 저장함
+# 정규화한 문장이 같으면 바로 사용하고, 아니면 글자 n-gram 임베딩이 비슷한 문장(같은 intent)을 찾음
+RESPONSE_CACHE_ENABLED = getattr(variables, 'ASSISTANT_RESPONSE_CACHE', False)
+SIMILARITY_THRESHOLD = 0.7
+MAX_QUERY_LENGTH = 30 # 정규화 후 글자 수
+MAX_USERS = 1024 # 최근 사용한 사용자 수 만큼만 유지
+EMBEDDING_DIM = 512
+NGRAM_SIZES = (1, 2, 3)
+
+# (intent, ttl, 정규화한 문장 전체와 일치해야 하는 패턴)
+# 단어가 포함되기만 하면 되는 방식은 "대통령이 누구야", "반가운 소식이 있어" 같은 질문도 캐시하므로 문장 전체를 비교함
+# 부르는 말, 공백, 문장부호는 정규화에서 제거됨
+YOU = r"(너는|넌|너|당신은|당신)"
+ENDING = r"(야|니|냐|요|예요|에요|세요|지|나요|습니까)?"
+CACHE_INTENTS = (
+    ("greeting", timedelta(days=1), re.compile(
+        r"((안녕|안녕하세요|안녕하십니까|반가워|반가워요|반갑다|반갑네|반갑습니다|좋은아침|잘잤어|잘잤니|잘잤어요|잘주무셨어요)"
+        + r"(이야|이에요|입니다)?)+"
+    )),
+    ("thanks", timedelta(days=1), re.compile(
+        r"(정말|진짜|너무|항상|늘)?(고마워|고마워요|고맙다|고맙네|고맙구나|고맙습니다|감사해|감사해요|감사합니다|감사드려요|감사드립니다)+"
+    )),
+    ("identity", timedelta(days=7), re.compile(
+        YOU + r"?(누구|이름이뭐|이름이머)" + ENDING + "|" + YOU + r"(뭐|머)" + ENDING
+    )),
+    ("help", timedelta(days=1), re.compile(
+        YOU + r"?(뭘|뭐|무엇을|무슨일을)(할수있|해줄수있)(어|니|나|어요|나요|습니까|지)"
+        + r"|(어떻게써|어떻게쓰는거야|어떻게사용해|어떻게사용하는거야|사용법|사용법알려줘|사용법이뭐야)"
+    )),
+)
+# tool 이 필요하거나 시간에 따라 답이 바뀌는 질문
+TOOL_KEYWORDS = (
+    "날씨", "비와", "비가", "눈와", "눈이", "기온", "덥", "춥", "미세먼지",
+    "병원", "약", "알림", "예약", "진료", "응급",
+    "전화", "문자", "메세지", "메시지", "연락",
+    "글씨", "글자", "앱", "켜", "열어", "실행",
+    "식사", "밥", "먹었", "먹을",
+    "오늘", "내일", "어제", "지금", "몇시",
+)
+# 사용자 본인에 대한 질문
+PERSONAL_KEYWORDS = ("내", "나의", "나는", "제가", "저의", "저는", "우리", "기억")
+# 부르는 말은 비교에서 제외
+ADDRESS_WORDS = ("애비야", "애비")
+
+def normalize(text: str):
+    text = unicodedata.normalize("NFKC", text).lower()
+    for word in ADDRESS_WORDS:
+        text = text.replace(word, "")
+    text = re.sub(r"[^\w]", "", text)
+    # 반복 문자 축약 (고마워요오오 -> 고마워요오)
+    return re.sub(r"(.)\1{2,}", r"\1\1", text)
+
+def embed(text: str):
+    # 글자 n-gram 을 해시해서 만든 고정 길이 벡터 (외부 모델 없이 로컬에서 계산)
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for n in NGRAM_SIZES:
+        for i in range(len(text) - n + 1):
+            vector[zlib.crc32(text[i:i + n].encode("utf-8")) % EMBEDDING_DIM] += 1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def classify(text: str):
+    """
+    반환 : (normalized, intent, ttl, bypass 사유)
+    캐시할 수 있으면 bypass 사유가 None
+    """
+    normalized = normalize(text)
+    if not normalized:
+        return normalized, None, None, "empty"
+    if len(normalized) > MAX_QUERY_LENGTH:
+        return normalized, None, None, "length"
+    if any(char.isdigit() for char in normalized):
+        return normalized, None, None, "number"
+    if any(keyword in normalized for keyword in TOOL_KEYWORDS):
+        return normalized, None, None, "tool"
+    if any(keyword in normalized for keyword in PERSONAL_KEYWORDS):
+        return normalized, None, None, "personal"
+    for intent, ttl, pattern in CACHE_INTENTS:
+        if pattern.fullmatch(normalized):
+            return normalized, intent, ttl, None
+    return normalized, None, None, "intent"
+
+class ResponseCache:
+    def __init__(self, enabled: bool = RESPONSE_CACHE_ENABLED, threshold: float = SIMILARITY_THRESHOLD, max_entries: int = 32, max_users: int = MAX_USERS):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_entries = max_entries # 사용자, intent 별
+        self.max_users = max_users
+        # user_id -> {intent: OrderedDict(normalized -> (embedding, response, expires_at))}
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.bypasses = {}
+        self.intent_hits = {}
+
+    def _expire(self, entries, now):
+        for key in [key for key, entry in entries.items() if entry[2] <= now]:
+            del entries[key]
+
+    def _user_entries(self, user_id, create: bool):
+        entries = self._users.get(user_id)
+        if entries is None and create:
+            entries = self._users[user_id] = {intent: OrderedDict() for intent, _, _ in CACHE_INTENTS}
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        if entries is not None:
+            self._users.move_to_end(user_id)
+        return entries
+
+    def lookup(self, user_id, text: str):
+        """
+        같은 사용자에게 캐시된 답변 반환, 없거나 캐시할 수 없는 질문이면 None
+        """
+        if not self.enabled:
+            return None
+        self.lookups += 1
+        normalized, intent, _, reason = classify(text)
+        if reason is not None:
+            self.bypasses[reason] = self.bypasses.get(reason, 0) + 1
+            return None
+
+        now = time.time()
+        with self._lock:
+            user_entries = self._user_entries(user_id, create=False)
+            entries = user_entries[intent] if user_entries is not None else {}
+            if entries:
+                self._expire(entries, now)
+            entry = entries.get(normalized)
+            if entry is not None:
+                entries.move_to_end(normalized)
+                self.exact_hits += 1
+                self.intent_hits[intent] = self.intent_hits.get(intent, 0) + 1
+                return entry[1]
+            if entries:
+                keys = list(entries.keys())
+                vectors = np.stack([entries[key][0] for key in keys])
+                scores = vectors @ embed(normalized)
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.semantic_hits += 1
+                    self.intent_hits[intent] = self.intent_hits.get(intent, 0) + 1
+                    return entries[keys[best]][1]
+        self.misses += 1
+        return None
+
+    def store(self, user_id, text: str, response: str):
+        """
+        tool 을 사용하지 않은 run 의 답변만 저장
+        """
+        if not self.enabled or not response:
+            return False
+        normalized, intent, ttl, reason = classify(text)
+        if reason is not None:
+            return False
+        with self._lock:
+            entries = self._user_entries(user_id, create=True)[intent]
+            entries[normalized] = (embed(normalized), response, time.time() + ttl.total_seconds())
+            entries.move_to_end(normalized)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+        self.stores += 1
+        return True
+
+    def stats(self):
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "lookups": self.lookups,
+            "hits": hits,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / self.lookups, 4) if self.lookups else 0.0,
+            "stores": self.stores,
+            "bypasses": dict(self.bypasses),
+            "intent_hits": dict(self.intent_hits),
+            "users": len(self._users),
+            "size": sum(len(entries) for user_entries in list(self._users.values()) for entries in user_entries.values()),
+        }
+
+response_cache = ResponseCache()
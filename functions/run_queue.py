@@ -0,0 +1,80 @@
+import asyncio
+from contextlib import asynccontextmanager
+from utils.config import variables
+
+# 사용자별 assistant 실행 대기열
+# 같은 사용자의 요청은 하나씩 순서대로 실행하고, 다른 사용자의 요청은 동시에 실행됨
+# merge_window 가 0 보다 크면 실행 전에 그 시간(초)만큼 기다리고,
+# 그 동안(또는 앞선 실행을 기다리는 동안) 들어온 메세지를 하나로 합쳐서 한번만 실행함
+
+# 메세지를 합치기 위해 기다리는 시간(초), 0 이면 합치지 않고 순서대로만 실행
+MESSAGE_MERGE_WINDOW = getattr(variables, 'MESSAGE_MERGE_WINDOW', 0.0)
+# 사용자별 실행 대기 요청 수 제한
+MESSAGE_MAX_WAITING = 3
+
+class MessageBatch:
+    def __init__(self, content: str):
+        self.contents = [content]
+        self.future = asyncio.get_running_loop().create_future()
+
+    def resolve(self, response):
+        if not self.future.done():
+            self.future.set_result(response)
+
+    async def wait(self):
+        """
+        합쳐진 요청이 실행을 마칠 때까지 대기, 실행하지 못한 경우 None
+        """
+        return await asyncio.shield(self.future)
+
+class RunQueue:
+    def __init__(self, merge_window: float = MESSAGE_MERGE_WINDOW, max_waiting: int = MESSAGE_MAX_WAITING):
+        self.merge_window = merge_window
+        self.max_waiting = max_waiting
+        self._locks = {}
+        self._batches = {}
+
+    def join(self, key, content: str):
+        """
+        반환 : (batch, leader)
+        leader 이면 run() 으로 실행하고, 아니면 batch.wait() 로 결과를 기다림
+        대기중인 요청이 max_waiting 이상이면 (None, False)
+        """
+        batch = self._batches.get(key)
+        if batch is not None:
+            batch.contents.append(content)
+            return batch, False
+
+        entry = self._locks.get(key)
+        if entry is not None and entry[1] >= self.max_waiting:
+            return None, False
+
+        batch = MessageBatch(content)
+        if self.merge_window > 0:
+            self._batches[key] = batch
+        return batch, True
+
+    @asynccontextmanager
+    async def run(self, key, batch: MessageBatch):
+        """
+        사용자 잠금을 얻은 뒤 합쳐진 메세지 내용을 반환
+        블록이 batch.resolve() 없이 끝나면 기다리던 요청에는 None 을 전달함
+        """
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            if self.merge_window > 0:
+                await asyncio.sleep(self.merge_window)
+            async with entry[0]:
+                if self._batches.get(key) is batch:
+                    del self._batches[key]
+                yield "\n".join(batch.contents)
+        finally:
+            if self._batches.get(key) is batch:
+                del self._batches[key]
+            batch.resolve(None)
+            entry[1] -= 1
+            if entry[1] == 0 and self._locks.get(key) is entry:
+                del self._locks[key]
+
+run_queue = RunQueue()
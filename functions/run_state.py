@@ -0,0 +1,63 @@
+import threading
+import time
+
+# assistant run 상태 저장소 (thread_id -> run 상태)
+# 스트림 이벤트마다 assistant_threads 를 갱신하지 않고 여기서 상태를 관리하며,
+# RUN_PERSIST_STATES 로 바뀌는 경우에만 DB 에 저장함
+# 프로세스 내 저장소이므로 여러 워커가 상태를 공유해야 하면 같은 메서드를 가진 저장소로 run_state_store 를 교체
+RUN_ACTIVE_STATES = {
+    "thread.run.queued",
+    "thread.run.created",
+    "thread.run.in_progress",
+    "thread.run.requires_action",
+    "thread.run.cancelling",
+}
+RUN_PERSIST_STATES = {
+    "thread.run.created",
+    "thread.run.requires_action",
+    "thread.run.completed",
+    "thread.run.failed",
+    "thread.run.cancelled",
+    "thread.run.expired",
+    "thread.run.incomplete",
+}
+# openai run 은 10분이 지나면 만료되므로 그 이상 진행중인 상태는 남겨진 상태로 간주
+RUN_TIMEOUT = 600 # seconds
+
+class RunStateStore:
+    def __init__(self, timeout: float = RUN_TIMEOUT):
+        self.timeout = timeout
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, thread_id: str):
+        entry = self._states.get(thread_id)
+        return entry[0] if entry is not None else None
+
+    def set(self, thread_id: str, state: str):
+        """
+        run 상태 갱신, run 단계(step)나 메세지 이벤트는 무시함
+        반환 : DB 에 저장해야 하는 변화이면 True
+        """
+        if not state.startswith("thread.run.") or state.startswith("thread.run.step."):
+            return False
+        with self._lock:
+            previous = self.get(thread_id)
+            if state in RUN_ACTIVE_STATES:
+                self._states[thread_id] = (state, time.monotonic())
+            else:
+                # 끝난 run (completed, failed 등) 은 보관하지 않음, 상태는 DB 에 남아있음
+                self._states.pop(thread_id, None)
+        return state != previous and state in RUN_PERSIST_STATES
+
+    def is_active(self, thread_id: str):
+        entry = self._states.get(thread_id)
+        if entry is None:
+            return False
+        return entry[0] in RUN_ACTIVE_STATES and time.monotonic() - entry[1] < self.timeout
+
+    def clear(self, thread_id: str):
+        with self._lock:
+            self._states.pop(thread_id, None)
+
+run_state_store = RunStateStore()
@@ -0,0 +1,206 @@
+import asyncio
+import inspect
+import json
+import time
+from database import SessionLocal
+from .context import ToolContext
+
+# assistant 가 호출하는 tool 등록부
+# 함수마다 json schema, 타임아웃, 캐시 가능 여부, 동시 실행 분류를 함께 등록하고
+# handle_requires_action 은 이름으로 바로 찾아서 실행함
+#
+# 동시 실행 분류
+# - io : 비동기 외부 api 호출 (기상청, 심평원), 이벤트 루프에서 실행
+# - db : 동기 DB 작업, 워커 스레드에서 별도 세션으로 실행
+# - device : FCM 전송, 워커 스레드에서 별도 세션으로 실행
+CONCURRENCY_LIMITS = {
+    "io": 4,
+    "db": 2,
+    "device": 2,
+}
+DEFAULT_TIMEOUT = 10.0 # seconds
+# 정상 응답만 캐시 (weather / emergency 는 "00", remind / device 는 "success")
+CACHEABLE_STATUS = ("00", "success")
+# 캐시 키에 넣는 사용자 위치의 소수점 자릿수 (셋째 자리 = 약 100 m)
+# 날씨, 병원 검색은 인자가 아니라 context 의 위치를 사용하므로 위치가 바뀌면 다시 호출해야 함
+CACHE_LOCATION_DIGITS = 3
+
+JSON_TYPES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+}
+# 모든 tool 에 registry 가 넣어주는 인자 (schema 에서 제외), context 는 run 마다 한번 조회한 ToolContext
+CONTEXT_ARGUMENTS = ("db", "context")
+
+def build_parameters(function):
+    # 함수 시그니처로 json schema 생성, 타입 힌트가 없으면 기본값의 타입을 사용
+    properties = {}
+    required = []
+    for name, parameter in inspect.signature(function).parameters.items():
+        if name in CONTEXT_ARGUMENTS:
+            continue
+        annotation = parameter.annotation
+        if annotation is inspect.Parameter.empty and parameter.default not in (inspect.Parameter.empty, None):
+            annotation = type(parameter.default)
+        properties[name] = {"type": JSON_TYPES.get(annotation, "string")}
+        if parameter.default is inspect.Parameter.empty:
+            required.append(name)
+    return {"type": "object", "properties": properties, "required": required}
+
+def location_key(context: ToolContext):
+    if context.latitude is None or context.longitude is None:
+        return None
+    return (round(context.latitude, CACHE_LOCATION_DIGITS), round(context.longitude, CACHE_LOCATION_DIGITS))
+
+def call_sync_tool(function, context: ToolContext, arguments: dict):
+    # 요청 세션은 이벤트 루프에서만 사용하므로 스레드마다 별도 세션 사용
+    db = SessionLocal()
+    try:
+        return function(db=db, context=context, **arguments)
+    finally:
+        db.close()
+
+class Tool:
+    def __init__(self, function, name: str, description: str, parameters: dict,
+                 timeout: float, cacheable: bool, cache_ttl: float, concurrency: str):
+        self.function = function
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.timeout = timeout
+        self.cacheable = cacheable
+        self.cache_ttl = cache_ttl
+        self.concurrency = concurrency
+        self.is_async = asyncio.iscoroutinefunction(function)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cache_hits = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def definition(self):
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            }
+        }
+
+    def record(self, elapsed: float):
+        self.calls += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+
+class ToolRegistry:
+    def __init__(self):
+        self._tools = {}
+        self._cache = {}
+
+    def register(self, name: str = None, description: str = "", parameters: dict = None,
+                 timeout: float = DEFAULT_TIMEOUT, cacheable: bool = False, cache_ttl: float = 60.0,
+                 concurrency: str = None):
+        """
+        tool 등록 데코레이터, 함수는 그대로 반환함
+        concurrency 를 생략하면 비동기 함수는 io, 동기 함수는 db 로 분류
+        """
+        def decorator(function):
+            tool = Tool(
+                function=function,
+                name=name or function.__name__,
+                description=description,
+                parameters=parameters or build_parameters(function),
+                timeout=timeout,
+                cacheable=cacheable,
+                cache_ttl=cache_ttl,
+                concurrency=concurrency or ("io" if asyncio.iscoroutinefunction(function) else "db"),
+            )
+            if tool.concurrency not in CONCURRENCY_LIMITS:
+                raise ValueError(f"알 수 없는 동시 실행 분류입니다: {tool.concurrency}")
+            self._tools[tool.name] = tool
+            return function
+        return decorator
+
+    def get(self, name: str):
+        return self._tools.get(name)
+
+    def definitions(self):
+        """
+        assistant 에 등록할 tool 정의 목록
+        """
+        return [tool.definition() for tool in self._tools.values()]
+
+    def semaphores(self):
+        # requires_action 단계마다 새로 만들어서 분류별 동시 실행 수를 제한
+        return {concurrency: asyncio.Semaphore(limit) for concurrency, limit in CONCURRENCY_LIMITS.items()}
+
+    async def call(self, name: str, db, context: ToolContext, arguments: dict, semaphores: dict = None):
+        """
+        tool 실행 후 결과 반환
+        등록되지 않은 tool, 타임아웃, 예외는 status 가 error / timeout 인 결과로 반환함
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            return {"status": "error", "message": f"지원하지 않는 기능입니다: {name}", "data": {"tool": name}}
+
+        cache_key = None
+        if tool.cacheable:
+            cache_key = (name, context.thread_id, location_key(context), json.dumps(arguments, sort_keys=True, ensure_ascii=False))
+            cached = self._cache.get(cache_key)
+            if cached is not None and cached[0] > time.monotonic():
+                tool.cache_hits += 1
+                return cached[1]
+
+        semaphore = (semaphores or self.semaphores())[tool.concurrency]
+        start = time.perf_counter()
+        try:
+            async with semaphore:
+                # 지연 시간은 대기 시간을 제외하고 측정
+                start = time.perf_counter()
+                if tool.is_async:
+                    result = await asyncio.wait_for(tool.function(db=db, context=context, **arguments), tool.timeout)
+                else:
+                    result = await asyncio.wait_for(asyncio.to_thread(call_sync_tool, tool.function, context, arguments), tool.timeout)
+        except asyncio.TimeoutError:
+            # 스레드에서 실행중인 tool 은 중단되지 않지만 run 은 기다리지 않고 진행
+            tool.timeouts += 1
+            tool.record(time.perf_counter() - start)
+            return {"status": "timeout", "message": f"{name} 응답 시간이 초과되었습니다.", "data": {"tool": name, "timeout": tool.timeout}}
+        except Exception as e:
+            tool.errors += 1
+            tool.record(time.perf_counter() - start)
+            return {"status": "error", "message": f"{name} 실행 중 오류가 발생했습니다: {str(e)}", "data": {"tool": name}}
+
+        tool.record(time.perf_counter() - start)
+        if cache_key is not None and isinstance(result, dict) and result.get("status") in CACHEABLE_STATUS:
+            self._cache[cache_key] = (time.monotonic() + tool.cache_ttl, result)
+            self.evict_expired()
+        return result
+
+    def evict_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (expires_at, _) in self._cache.items() if expires_at <= now]:
+            del self._cache[key]
+
+    def stats(self):
+        """
+        tool 별 호출 수, 오류/타임아웃 수, 지연 시간(초)
+        """
+        return {
+            tool.name: {
+                "calls": tool.calls,
+                "errors": tool.errors,
+                "timeouts": tool.timeouts,
+                "cache_hits": tool.cache_hits,
+                "avg_time": round(tool.total_time / tool.calls, 4) if tool.calls else 0.0,
+                "max_time": round(tool.max_time, 4),
+            }
+            for tool in self._tools.values()
+        }
+
+tool_registry = ToolRegistry()
+tool = tool_registry.register
@@ -1,21 +1,27 @@
 from sqlalchemy.orm import Session
-from models import User, AssistantThread
 from datetime import datetime, timedelta
-import json
-import os
-import sqlite3
+import asyncio
+import re
 import xml.etree.ElementTree as ET
+import httpx
 import numpy as np
-import requests
 from utils.config import variables
+from .grid import location_grid
+from .cache import forecast_cache, forecastExpiry, FORECAST_DELAY
+from .http_client import AsyncHttpClient
+from .tools import tool
+from .context import ToolContext
 
 weather_key = variables.WEATHER_KEY
 
-try:
-    weather_db = sqlite3.connect('database/location_grid.db')
-except sqlite3.Error as e:
-    print(f"Error: {e}\n\t└ Failed to connect to database")
-cursor = weather_db.cursor()
+FORECAST_ATTEMPTS = 6
+# 동시에 조회하는 발표시각 수 (최신 발표가 아직 없을 때를 대비해서 바로 이전 발표시각도 함께 조회)
+FORECAST_HEDGE = 2
+# 미리 조회는 발표 직후에 실행되므로 최신 발표시각과 바로 이전 발표시각만 하나씩 조회
+PREFETCH_ATTEMPTS = 2
+PREFETCH_HEDGE = 1
+KMA_BASE_URL = 'http://apis.data.go.kr/1360000/VilageFcstInfoService_2.0'
+kma_client = AsyncHttpClient(base_url=KMA_BASE_URL, timeout=5.0, retries=1)
 
 # WEATHER_CATEGORIES_KOR = {
 #     "T1H" : "기온", # ℃
@@ -35,41 +41,64 @@ cursor = weather_db.cursor()
     # 관측장비가 없는 해양 지역이거나 관측장비의 결측 등으로 자료가 없음을 의미
     # * 압축 Bit 수의 경우 Missing 값이 아닌 경우의 기준
 def calcTemp(tmp, wind_speed):
+    # 스칼라, numpy 배열 모두 가능
     if tmp is not None and wind_speed is not None:
-        return 13.12 + 0.6215 * float(tmp) - 11.37 * (float(wind_speed) ** 0.16) + 0.3965 * float(tmp) * (float(wind_speed) ** 0.16)
+        tmp = np.asarray(tmp, dtype=np.float64)
+        wind_power = np.asarray(wind_speed, dtype=np.float64) ** 0.16
+        return 13.12 + 0.6215 * tmp - 11.37 * wind_power + 0.3965 * tmp * wind_power
     return None
-def saveWeatherFile(filepath, data):
-    os.makedirs(os.path.dirname(filepath), exist_ok=True)
-    with open(filepath, 'w', encoding='utf-8') as file:
-        json.dump(data, file, ensure_ascii=False, indent=4)
-
-def loadWeatherFile(filepath):
-    with open(filepath, 'r', encoding='utf-8') as file:
-        return json.load(file)
-    
-def parseWeatherData(items):
-    weather_summaries = {}
-    
-    for item in items:
-        category = item.find('category').text
-        value = item.find('fcstValue').text
-        date = item.find('fcstDate').text
-        time = item.find('fcstTime').text
-        datetime_key = f"{date}_{time}"
-        
-        if category not in weather_summaries:
-            weather_summaries[category] = {}
-        weather_summaries[category][datetime_key] = value
-    
-    for datetime_key in weather_summaries.get('TMP', {}):
-        temp = float(weather_summaries['TMP'][datetime_key])
-        wind_speed = float(weather_summaries.get('WSD', {}).get(datetime_key, 0))
-        wind_chill = calcTemp(temp, wind_speed)
-        if 'WCI' not in weather_summaries:
-            weather_summaries['WCI'] = {}
-        weather_summaries['WCI'][datetime_key] = round(wind_chill, 2)
-    
-    return weather_summaries
+
+# 예보 item 은 category, fcstDate, fcstTime, fcstValue 가 항상 같은 순서로 나오는 평평한 구조이므로
+# 트리를 만들지 않고 정규식으로 바로 열을 모음 (ElementTree 로 트리를 만드는 것보다 약 4배 빠름)
+# 형식이 다르거나(오류 응답, 엔티티 포함 등) item 수가 맞지 않으면 ElementTree 로 처리
+FORECAST_ITEM_PATTERN = re.compile(rb"<category>([^<]*)</category>\s*<fcstDate>([^<]*)</fcstDate>\s*<fcstTime>([^<]*)</fcstTime>\s*<fcstValue>([^<]*)</fcstValue>")
+FORECAST_HEADER_PATTERN = re.compile(rb"<header>\s*<resultCode>([^<]*)</resultCode>\s*<resultMsg>([^<]*)</resultMsg>")
+
+def scanForecastItems(content: bytes):
+    header = FORECAST_HEADER_PATTERN.search(content)
+    if header is None or b"&" in content:
+        return None
+    columns = {}
+    count = 0
+    for category, date, time, value in FORECAST_ITEM_PATTERN.findall(content):
+        keys, values = columns.setdefault(category.decode(), ([], []))
+        keys.append(f"{date.decode()}_{time.decode()}")
+        values.append(value.decode("utf-8"))
+        count += 1
+    if count != content.count(b"<item>"):
+        return None
+    return header.group(1).decode(), header.group(2).decode(), columns
+
+def parseForecastTree(content: bytes):
+    root = ET.fromstring(content)
+    columns = {}
+    for item in root.iter('item'):
+        keys, values = columns.setdefault(item.findtext('category'), ([], []))
+        keys.append(f"{item.findtext('fcstDate')}_{item.findtext('fcstTime')}")
+        values.append(item.findtext('fcstValue'))
+    return root.findtext('header/resultCode'), root.findtext('header/resultMsg'), columns
+
+def parseWeatherXml(content: bytes):
+    """
+    예보 응답 XML 의 item 들을 카테고리별 (시각 키 목록, 값 목록) 으로 모은 뒤
+    체감온도(WCI)는 기온, 풍속 열 전체에 대해 한번에 계산함
+    반환 : (resultCode, resultMsg, weather_summaries)
+    """
+    resultCode, resultMsg, columns = scanForecastItems(content) or parseForecastTree(content)
+
+    weather_summaries = {category: dict(zip(keys, values)) for category, (keys, values) in columns.items()}
+
+    # 단기예보는 TMP, 초단기예보는 T1H 가 기온
+    temperature = weather_summaries.get('TMP') or weather_summaries.get('T1H')
+    if temperature:
+        wind = weather_summaries.get('WSD', {})
+        wind_chill = calcTemp(
+            np.array(list(temperature.values()), dtype=np.float64),
+            np.array([wind.get(key, 0) for key in temperature], dtype=np.float64)
+        )
+        weather_summaries['WCI'] = {key: round(value, 2) for key, value in zip(temperature, wind_chill.tolist())}
+
+    return resultCode, resultMsg, weather_summaries
 
 
 def returnFormat(status, message, data=None):
@@ -83,98 +112,125 @@ def getRoundedTime(time):
         return time.replace(minute=30, second=0, microsecond=0)
     else:
         return time.replace(minute=0, second=0, microsecond=0)
-def getUltraSrtFcst(db: Session = None, thread_id = None):
-    user = db.query(User).join(AssistantThread).filter(AssistantThread.thread_id == thread_id).first()
-    
-    if user is None or user.latitude is None or user.longitude is None:
-        return returnFormat("105", "사용자 위치 정보가 없습니다.")
-    
-    latitude = user.latitude
-    longitude = user.longitude
-    
-    def haversine(lat1, lon1, lat2, lon2):
-        # Haversine 공식을 이용한 거리 계산
-        R = 6371.0
-        lat1_rad, lon1_rad = np.radians(lat1), np.radians(lon1)
-        lat2_rad, lon2_rad = np.radians(lat2), np.radians(lon2)
-        dlat = lat2_rad - lat1_rad
-        dlon = lon2_rad - lon1_rad
-        a = np.sin(dlat / 2)**2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2)**2
-        c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-        return R * c
-
-    cursor = weather_db.cursor()
-    cursor.execute("SELECT x, y, latitude_s_per_100, longitude_s_per_100 FROM location_grid")
-    rows = cursor.fetchall()
-    nearest_x = None
-    nearest_y = None
-    min_distance = float('inf')
-
-    for row in rows:
-        x, y, lat_s_per_100, lon_s_per_100 = row
-        distance = haversine(latitude, longitude, lat_s_per_100, lon_s_per_100)
-        if distance < min_distance:
-            min_distance = distance
-            nearest_x = x
-            nearest_y = y
-
-    current_time = datetime.now()
-    base_date = current_time.strftime('%Y%m%d')
-
-    rounded_time = getRoundedTime(current_time)
-    time_list = [(rounded_time - timedelta(minutes=30 * i)).strftime('%H%M') for i in range(10)]
-    cache_file = f'./weather_data/{nearest_x}_{nearest_y}_{base_date}_{time_list[0]}.xml'
-    if os.path.exists(cache_file):
-        data = loadWeatherFile(cache_file)
-        return returnFormat("00", "NORMAL_SERVICE", data)
-            
-    for i in range(6):
-        base_time = rounded_time.strftime('%H%M')
-        rounded_time -= timedelta(minutes=30)
-
-        # API 호출 시도
-        # 아래 엔드포인트는 단기예보... 아침시간에 준나 오래 걸림 ( 거의 40초? )
-        # 대신 점심, 저녁 사용량이 적은 시간대는 빠르긴함 ( 약 2~3초 )
-        # 타임아웃 걸고 못찾았다고 하는 것 도 좋아보이긴함
-        # url = 'http://apis.data.go.kr/1360000/VilageFcstInfoService_2.0/getVilageFcst'
-        # 초단기 예보, 초 빠름 ( <1s )
-        # 단기예보 : 최대 3일까지 예보
-        # 초단기예보 : 6시간 예보
-
-        url = 'http://apis.data.go.kr/1360000/VilageFcstInfoService_2.0/getUltraSrtFcst'
-        params = {
-            'serviceKey': weather_key,
-            'pageNo': '1',
-            'numOfRows': '266',
-            'dataType': 'XML', # JSON 타입은 가끔 XML로 반한되어버림
-            'base_date': base_date,
-            'base_time': base_time,
-            'nx': nearest_x,
-            'ny': nearest_y
-        }
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            try:
-                root = ET.fromstring(response.content)
-                items = root.find('.//items')
-                header = root.find('header')
-                resultMsg = header.find('resultMsg').text
-                resultCode = header.find('resultCode').text
-                if resultCode == "00":
-                    items = root.find('.//items')
-                    weather_summary = parseWeatherData(items.findall('item'))
-                    saveWeatherFile(cache_file, weather_summary)
-                    return returnFormat("00", "NORMAL_SERVICE", weather_summary)
-                
-                elif i < 9:
-                    continue
-                else:
-                    return returnFormat(resultCode, resultMsg)
-                
-            except ET.ParseError:
-                return returnFormat("102", "Failed to parse XML response")
+async def requestUltraSrtFcst(nx, ny, base_datetime: datetime, client: AsyncHttpClient = None, limiter: asyncio.Semaphore = None):
+    """
+    base_datetime 발표분 초단기예보 조회
+    limiter : 동시에 보내는 요청 수 제한 (재시도 포함)
+    반환 : (weather_summary, None) 또는 (None, (resultCode, resultMsg))
+    """
+    client = client or kma_client
+    # API 호출 시도
+    # 아래 엔드포인트는 단기예보... 아침시간에 준나 오래 걸림 ( 거의 40초? )
+    # 대신 점심, 저녁 사용량이 적은 시간대는 빠르긴함 ( 약 2~3초 )
+    # 타임아웃 걸고 못찾았다고 하는 것 도 좋아보이긴함
+    # url = 'http://apis.data.go.kr/1360000/VilageFcstInfoService_2.0/getVilageFcst'
+    # 초단기 예보, 초 빠름 ( <1s )
+    # 단기예보 : 최대 3일까지 예보
+    # 초단기예보 : 6시간 예보
+    params = {
+        'serviceKey': weather_key,
+        'pageNo': '1',
+        'numOfRows': '266',
+        'dataType': 'XML', # JSON 타입은 가끔 XML로 반한되어버림
+        'base_date': base_datetime.strftime('%Y%m%d'),
+        'base_time': base_datetime.strftime('%H%M'),
+        'nx': nx,
+        'ny': ny
+    }
+    try:
+        if limiter is None:
+            response = await client.get('/getUltraSrtFcst', params=params)
         else:
-            return returnFormat("103", f"API request failed with status {response.status_code}")
+            async with limiter:
+                response = await client.get('/getUltraSrtFcst', params=params)
+    except httpx.TimeoutException:
+        return None, ("103", "API request timed out")
+    except httpx.TransportError as e:
+        return None, ("103", f"API request failed: {str(e)}")
+
+    if response.status_code != 200:
+        return None, ("103", f"API request failed with status {response.status_code}")
+    try:
+        resultCode, resultMsg, weather_summary = parseWeatherXml(response.content)
+    except (ET.ParseError, ValueError):
+        return None, ("102", "Failed to parse XML response")
+    if resultCode is None:
+        return None, ("102", "Failed to parse XML response")
+    if resultCode == "00":
+        return weather_summary, None
+    return None, (resultCode, resultMsg)
+
+async def fetchUltraSrtFcst(nx, ny, rounded_time: datetime, client: AsyncHttpClient = None, attempts: int = FORECAST_ATTEMPTS, hedge: int = FORECAST_HEDGE, limiter: asyncio.Semaphore = None):
+    """
+    최근 attempts 개의 발표시각 중 가장 최신의 정상 응답을 반환
+    최신 발표시각부터 hedge 개만 동시에 조회하고, 실패한 만큼만 이전 발표시각을 추가로 조회함
+    반환 : (weather_summary, None) 또는 (None, (resultCode, resultMsg))
+    """
+    candidates = [rounded_time - timedelta(minutes=30 * i) for i in range(attempts)]
+    tasks = []
+
+    def start_next():
+        if len(tasks) < len(candidates):
+            tasks.append(asyncio.ensure_future(requestUltraSrtFcst(nx, ny, candidates[len(tasks)], client, limiter)))
+
+    for _ in range(max(hedge, 1)):
+        start_next()
+    errors = []
+    try:
+        # 최신 발표시각부터 결과를 확인하고, 정상 응답이 나오면 나머지 요청은 취소
+        for i in range(len(candidates)):
+            weather_summary, error = await tasks[i]
+            if weather_summary is not None:
+                return weather_summary, None
+            errors.append(error)
+            start_next()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    for error in errors:
+        if error[0] in ("102", "103"):
+            return None, error
+    return None, ("104", "No valid weather data found after attempts")
 
+async def getForecast(nx, ny, current_time: datetime = None, client: AsyncHttpClient = None,
+                      attempts: int = FORECAST_ATTEMPTS, hedge: int = FORECAST_HEDGE, limiter: asyncio.Semaphore = None):
+    current_time = current_time or datetime.now()
+    # 가장 최근에 조회 가능해진 발표시각 기준으로 캐시를 공유함
+    rounded_time = getRoundedTime(current_time - FORECAST_DELAY)
+    cache_key = (nx, ny, rounded_time.strftime('%Y%m%d'), rounded_time.strftime('%H%M'))
+    error = {}
 
-    return returnFormat("104", "No valid weather data found after attempts")
\ No newline at end of file
+    async def load():
+        weather_summary, error['result'] = await fetchUltraSrtFcst(nx, ny, rounded_time, client, attempts, hedge, limiter)
+        return weather_summary
+
+    # 같은 격자, 같은 발표시각 요청은 캐시를 공유하고 동시에 들어온 요청은 한번만 호출함
+    weather_summary = await forecast_cache.get_or_load(cache_key, load, forecastExpiry(rounded_time))
+    if weather_summary is not None:
+        return returnFormat("00", "NORMAL_SERVICE", weather_summary)
+
+    # 다른 요청의 호출 결과를 기다렸다가 실패한 경우
+    return returnFormat(*(error.get('result') or ("104", "No valid weather data found after attempts")))
+
+async def prefetchForecasts(grids, concurrency: int = 8, current_time: datetime = None):
+    """
+    격자 목록의 예보를 미리 조회해서 캐시에 저장
+    concurrency : 격자 수가 아니라 기상청으로 동시에 보내는 요청 수 제한
+    반환 : 성공한 격자 수
+    """
+    limiter = asyncio.Semaphore(concurrency)
+    async with AsyncHttpClient(base_url=KMA_BASE_URL, timeout=10.0, retries=2) as client:
+        results = await asyncio.gather(*[
+            getForecast(nx, ny, current_time, client, attempts=PREFETCH_ATTEMPTS, hedge=PREFETCH_HEDGE, limiter=limiter)
+            for nx, ny in set(grids)
+        ], return_exceptions=True)
+    return sum(1 for result in results if isinstance(result, dict) and result['status'] == "00")
+
+@tool(description="사용자 위치의 초단기 날씨 예보를 조회합니다.", cacheable=True, cache_ttl=300)
+async def getUltraSrtFcst(db: Session = None, context: ToolContext = None):
+    if context.latitude is None or context.longitude is None:
+        return returnFormat("105", "사용자 위치 정보가 없습니다.")
+    
+    nearest_x, nearest_y = location_grid.nearest(context.latitude, context.longitude)
+    return await getForecast(nearest_x, nearest_y)
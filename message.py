@@ -3,20 +3,24 @@
 ## DB를 바꿀필요가 있음
 
 import json
+import asyncio
+import heapq
+import threading
 import pytz
 import firebase_admin
 import schedule
 import time
 
 from firebase_admin import credentials, messaging
-from sqlalchemy import create_engine, and_
+from openai import AsyncOpenAI
+from sqlalchemy import create_engine, and_, case, insert, literal, select, DateTime, Time
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime, timedelta, time
-from collections import defaultdict
 
 from utils.config import variables
 
 from models import ScheduledMessage, MedicationReminder, HospitalReminder, User, UserSchedule
+from functions import forecast_cache, get_user_grids, prefetchForecasts, hospital_detail_cache, hospital_index, refreshHospitalSnapshot, compact_conversations
 
 local_tz = pytz.timezone('Asia/Seoul')
 today = datetime.now(local_tz).date()
@@ -60,183 +64,375 @@ def send_action_message(user_id, title, body, action):
         except Exception as e:
             print('Error sending message:', e)
 
-def send_message(status = 'pending'):
+# FCM send_each 한번에 보낼 수 있는 최대 메세지 수
+FCM_BATCH_SIZE = 500
+
+def send_message(message_ids):
+    """
+    발송 시각이 된 메세지를 한번에 가져와서 FCM_BATCH_SIZE 개씩 발송하고, 배치마다 상태를 한번에 갱신
+    """
     with get_db() as db:
-        _ = db.query(ScheduledMessage).filter(
+        # 이미 처리된 메세지는 건너뛰고, 발송 중인 메세지는 sending 으로 표시해서 가져감
+        claimed = db.query(ScheduledMessage).filter(
             and_(
-                ScheduledMessage.status == status,
-                ScheduledMessage.scheduled_time <= datetime.now()
+                ScheduledMessage.id.in_(message_ids),
+                ScheduledMessage.status == 'pending'
             )
-        ).first()
-        if _ is None:
+        ).update({"status": "sending"}, synchronize_session=False)
+        db.commit()
+        if not claimed:
             return
-        _token = db.query(User).filter(
-            User.user_id == _.user_id
-        ).first().fcm_token
+        messages = db.query(ScheduledMessage.id, ScheduledMessage.title, ScheduledMessage.content, User.fcm_token).join(
+            User, User.user_id == ScheduledMessage.user_id
+        ).filter(
+            and_(
+                ScheduledMessage.id.in_(message_ids),
+                ScheduledMessage.status == 'sending'
+            )
+        ).all()
 
-        data = messaging.Message(
-            data={
-                'type': 'showOverlay',
-                'title': _.title,
-                'body': _.content,
-            },
-            android=messaging.AndroidConfig(
-                direct_boot_ok=True,
-            ),
-            token = _token,
-        )
-        try:
-            response = messaging.send(data)
-            print('time:', datetime.now(), 'Successfully sent message:', response, 'Message:', _.content)
-            db.query(ScheduledMessage).filter(ScheduledMessage.id == _.id).update({"status": "sent"})
+        for start in range(0, len(messages), FCM_BATCH_SIZE):
+            batch = messages[start:start + FCM_BATCH_SIZE]
+            sendable = [message for message in batch if message.fcm_token]
+            sent_ids = []
+            if sendable:
+                data = [
+                    messaging.Message(
+                        data={
+                            'type': 'showOverlay',
+                            'title': message.title,
+                            'body': message.content,
+                        },
+                        android=messaging.AndroidConfig(
+                            direct_boot_ok=True,
+                        ),
+                        token = message.fcm_token,
+                    )
+                    for message in sendable
+                ]
+                try:
+                    response = messaging.send_each(data)
+                    sent_ids = [message.id for message, result in zip(sendable, response.responses) if result.success]
+                    for message, result in zip(sendable, response.responses):
+                        if not result.success:
+                            print('Error sending message:', message.id, result.exception)
+                except Exception as e:
+                    print('Error sending messages:', e)
+            print('time:', datetime.now(), 'Sent messages:', len(sent_ids), '/', len(batch))
+
+            # 토큰이 없거나 발송에 실패한 메세지는 failed
+            db.query(ScheduledMessage).filter(
+                ScheduledMessage.id.in_([message.id for message in batch])
+            ).update(
+                {"status": case((ScheduledMessage.id.in_(sent_ids), "sent"), else_="failed")},
+                synchronize_session=False
+            )
             db.commit()
-            db.refresh()
-        except Exception as e:
-            print('Error sending message:', e)
-            db.query(ScheduledMessage).filter(ScheduledMessage.id == _.id).update({"status": "failed"})
+
+# 발송 대기 메세지 디스패처
+# pending 메세지의 (scheduled_time, id) 를 min-heap 에 올려두고 가장 빠른 발송 시각(또는 다음 schedule 작업)까지 잠들었다가 발송함
+# 메세지는 scheduling_messages 에서만 만들어지므로 그 뒤 notify() 로 다시 읽고,
+# DB 를 직접 수정한 경우를 위해 DISPATCH_REFRESH_INTERVAL 마다 한번 다시 읽음
+DISPATCH_REFRESH_INTERVAL = timedelta(minutes=10)
+# 전날 메세지를 정리하고 새로 만드는 동안은 발송하지 않음
+DISPATCH_START_TIME = time(0, 30)
+
+class MessageDispatcher:
+    def __init__(self, refresh_interval: timedelta = DISPATCH_REFRESH_INTERVAL, clock=datetime.now):
+        self.refresh_interval = refresh_interval
+        self.clock = clock # 테스트에서 시각을 바꿀 수 있도록 주입
+        self._heap = []
+        self._loaded_at = None
+        self._wakeup = threading.Event()
+
+    def notify(self):
+        # 다음 루프에서 heap 을 다시 읽도록 표시하고 대기 중이면 깨움
+        self._loaded_at = None
+        self._wakeup.set()
+
+    def release(self):
+        # 발송 중에 프로세스가 종료되어 sending 으로 남은 메세지를 다시 발송 대기로 되돌림 (시작 시 한번)
+        with get_db() as db:
+            db.query(ScheduledMessage).filter(ScheduledMessage.status == 'sending').update(
+                {"status": "pending"}, synchronize_session=False
+            )
             db.commit()
 
+    def load(self):
+        with get_db() as db:
+            rows = db.query(ScheduledMessage.scheduled_time, ScheduledMessage.id).filter(
+                ScheduledMessage.status == 'pending'
+            ).all()
+        self._heap = [(row.scheduled_time, row.id) for row in rows]
+        heapq.heapify(self._heap)
+        self._loaded_at = self.clock()
+
+    def refresh(self, now: datetime):
+        if self._loaded_at is None or now - self._loaded_at >= self.refresh_interval:
+            self.load()
+
+    def pop_due(self, now: datetime):
+        message_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            message_ids.append(heapq.heappop(self._heap)[1])
+        return message_ids
+
+    def wait(self, now: datetime):
+        """
+        다음 메세지 발송 시각, 다음 schedule 작업, 다음 갱신 시각 중 가장 빠른 시점까지 대기
+        """
+        if self._loaded_at is None:
+            return
+        timeout = (self._loaded_at + self.refresh_interval - now).total_seconds()
+        if self._heap:
+            next_time = max(self._heap[0][0], datetime.combine(now.date(), DISPATCH_START_TIME))
+            timeout = min(timeout, (next_time - now).total_seconds())
+        idle = schedule.idle_seconds()
+        if idle is not None:
+            timeout = min(timeout, idle)
+        if timeout > 0:
+            self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def run_pending(self):
+        now = self.clock()
+        self.refresh(now)
+        if now.time() >= DISPATCH_START_TIME:
+            message_ids = self.pop_due(now)
+            if message_ids:
+                send_message(message_ids)
+
+dispatcher = MessageDispatcher()
+
+DEFAULT_USER_SCHEDULE = {
+    "morning_time": time(7, 30),
+    "breakfast_time": time(8, 30),
+    "lunch_time": time(12, 0),
+    "dinner_time": time(18, 0),
+    "bedtime_time": time(22, 0),
+}
+# 복용 시점 -> (기준 시간, 기준 시간에서 더할 시간)
+MEDICATION_TIMES = {
+    "dose_morning": ("morning_time", timedelta(0)),
+    "dose_breakfast_after": ("breakfast_time", -timedelta(minutes=40)),
+    "dose_breakfast_before": ("breakfast_time", timedelta(minutes=20)),
+    "dose_lunch_after": ("lunch_time", -timedelta(minutes=40)),
+    "dose_lunch_before": ("lunch_time", timedelta(minutes=20)),
+    "dose_dinner_after": ("dinner_time", -timedelta(minutes=40)),
+    "dose_dinner_before": ("dinner_time", timedelta(minutes=20)),
+    "dose_bedtime": ("bedtime_time", -timedelta(minutes=30)),
+}
+SCHEDULE_INSERT_CHUNK = 1000
+
+def medication_message(attribute, contents):
+    combined_content = f"{', '.join(contents)}"
+    if "morning" in attribute:
+        return f"좋은 아침입니다. {combined_content} 드셔야해요"
+    elif "bedtime" in attribute:
+        return f"주무시기 전에 {combined_content} 드셔야해요"
+    elif "breakfast_after" in attribute:
+        return f"아침 식사 30분 전에 {combined_content} 드셔야해요"
+    elif "lunch_after" in attribute:
+        return f"점심 식사 30분 전에 {combined_content} 드셔야해요"
+    elif "dinner_after" in attribute:
+        return f"저녁 식사 30분 전에 {combined_content} 드셔야해요"
+    elif "breakfast_before" in attribute:
+        return f"아침 식사 30분이 지난거같네요. {combined_content} 드셔야해요"
+    elif "lunch_before" in attribute:
+        return f"점심 식사 30분이 지난거같네요. {combined_content} 드셔야해요"
+    elif "dinner_before" in attribute:
+        return f"저녁 식사 30분이 지난거같네요. {combined_content} 드셔야해요"
+
+def hospital_message(reminder):
+    hour = reminder.reminder_time.hour
+    minute = reminder.reminder_time.minute
+
+    if hour < 12:
+        period = "오전"
+        display_hour = hour if hour != 0 else 12
+    else:
+        period = "오후"
+        display_hour = hour - 12 if hour > 12 else hour
+    return (f"{period} {display_hour}시 {minute}분에 {reminder.content} 방문일정이 있습니다." + (f", {reminder.additional_info}" if reminder.additional_info else "")).replace(" 0분", "").replace(" 30분", "반")
+
 def scheduling_messages():
-    scheduled_messages = []
-    grouped_messages = defaultdict(list)
+    """
+    오늘 보낼 알림 메세지 생성
+    사용자별로 조회하지 않고 오늘 유효한 알림을 한번에 조회한 뒤, 같은 사용자의 같은 시간 메세지를 합쳐서 한번에 저장
+    """
+    # 프로세스가 여러 날 실행되므로 실행할 때의 날짜 사용
+    today = datetime.now(local_tz).date()
+    # (user_id, scheduled_time) -> [title, 내용 목록]
+    grouped_messages = {}
+
+    def add_message(user_id, title, content, scheduled_time):
+        entry = grouped_messages.setdefault((user_id, scheduled_time), [title, []])
+        entry[1].append(content)
+
     with get_db() as db:
         try:
             db.query(ScheduledMessage).delete()
             db.commit()
-            users = db.query(User).all()
-            for user in users:
-                if user.fcm_token is not None:
-                    user_schedule = db.query(UserSchedule).filter(UserSchedule.user_id == user.user_id).first()
-                    if user_schedule is None:
-                        new_schedule = UserSchedule(
-                            user_id=user.user_id,
-                            morning_time=time(7, 30),
-                            breakfast_time=time(8, 30),
-                            lunch_time=time(12, 0),
-                            dinner_time=time(18, 0),
-                            bedtime_time=time(22, 0)
-                        )
-                        db.add(new_schedule)
-                        db.commit()
-                        db.refresh(new_schedule)
-                        user_schedule = db.query(UserSchedule).filter(UserSchedule.user_id == user.user_id).first()
-
-                    medication_reminders = db.query(MedicationReminder).filter(
-                        and_(
-                            MedicationReminder.user_id == user.user_id,
-                            MedicationReminder.start_date <= today,
-                            MedicationReminder.end_date >= today
-                        )
-                    ).all()
-
-                    _reminders = {
-                        "dose_morning": [user_schedule.morning_time, []],
-                        "dose_breakfast_after": [adjust_time(user_schedule.breakfast_time, -timedelta(minutes=40)), []],
-                        "dose_breakfast_before": [adjust_time(user_schedule.breakfast_time, timedelta(minutes=20)), []],
-                        "dose_lunch_after": [adjust_time(user_schedule.lunch_time, -timedelta(minutes=40)), []],
-                        "dose_lunch_before": [adjust_time(user_schedule.lunch_time, timedelta(minutes=20)), []],
-                        "dose_dinner_after": [adjust_time(user_schedule.dinner_time, -timedelta(minutes=40)), []],
-                        "dose_dinner_before": [adjust_time(user_schedule.dinner_time, timedelta(minutes=20)), []],
-                        "dose_bedtime": [adjust_time(user_schedule.bedtime_time, -timedelta(minutes=30)), []]
-                    }
-
-                    for reminder in medication_reminders:
-                        for attribute, (scheduled_time, contents) in _reminders.items():
-                            if getattr(reminder, attribute):
-                                contents.append(reminder.content)
-
-                    # 약물 알림 메시지 생성
-                    for attribute, (scheduled_time, contents) in _reminders.items():
-                        if contents:
-                            # 중복 제거를 위해 set 사용
-                            unique_contents = set(contents)
-                            combined_content = f"{', '.join(unique_contents)}"
-                            
-                            if "morning" in attribute:
-                                combined_content = f"좋은 아침입니다. {combined_content} 드셔야해요"
-                            elif "bedtime" in attribute:
-                                combined_content = f"주무시기 전에 {combined_content} 드셔야해요"
-                            elif "breakfast_after" in attribute:
-                                combined_content = f"아침 식사 30분 전에 {combined_content} 드셔야해요"
-                            elif "lunch_after" in attribute:
-                                combined_content = f"점심 식사 30분 전에 {combined_content} 드셔야해요"
-                            elif "dinner_after" in attribute:
-                                combined_content = f"저녁 식사 30분 전에 {combined_content} 드셔야해요"
-                            elif "breakfast_before" in attribute:
-                                combined_content = f"아침 식사 30분이 지난거같네요. {combined_content} 드셔야해요"
-                            elif "lunch_before" in attribute:
-                                combined_content = f"점심 식사 30분이 지난거같네요. {combined_content} 드셔야해요"
-                            elif "dinner_before" in attribute:
-                                combined_content = f"저녁 식사 30분이 지난거같네요. {combined_content} 드셔야해요"
-
-                            scheduled_messages.append({
-                                "user_id": user.user_id,
-                                "title": "약드세요!",
-                                "content": combined_content,
-                                "scheduled_time": datetime.combine(today, scheduled_time)
-                            })
-                    hospital_reminders = db.query(HospitalReminder).filter(
-                        and_(HospitalReminder.user_id == user.user_id,
-                            HospitalReminder.start_date == today)
-                    ).all()
-
-                    for reminder in hospital_reminders:
-                        hour = reminder.reminder_time.hour
-                        minute = reminder.reminder_time.minute
-
-                        if hour < 12:
-                            period = "오전"
-                            display_hour = hour if hour != 0 else 12
-                        else:
-                            period = "오후"
-                            display_hour = hour - 12 if hour > 12 else hour 
-                        _title = f"병원 예약"
-                        _body = (f"{period} {display_hour}시 {minute}분에 {reminder.content} 방문일정이 있습니다." + (f", {reminder.additional_info}" if reminder.additional_info else "")).replace(" 0분", "").replace(" 30분", "반")
-                        scheduled_messages.append({
-                            "user_id": user.user_id,
-                            "title": _title,
-                            "content": _body,
-                            "scheduled_time": datetime.combine(today, reminder.reminder_time) - timedelta(minutes=60)
-                        })
-                        
-                for message in scheduled_messages:
-                    key = message["scheduled_time"]
-                    grouped_messages[key].append(message)
-
-                scheduled_messages = []
-                for time, contents in grouped_messages.items():
-                    unique_contents = set(msg["content"] for msg in contents)
-                    combined_content = ", ".join(unique_contents)
-            
-                    scheduled_messages.append({
-                        "user_id": contents[0]["user_id"],
-                        "title": contents[0]["title"],
-                        "content": combined_content,
-                        "scheduled_time": time
-                    })
-                for message in scheduled_messages:
-                    new_message = ScheduledMessage(
-                        user_id=message["user_id"],
-                        title=message["title"],
-                        content=message["content"],
-                        scheduled_time=message["scheduled_time"],
-                        status="pending"
-                    )
-                    db.add(new_message)
+
+            # 식사 시간이 없는 사용자는 기본값으로 한번에 추가
+            # ORM 기본값(datetime.utcnow)이 적용되지 않으므로 생성/수정 시각도 함께 넣음
+            now = datetime.utcnow()
+            db.execute(insert(UserSchedule).from_select(
+                ["user_id", *DEFAULT_USER_SCHEDULE, "created_at", "updated_at"],
+                select(
+                    User.user_id,
+                    *[literal(value, Time) for value in DEFAULT_USER_SCHEDULE.values()],
+                    literal(now, DateTime),
+                    literal(now, DateTime),
+                ).outerjoin(
+                    UserSchedule, UserSchedule.user_id == User.user_id
+                ).where(
+                    and_(User.fcm_token.isnot(None), UserSchedule.user_id.is_(None))
+                )
+            ))
+
+            medication_reminders = db.query(MedicationReminder, UserSchedule).join(
+                User, User.user_id == MedicationReminder.user_id
+            ).join(
+                UserSchedule, UserSchedule.user_id == MedicationReminder.user_id
+            ).filter(
+                and_(
+                    User.fcm_token.isnot(None),
+                    MedicationReminder.start_date <= today,
+                    MedicationReminder.end_date >= today
+                )
+            ).order_by(MedicationReminder.user_id, MedicationReminder.reminder_id).all()
+
+            # 약물 알림 메시지 생성, (user_id, 복용 시점) -> (시간, 약 목록)
+            medications = {}
+            for reminder, user_schedule in medication_reminders:
+                for attribute, (schedule_field, delta) in MEDICATION_TIMES.items():
+                    base_time = getattr(user_schedule, schedule_field)
+                    if getattr(reminder, attribute) and base_time is not None:
+                        entry = medications.setdefault((reminder.user_id, attribute), (adjust_time(base_time, delta), []))
+                        # 중복 제거
+                        if reminder.content not in entry[1]:
+                            entry[1].append(reminder.content)
+            for (user_id, attribute), (scheduled_time, contents) in medications.items():
+                add_message(user_id, "약드세요!", medication_message(attribute, contents), datetime.combine(today, scheduled_time))
+
+            hospital_reminders = db.query(HospitalReminder).join(
+                User, User.user_id == HospitalReminder.user_id
+            ).filter(
+                and_(
+                    User.fcm_token.isnot(None),
+                    HospitalReminder.start_date == today
+                )
+            ).order_by(HospitalReminder.user_id, HospitalReminder.reminder_id).all()
+
+            for reminder in hospital_reminders:
+                add_message(
+                    reminder.user_id, "병원 예약", hospital_message(reminder),
+                    datetime.combine(today, reminder.reminder_time) - timedelta(minutes=60)
+                )
+
+            # 같은 사용자의 같은 시간 메세지는 하나로 합침
+            scheduled_messages = [
+                {
+                    "user_id": user_id,
+                    "title": title,
+                    "content": ", ".join(dict.fromkeys(contents)),
+                    "scheduled_time": scheduled_time,
+                    "status": "pending",
+                }
+                for (user_id, scheduled_time), (title, contents) in grouped_messages.items()
+            ]
+            for start in range(0, len(scheduled_messages), SCHEDULE_INSERT_CHUNK):
+                db.execute(insert(ScheduledMessage), scheduled_messages[start:start + SCHEDULE_INSERT_CHUNK])
+            db.commit()
+            print('time:', datetime.now(), 'Scheduled messages:', len(scheduled_messages))
 
         except Exception as e:
             print(f"오류 발생: {e}")
             db.rollback()
-        finally:
-            db.commit()
+    dispatcher.notify()
+
+
+# 외부 api 를 호출하는 작업은 알림 발송 루프를 막지 않도록 별도 스레드에서 실행
+# 이전 실행이 아직 끝나지 않았으면 이번 실행은 건너뜀
+background_jobs = {}
+
+def run_in_background(job):
+    def start():
+        running = background_jobs.get(job.__name__)
+        if running is not None and running.is_alive():
+            print('time:', datetime.now(), 'Skipped job, previous run still in progress:', job.__name__)
+            return
+        thread = threading.Thread(target=job, name=job.__name__, daemon=True)
+        background_jobs[job.__name__] = thread
+        thread.start()
+    return start
+
+# 최근 위치를 갱신한 사용자만 날씨 캐시를 미리 채움
+ACTIVE_USER_WINDOW = timedelta(days=3)
+PREFETCH_CONCURRENCY = 8
 
+def prefetch_weather():
+    with get_db() as db:
+        user_grids = get_user_grids(db, since=datetime.utcnow() - ACTIVE_USER_WINDOW)
+    grids = set(user_grids.values())
+    if not grids:
+        return
+    try:
+        warmed = asyncio.run(prefetchForecasts(grids, concurrency=PREFETCH_CONCURRENCY))
+        print('time:', datetime.now(), 'Prefetched weather:', warmed, '/', len(grids), 'grids')
+    except Exception as e:
+        print('Error prefetching weather:', e)
+
+def evict_weather_cache():
+    removed = forecast_cache.evict_expired()
+    print('time:', datetime.now(), 'Evicted weather cache files:', removed)
+
+def purge_hospital_cache():
+    removed = hospital_detail_cache.purge_expired()
+    # hit/miss 통계는 api 프로세스에서 집계됨 (/assistant/dev/stats)
+    print('time:', datetime.now(), 'Purged hospital detail cache:', removed, 'size:', hospital_detail_cache.stats()["size"])
+
+# 로컬 병원 검색용 스냅샷 갱신 (api 서버에서 한번이라도 조회된 진료과목만)
+def refresh_hospital_snapshots():
+    async def refresh(codes):
+        for code in codes:
+            try:
+                count = await refreshHospitalSnapshot(code)
+                print('time:', datetime.now(), 'Refreshed hospital snapshot:', code, count)
+            except Exception as e:
+                print('Error refreshing hospital snapshot:', code, e)
+    asyncio.run(refresh(hospital_index.codes()))
+
+# 긴 대화 스레드를 요약 후 새 스레드로 교체
+def compact_assistant_threads():
+    async def compact():
+        client = AsyncOpenAI(api_key=variables.OPENAI_API_KEY)
+        with get_db() as db:
+            return await compact_conversations(db, client)
+    try:
+        compacted = asyncio.run(compact())
+        print('time:', datetime.now(), 'Compacted assistant threads:', compacted)
+    except Exception as e:
+        print('Error compacting assistant threads:', e)
 
-cred = credentials.Certificate("fcm_key.json")
-firebase_admin.initialize_app(cred)
+# functions 패키지 import 시 이미 초기화되어 있을 수 있음
+if not firebase_admin._apps:
+    cred = credentials.Certificate("fcm_key.json")
+    firebase_admin.initialize_app(cred)
 
 if __name__ == '__main__':
     schedule.every().day.at("00:01").do(scheduling_messages)
+    schedule.every(30).minutes.do(evict_weather_cache)
+    schedule.every().day.at("03:00").do(purge_hospital_cache)
+    schedule.every().day.at("03:30").do(run_in_background(refresh_hospital_snapshots))
+    schedule.every().day.at("04:00").do(run_in_background(compact_assistant_threads))
+    # 기상청 초단기예보 발표(30분 간격) 후 조회 가능해지는 시점 직후
+    schedule.every().hour.at(":17").do(run_in_background(prefetch_weather))
+    schedule.every().hour.at(":47").do(run_in_background(prefetch_weather))
+    # 발송할 메세지나 schedule 작업이 없는 동안은 잠들어 있음
+    dispatcher.release()
     while True:
         schedule.run_pending()
-        if datetime.now().time() > time(0, 30):
-            send_message()
\ No newline at end of file
+        dispatcher.run_pending()
+        dispatcher.wait(dispatcher.clock())
\ No newline at end of file
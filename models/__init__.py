@@ -2,6 +2,7 @@ from .models import (
     User,
     AssistantThread,
     AssistantMessage,
+    AssistantMemory,
     RefreshToken,
     UserCreate, 
     AssistantThreadCreate, 
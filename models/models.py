@@ -54,7 +54,8 @@ class AssistantThread(Base):
 # AssistantMessages 테이블 모델 정의
 class AssistantMessage(Base):
     __tablename__ = "assistant_messages"
-    
+    # 스레드별 메세지 조회(커서 페이지네이션, 최신 메세지)용
+    __table_args__ = (Index('idx_thread_id_created_at_assistant_messages', 'thread_id', 'created_at', 'message_id'),)
     message_id = Column(Integer, primary_key=True, index=True)
     thread_id = Column(String(36), ForeignKey('assistant_threads.thread_id', ondelete="SET NULL"), nullable=True)
     sender_type = Column(String(18), nullable=False)
@@ -63,6 +64,16 @@ class AssistantMessage(Base):
 
     thread = relationship("AssistantThread", back_populates="message")
 
+# AssistantMemory 테이블 모델 정의
+# 오래된 대화를 요약한 사용자별 기억, last_message_id 까지의 메세지가 요약에 포함됨
+class AssistantMemory(Base):
+    __tablename__ = "assistant_memories"
+
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete="CASCADE"), primary_key=True, index=True)
+    summary = Column(TEXT, nullable=False)
+    last_message_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class RefreshToken(Base):
     __tablename__ = "refresh_tokens"
@@ -81,7 +92,7 @@ class ScheduledMessage(Base):
     title = Column(TEXT, nullable=False)
     content = Column(TEXT, nullable=False)
     scheduled_time = Column(DateTime, nullable=False)
-    status = Column(String(20), default="pending")  # pending, sent, failed
+    status = Column(String(20), default="pending")  # pending, sending, sent, failed
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="scheduled_messages")
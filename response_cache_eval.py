@@ -0,0 +1,93 @@
+import argparse
+import json
+import sys
+from functions.response_cache import ResponseCache
+
+# 응답 캐시 오프라인 평가
+# 입력 jsonl 한 줄 형식
+#   {"query": "안녕 애비야", "group": "greeting"}  : 같은 group 의 질문은 같은 답변을 받아도 되는 질문, 캐시하면 안되는 질문은 group 생략
+#                                                  user_id 를 지정하지 않으면 모두 같은 사용자의 질문으로 봄
+#   {"messages": [...]}                          : data_tool 로 만든 대화 데이터, 사용자 질문만 순서대로 사용 (hit rate 만 계산)
+#                                                  캐시는 사용자별이므로 대화(줄)마다 다른 사용자로 봄
+# 캐시에 없는 질문은 답변 대신 group 을 저장하고, hit 한 답변의 group 이 질문의 group 과 다르면 잘못된 hit 로 집계함
+# 사용 : python response_cache_eval.py train/messages/conversation_4.jsonl --threshold 0.7
+
+EVAL_USER_ID = 0
+
+SAMPLE_QUERIES = [
+    {"query": "안녕", "group": "greeting"},
+    {"query": "안녕 애비야", "group": "greeting"},
+    {"query": "애비야 안녕!", "group": "greeting"},
+    {"query": "안녕하세요", "group": "greeting"},
+    {"query": "반가워", "group": "greeting"},
+    {"query": "고마워", "group": "thanks"},
+    {"query": "고마워요", "group": "thanks"},
+    {"query": "정말 고마워", "group": "thanks"},
+    {"query": "감사합니다", "group": "thanks"},
+    {"query": "너는 누구야?", "group": "identity"},
+    {"query": "넌 누구니", "group": "identity"},
+    {"query": "이름이 뭐야", "group": "identity"},
+    {"query": "뭘 할 수 있어?", "group": "help"},
+    {"query": "너 뭘 할 수 있니", "group": "help"},
+    {"query": "오늘 날씨 어때?"},
+    {"query": "오늘 날씨 어때"},
+    {"query": "글씨 크게 해줘"},
+    {"query": "근처 병원 알려줘"},
+    {"query": "아침 8시에 약 먹으라고 알려줘"},
+    {"query": "내 이름이 뭐야?"},
+    {"query": "우리 아들한테 전화해줘"},
+    {"query": "고마워 근데 내일 비 와?"},
+]
+
+def load_queries(path: str):
+    queries = []
+    with open(path, "r", encoding="utf-8") as file:
+        for number, line in enumerate(file):
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if "messages" in data:
+                queries += [{"query": message["content"], "user_id": f"conversation_{number}"} for message in data["messages"] if message.get("role") == "user"]
+            else:
+                queries.append(data)
+    return queries
+
+def evaluate(queries, threshold: float, labeled: bool):
+    cache = ResponseCache(enabled=True, threshold=threshold)
+    wrong_hits = []
+    for item in queries:
+        group = item.get("group")
+        user_id = item.get("user_id", EVAL_USER_ID)
+        answer = cache.lookup(user_id, item["query"])
+        if answer is None:
+            cache.store(user_id, item["query"], group or item["query"])
+        elif labeled and answer != group:
+            wrong_hits.append((item["query"], answer))
+    return cache.stats(), wrong_hits
+
+def main():
+    parser = argparse.ArgumentParser(description="응답 캐시 오프라인 평가")
+    parser.add_argument("path", nargs="?", help="평가할 jsonl 파일 (없으면 기본 예시 사용)")
+    parser.add_argument("--threshold", type=float, default=None, help="임베딩 유사도 기준")
+    args = parser.parse_args()
+
+    queries = load_queries(args.path) if args.path else SAMPLE_QUERIES
+    if not queries:
+        print("평가할 질문이 없습니다.")
+        return 1
+    threshold = args.threshold if args.threshold is not None else ResponseCache().threshold
+    labeled = any("group" in item for item in queries)
+    stats, wrong_hits = evaluate(queries, threshold, labeled)
+
+    print(f"queries: {len(queries)}, threshold: {threshold}")
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    if labeled:
+        hits = stats["hits"]
+        print(f"wrong hits: {len(wrong_hits)}, precision: {round((hits - len(wrong_hits)) / hits, 4) if hits else 0.0}")
+        for query, answer in wrong_hits:
+            print(f"  {query} -> {answer}")
+    return 1 if wrong_hits else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,20 @@
+import asyncio
 import json
-from typing import Any
+import time
+from typing import Any, Optional
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy import desc
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, desc, or_
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
-from openai import AssistantEventHandler, OpenAI
+from openai import AsyncAssistantEventHandler, AsyncOpenAI
 from openai.types.beta.threads import Message
 from openai import OpenAIError
 
 from models import  AssistantMessageCreate, AssistantThread, AssistantMessage, User
 from database import get_db, handle_exceptions
-from functions import getUltraSrtFcst, register_medication_remind, register_hospital_remind, getHospBasisList, remove_medication_remind, remove_hospital_remind, get_medication_remind, get_hospital_remind, update_meal_time, send_message, call_contact, launch_specific_app, openFontSizeSettings
+from functions import tool_registry, run_state_store, run_queue, response_cache, hospital_detail_cache, ToolContext, match_device_command, run_device_command, DEVICE_COMMAND_FAST_PATH
 from utils.config import variables
 from utils import get_current_user
 
@@ -27,7 +30,8 @@ __INSTRUCTIONS__ = """
 router = APIRouter()
 assistant_id = variables.OPENAI_ASSISTANT_ID
 openai_api_key = variables.OPENAI_API_KEY
-client = OpenAI(api_key=openai_api_key)
+ADMIN_PASSWORD = getattr(variables, 'ADMIN_PASSWORD', 'seniorbuddy-admin')
+client = AsyncOpenAI(api_key=openai_api_key)
 
 def override(method: Any) -> Any:
     return method
@@ -45,7 +49,7 @@ def override(method: Any) -> Any:
 
 # 스레드 생성
 async def create_assistant_thread(user_id: int, db: Session = Depends(get_db)):
-    thread = client.beta.threads.create()
+    thread = await client.beta.threads.create()
     
     assistant_thread = AssistantThread(
         user_id=user_id,
@@ -75,7 +79,7 @@ async def delete_assistant_thread(request: Request, user: User = Depends(get_cur
     thread = db.query(AssistantThread).filter(AssistantThread.user_id == user.user_id).first()
     if not thread:
         raise HTTPException(status_code=404, detail="쓰레드를 찾을 수 없습니다.")
-    client.beta.threads.delete(thread.thread_id)
+    await client.beta.threads.delete(thread.thread_id)
     db.delete(thread)
     db.commit()
     return {"message": "쓰레드를 삭제했습니다."}
@@ -89,68 +93,235 @@ async def delete_assistant_thread(request: Request, user: User = Depends(get_cur
 #                                                           d"     YD           
 #                                                           "Y88888P'           
 
-@handle_exceptions
-@router.post("/message")
-async def add_and_run_message(request: Request, message: AssistantMessageCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+BUSY_RESPONSE = {"status": "Message created but not executed", "content": "죄송합니다. 잠시 후 다시 시도해주세요."}
+FAILED_RESPONSE = {"status": "Message created but not executed", "content": "죄송합니다. 잠시 뒤 다시 말씀해주세요."}
+
+# 스레드 상태 확인 후 사용자 메세지를 openai 스레드와 DB에 추가
+# 반환 : (thread, None) 또는 실행할 수 없는 경우 (None, 응답)
+async def add_user_message(request: Request, content: str, user: User, db: Session):
     thread = db.query(AssistantThread).filter(AssistantThread.user_id == user.user_id).first()
     if not thread:
         thread = await create_assistant_thread(user.user_id, db)
+    if run_state_store.is_active(thread.thread_id):
+        # 메세지 이미 실행 중일 때
+        return None, BUSY_RESPONSE
+    # 응답 전에 같은 스레드로 들어온 요청이 실행되지 않도록 바로 대기 상태로 표시
+    run_state_store.set(thread.thread_id, "thread.run.queued")
     try:
-        if thread.run_state != "None" or thread.run_state in ["thread.run.completed", "thread.run.cancelled"]: # completed, cancelled 상태를 분리해야할 필요가 있는지 확인해봐야함.
-            response = client.beta.threads.messages.create(
-                thread_id=thread.thread_id,
-                role="user",
-                content=message.content
-            )
-        elif thread.run_state in ["thread.run.failed"]: # 쓰레드 run 실패 후 메세지 요청 시 쓰레드 재생성?
-            delete_assistant_thread(request, user, db)
-            response = client.beta.threads.messages.create(
-                thread_id=thread.thread_id,
-                role="user",
-                content=message.content
-            )
-            # raise HTTPException(status_code=400, detail=f"Thread run failed: {thread.run_state}")
-        else:
-            # 메세지 이미 실행 중일 때
-            return {"status": "Message created but not executed", "content": "죄송합니다. 잠시 후 다시 시도해주세요."}
-
+        # 실패한 run 은 끝난 상태이므로 같은 스레드에 그대로 메세지를 추가함
+        await client.beta.threads.messages.create(
+            thread_id=thread.thread_id,
+            role="user",
+            content=content
+        )
     except OpenAIError as e:
-        return {"status": "Message created but not executed", "content": "죄송합니다. 잠시 뒤 다시 말씀해주세요."}
+        run_state_store.clear(thread.thread_id)
+        return None, FAILED_RESPONSE
     except Exception as e:
-        return {"status": "Message not created", "content": "죄송합니다. 제가 이해하지 못했어요. 다시 말씀해주시겠어요?"}
+        run_state_store.clear(thread.thread_id)
+        return None, {"status": "Message not created", "content": "죄송합니다. 제가 이해하지 못했어요. 다시 말씀해주시겠어요?"}
 
     new_message = AssistantMessage(
         thread_id=thread.thread_id,
         sender_type="user",
-        content=message.content,
+        content=content,
         created_at=datetime.utcnow()
     )
     db.add(new_message)
     db.commit()
     db.refresh(new_message)
+    return thread, None
 
-    with client.beta.threads.runs.stream(
-        thread_id=thread.thread_id,
+# 모델을 실행하지 않은 답변은 openai 스레드에 추가하지 않고 DB 대화 기록에만 저장
+def save_local_reply(thread: AssistantThread, content: str, reply: str, db: Session):
+    now = datetime.utcnow()
+    db.add_all([
+        AssistantMessage(thread_id=thread.thread_id, sender_type="user", content=content, created_at=now),
+        AssistantMessage(thread_id=thread.thread_id, sender_type="assistant", content=reply, created_at=now),
+    ])
+    db.commit()
+    return {"status": "Message created and executed", "content": reply}
+
+async def get_or_create_thread(user: User, db: Session):
+    thread = db.query(AssistantThread).filter(AssistantThread.user_id == user.user_id).first()
+    if not thread:
+        thread = await create_assistant_thread(user.user_id, db)
+    return thread
+
+# 반환 : 응답, 캐시할 수 없거나 캐시에 없는 질문이면 None
+async def reply_from_cache(content: str, user: User, db: Session):
+    cached = response_cache.lookup(user.user_id, content)
+    if cached is None:
+        return None
+    return save_local_reply(await get_or_create_thread(user, db), content, cached, db)
+
+# 확실한 기기 제어 명령은 run 없이 바로 FCM 을 보내고 확인 문구로 답변
+# 반환 : 응답, 기기 제어 명령이 아니면 None
+async def reply_from_device_command(content: str, user: User, db: Session):
+    if not DEVICE_COMMAND_FAST_PATH:
+        return None
+    command = match_device_command(content)
+    if command is None:
+        return None
+    thread = await get_or_create_thread(user, db)
+    reply = await run_device_command(db, ToolContext.load(db, thread.thread_id, user), command)
+    return save_local_reply(thread, content, reply, db)
+
+async def reply_without_run(content: str, user: User, db: Session):
+    return await reply_from_device_command(content, user, db) or await reply_from_cache(content, user, db)
+
+async def run_assistant(db: Session, thread_id: str, user: User = None, run_info: dict = None):
+    """
+    run 을 실행하고 답변 텍스트 조각(delta)을 도착하는 대로 반환하는 비동기 제너레이터
+    tool 호출이 필요하면 결과를 제출하고 이어지는 스트림의 답변도 계속 반환함
+    run_info 가 주어지면 제출한 tool 호출 수를 run_info["tool_calls"] 에 기록
+    """
+    handler = EventHandler(db, thread_id, user=user)
+    manager = client.beta.threads.runs.stream(
+        thread_id=thread_id,
         assistant_id=variables.OPENAI_ASSISTANT_ID,
         instructions=__INSTRUCTIONS__,
-        event_handler=EventHandler(db, thread.thread_id),
-    ) as stream:
-        stream.until_done()
-    latest_message = db.query(AssistantMessage).filter(AssistantMessage.thread_id == thread.thread_id).order_by(desc(AssistantMessage.created_at)).first()
+        event_handler=handler,
+    )
+    submitted = False
+    try:
+        while manager is not None:
+            try:
+                async with manager as stream:
+                    async for event in stream:
+                        if event.event != 'thread.message.delta' or not event.data.delta.content:
+                            continue
+                        for block in event.data.delta.content:
+                            if block.type == 'text' and block.text and block.text.value:
+                                yield block.text.value
+            except Exception as e:
+                # tool output 제출 후 스트림의 오류는 기존과 같이 무시
+                if not submitted:
+                    raise
+                db.rollback()
+                break
+            if handler.tool_outputs is None:
+                break
+            tool_outputs, run_id = handler.tool_outputs
+            if run_info is not None:
+                run_info["tool_calls"] = run_info.get("tool_calls", 0) + len(tool_outputs)
+            handler, manager = handler.submit_tool_outputs(tool_outputs, run_id)
+            submitted = True
+    finally:
+        # 종료 이벤트 없이 끝난 경우 다음 요청이 막히지 않도록 상태 정리
+        if run_state_store.is_active(thread_id):
+            run_state_store.clear(thread_id)
+
+def sse_event(data: dict):
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# 같은 사용자의 요청은 run_queue 에서 순서대로 실행
+# 메세지 합치기가 켜져있으면 합쳐진 요청은 먼저 들어온 요청의 실행 결과를 같이 받음
+# 기기 제어 명령과 캐시된 일반 질문(인사, 감사 등)은 모델을 실행하지 않고 바로 답변하고,
+# tool 을 사용하지 않은 run 의 답변만 캐시에 저장함
+@handle_exceptions
+@router.post("/message")
+async def add_and_run_message(request: Request, message: AssistantMessageCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    batch, leader = run_queue.join(user.user_id, message.content)
+    if batch is None:
+        return BUSY_RESPONSE
+    if not leader:
+        return await batch.wait() or FAILED_RESPONSE
+
+    async with run_queue.run(user.user_id, batch) as content:
+        response = await reply_without_run(content, user, db)
+        if response is None:
+            thread, response = await add_user_message(request, content, user, db)
+        if response is None:
+            run_info = {"tool_calls": 0}
+            async for _ in run_assistant(db, thread.thread_id, user, run_info):
+                pass
+            latest_message = db.query(AssistantMessage).filter(AssistantMessage.thread_id == thread.thread_id).order_by(desc(AssistantMessage.created_at), desc(AssistantMessage.message_id)).first()
+            response = {"status": "Message created and executed", "content": latest_message.content}
+            if run_info["tool_calls"] == 0:
+                response_cache.store(user.user_id, content, latest_message.content)
+        batch.resolve(response)
+    return response
+
+# 답변을 Server-Sent Events 로 전달
+# data: {"type": "delta", "content": "..."} 를 도착하는 대로 보내고
+# 마지막에 data: {"type": "done", "status": "...", "content": 전체 답변} 을 보냄
+@handle_exceptions
+@router.post("/message/stream")
+async def add_and_run_message_stream(request: Request, message: AssistantMessageCreate, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    batch, leader = run_queue.join(user.user_id, message.content)
+
+    async def events():
+        if batch is None:
+            yield sse_event({"type": "done", **BUSY_RESPONSE})
+            return
+        if not leader:
+            yield sse_event({"type": "done", **(await batch.wait() or FAILED_RESPONSE)})
+            return
+
+        async with run_queue.run(user.user_id, batch) as content:
+            response = await reply_without_run(content, user, db)
+            if response is not None:
+                yield sse_event({"type": "delta", "content": response["content"]})
+            else:
+                thread, response = await add_user_message(request, content, user, db)
+            if response is None:
+                deltas = []
+                run_info = {"tool_calls": 0}
+                try:
+                    async for delta in run_assistant(db, thread.thread_id, user, run_info):
+                        deltas.append(delta)
+                        yield sse_event({"type": "delta", "content": delta})
+                    response = {"status": "Message created and executed", "content": "".join(deltas)}
+                    if run_info["tool_calls"] == 0:
+                        response_cache.store(user.user_id, content, response["content"])
+                except Exception as e:
+                    response = FAILED_RESPONSE
+            batch.resolve(response)
+        yield sse_event({"type": "done", **response})
 
-    return {"status": "Message created and executed", "content": latest_message.content}
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# 메세지 목록은 (created_at, message_id) 순서의 커서 페이지네이션으로 조회
+# before / after 에는 이전 응답의 message_id 를 전달, 둘 다 없으면 최신 메세지부터 limit 개
+# 응답은 항상 오래된 순서로 정렬됨
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_PAGE_MAX = 200
 
 @handle_exceptions
 @router.get("/messages")
-async def get_messages_by_thread(request: Request, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_messages_by_thread(request: Request, before: Optional[int] = None, after: Optional[int] = None, limit: int = MESSAGE_PAGE_SIZE, user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     thread = db.query(AssistantThread).filter(AssistantThread.user_id == user.user_id).first()
     if not thread:
         raise HTTPException(status_code=404, detail="쓰레드를 찾을 수 없습니다.")
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="before 와 after 는 함께 사용할 수 없습니다.")
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX))
 
-    messages = db.query(AssistantMessage).filter(AssistantMessage.thread_id == thread.thread_id).all()
-    if not messages:
-        return []
-    
+    query = db.query(AssistantMessage).filter(AssistantMessage.thread_id == thread.thread_id)
+    cursor_id = before if before is not None else after
+    if cursor_id is not None:
+        cursor = db.query(AssistantMessage.created_at, AssistantMessage.message_id).filter(
+            AssistantMessage.thread_id == thread.thread_id,
+            AssistantMessage.message_id == cursor_id
+        ).first()
+        if cursor is None:
+            raise HTTPException(status_code=400, detail="잘못된 커서입니다.")
+
+    if after is not None:
+        messages = query.filter(or_(
+            AssistantMessage.created_at > cursor.created_at,
+            and_(AssistantMessage.created_at == cursor.created_at, AssistantMessage.message_id > cursor.message_id)
+        )).order_by(AssistantMessage.created_at, AssistantMessage.message_id).limit(limit).all()
+        return messages
+
+    if before is not None:
+        query = query.filter(or_(
+            AssistantMessage.created_at < cursor.created_at,
+            and_(AssistantMessage.created_at == cursor.created_at, AssistantMessage.message_id < cursor.message_id)
+        ))
+    messages = query.order_by(desc(AssistantMessage.created_at), desc(AssistantMessage.message_id)).limit(limit).all()
+    messages.reverse()
     return messages
 
 @handle_exceptions
@@ -160,12 +331,38 @@ async def get_latest_message(request: Request, user: User = Depends(get_current_
     if not thread:
         thread = await create_assistant_thread(user.user_id, db)
 
-    latest_message = db.query(AssistantMessage).filter(AssistantMessage.thread_id == thread.thread_id).order_by(desc(AssistantMessage.created_at)).first()
+    latest_message = db.query(AssistantMessage).filter(AssistantMessage.thread_id == thread.thread_id).order_by(desc(AssistantMessage.created_at), desc(AssistantMessage.message_id)).first()
     if not latest_message:
         raise HTTPException(status_code=404, detail="최신 메세지를 찾을 수 없습니다.")
     
     return latest_message
 
+# 캐시, tool 통계 조회 <관리용>
+# 통계는 api 프로세스 메모리에 쌓이므로 worker 마다 따로 집계됨
+@handle_exceptions
+@router.get("/dev/stats")
+async def get_cache_stats(admin_password: str):
+    if admin_password != ADMIN_PASSWORD:
+        raise HTTPException(status_code=501, detail="알수없는 에러 발생")
+    return {
+        "tools": tool_registry.stats(),
+        "response_cache": response_cache.stats(),
+        "hospital_detail_cache": hospital_detail_cache.stats(),
+    }
+
+# 등록된 tool 정의로 assistant 의 function 목록 갱신 <관리용>
+# tool 을 추가하거나 인자를 바꾼 뒤 한번 호출, function 이 아닌 tool (file_search 등) 은 그대로 유지
+@handle_exceptions
+@router.post("/dev/tools")
+async def sync_assistant_tools(admin_password: str):
+    if admin_password != ADMIN_PASSWORD:
+        raise HTTPException(status_code=501, detail="알수없는 에러 발생")
+    definitions = tool_registry.definitions()
+    assistant = await client.beta.assistants.retrieve(assistant_id)
+    tools = [tool.model_dump(exclude_none=True) for tool in assistant.tools if tool.type != "function"]
+    await client.beta.assistants.update(assistant_id, tools=tools + definitions)
+    return {"tools": [definition["function"]["name"] for definition in definitions]}
+
 #       .oooooo.                                               .o.       ooooo
 #      d8P'  `Y8b                                             .888.      `888'
 #     888      888 oo.ooooo.   .ooooo.  ooo. .oo.            .8"888.      888 
@@ -176,27 +373,69 @@ async def get_latest_message(request: Request, user: User = Depends(get_current_
 #                   888                                                       
 #                  o888o                                               
 
-class EventHandler(AssistantEventHandler):
-    def __init__(self, db: Session, thread_id: str):
+# 스트리밍 중인 답변은 메모리에 모아두고, 아래 간격/크기마다 한번씩만 DB에 중간 저장함
+# 최종 내용은 on_message_done 에서 저장
+TEXT_FLUSH_INTERVAL = 2.0 # seconds
+TEXT_FLUSH_SIZE = 500 # characters
+
+class EventHandler(AsyncAssistantEventHandler):
+    def __init__(self, db: Session, thread_id: str, message: AssistantMessage = None, user: User = None, context: ToolContext = None):
         super().__init__()
         self.db = db
         self.thread_id = thread_id
+        self.message = message
+        self.user = user
+        self.context = context
+        self.text_buffer = []
+        self.buffered_size = 0
+        self.last_flush = time.monotonic()
+        # requires_action 시 제출할 (tool_outputs, run_id), 스트림이 끝난 뒤 run_assistant 에서 제출
+        self.tool_outputs = None
 
-    def update_message_status(self, status: str):
+    def get_message(self):
+        # run.created 이벤트를 받지 못한 핸들러(tool output 제출 후 스트림)는 한번만 조회해서 재사용
+        if self.message is None:
+            self.message = self.db.query(AssistantMessage).filter(AssistantMessage.thread_id == self.thread_id).order_by(desc(AssistantMessage.created_at), desc(AssistantMessage.message_id)).first()
+        return self.message
+
+    def get_tool_context(self):
+        # tool 이 처음 호출될 때 한번만 조회하고, tool output 제출 후 핸들러에도 넘겨서 재사용
+        if self.context is None:
+            self.context = ToolContext.load(self.db, self.thread_id, self.user)
+        return self.context
+
+    def flush_text(self):
+        if not self.text_buffer:
+            return
         try:
-            message = self.db.query(AssistantMessage).filter(AssistantMessage.thread_id == self.thread_id).order_by(desc(AssistantMessage.created_at)).first()
+            message = self.get_message()
             if message:
-                self.db.query(AssistantThread).filter(AssistantThread.thread_id == self.thread_id).update({"run_state": status})
+                message.content = message.content + "".join(self.text_buffer)
                 self.db.commit()
-            else:
-                raise HTTPException(status_code=404, detail="메세지가 존재하지 않습니다.")
+        except SQLAlchemyError as e:
+            self.db.rollback()
+        self.text_buffer = []
+        self.buffered_size = 0
+        self.last_flush = time.monotonic()
+
+    def update_message_status(self, event: Any):
+        # 상태는 run_state_store 에서 관리하고, 의미있는 상태 변화만 DB에 저장
+        if not run_state_store.set(self.thread_id, event.event):
+            return
+        try:
+            values = {"run_state": event.event}
+            if event.event == 'thread.run.created':
+                values["run_id"] = event.data.id
+            self.db.query(AssistantThread).filter(AssistantThread.thread_id == self.thread_id).update(values)
+            self.db.commit()
         except SQLAlchemyError:
             self.db.rollback()
-    def on_event(self, event: Any) -> None:
-        self.update_message_status(event.event)
+
+    async def on_event(self, event: Any) -> None:
+        self.update_message_status(event)
         if event.event == 'thread.run.requires_action':
             run_id = event.data.id
-            self.handle_requires_action(event.data, run_id)
+            await self.handle_requires_action(event.data, run_id)
         elif event.event == 'thread.run.cancelled':
             raise HTTPException(status_code=400, detail="쓰레드가 취소되었습니다.")
         elif event.event == 'thread.run.created':
@@ -209,88 +448,71 @@ class EventHandler(AssistantEventHandler):
             self.db.add(new_message)
             self.db.commit()
             self.db.refresh(new_message)
+            self.message = new_message
         else:
             pass
         
     @override
-    def on_tool_call_created(self, tool_call):
+    async def on_tool_call_created(self, tool_call):
         self.function_name = tool_call.function.name
         self.tool_id = tool_call.id
 
-    @override
-    def handle_requires_action(self, data, run_id):
-        tool_outputs = []
-
-        for tool in data.required_action.submit_tool_outputs.tool_calls:
-            print(f"tool.function.name: {tool.function.name}")
-            print(f"tool.function.arguments: {tool.function.arguments}")
+    async def run_tool(self, tool, context: ToolContext, semaphores: dict):
+        print(f"tool.function.name: {tool.function.name}")
+        print(f"tool.function.arguments: {tool.function.arguments}")
+        try:
             tool_arguments = json.loads(tool.function.arguments) if tool.function.arguments else {}
-            if tool.function.name == "getUltraSrtFcst":
-                result = getUltraSrtFcst(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "register_medication_remind":
-                result = register_medication_remind(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "register_hospital_remind":
-                result = register_hospital_remind(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "getHospBasisList":
-                result = getHospBasisList(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "get_medication_remind":
-                result = get_medication_remind(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "get_hospital_remind":
-                result = get_hospital_remind(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "remove_medication_remind":
-                result = remove_medication_remind(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "remove_hospital_remind":
-                result = remove_hospital_remind(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "update_meal_time":
-                result = update_meal_time(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-                
-            if tool.function.name == "openFontSizeSettings":
-                result = openFontSizeSettings(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "send_message":
-                result = send_message(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "call_contact":
-                result = call_contact(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
-            if tool.function.name == "launch_specific_app":
-                result = launch_specific_app(db=self.db, thread_id=self.current_run.thread_id, **tool_arguments)
+        except ValueError as e:
+            return {"status": "error", "message": f"잘못된 인자입니다: {str(e)}", "data": {"tool": tool.function.name}}
+        return await tool_registry.call(tool.function.name, self.db, context, tool_arguments, semaphores)
 
+    @override
+    async def handle_requires_action(self, data, run_id):
+        # 한 단계의 tool 호출은 동시에 실행해서 가장 느린 tool 만큼만 기다림
+        tool_calls = data.required_action.submit_tool_outputs.tool_calls
+        context = self.get_tool_context()
+        semaphores = tool_registry.semaphores()
+        results = await asyncio.gather(*[self.run_tool(tool, context, semaphores) for tool in tool_calls])
 
+        tool_outputs = []
+        for tool, result in zip(tool_calls, results):
             if isinstance(result, dict):
                 result = json.dumps(result, ensure_ascii=False)
             elif not isinstance(result, str):
                 result = str(result)
             tool_outputs.append({"tool_call_id" : tool.id, "output": result})
-        self.submit_tool_outputs(tool_outputs, run_id)
+        self.tool_outputs = (tool_outputs, run_id)
     @override
     def submit_tool_outputs(self, tool_outputs, run_id):
-        with client.beta.threads.runs.submit_tool_outputs_stream(
-            thread_id=self.current_run.thread_id,
-            run_id=self.current_run.id,
+        # 이어지는 스트림의 delta 도 클라이언트에 전달할 수 있도록 핸들러 안에서 소비하지 않고 반환
+        handler = EventHandler(self.db, self.thread_id, self.message, self.user, self.context)
+        manager = client.beta.threads.runs.submit_tool_outputs_stream(
+            thread_id=self.thread_id,
+            run_id=run_id,
             tool_outputs=tool_outputs,
-            event_handler=EventHandler(self.db, self.thread_id),
-        ) as stream:
-            try:
-                for text in stream.text_deltas:
-                    self.db.commit()
-            except Exception as e:
-                self.db.rollback()
+            event_handler=handler,
+        )
+        return handler, manager
     @override
-    def on_text_delta(self, delta, snapshot):
-        try:
-            message = self.db.query(AssistantMessage).filter(AssistantMessage.thread_id == self.thread_id).order_by(desc(AssistantMessage.created_at)).first()
-            if message:
-                new_content = message.content + delta.value
-                message.content = new_content
-                self.db.commit()
-            # else:
-                # raise HTTPException(status_code=404, detail="메세지가 존재하지 않습니다.")
-        except SQLAlchemyError as e:
-            self.db.rollback()
-            # raise HTTPException(status_code=500, detail=f"메세지 델타 처리 실패: {str(e)}")
+    async def on_text_delta(self, delta, snapshot):
+        if not delta.value:
+            return
+        self.text_buffer.append(delta.value)
+        self.buffered_size += len(delta.value)
+        if self.buffered_size >= TEXT_FLUSH_SIZE or time.monotonic() - self.last_flush >= TEXT_FLUSH_INTERVAL:
+            self.flush_text()
         
     @override
-    def on_message_done(self, content: Message) -> None:
+    async def on_end(self) -> None:
+        # 메세지 완료 이벤트 없이 스트림이 끝난 경우 남은 내용 저장
+        self.flush_text()
+
+    @override
+    async def on_message_done(self, content: Message) -> None:
+        self.text_buffer = []
+        self.buffered_size = 0
         try:
-            message = self.db.query(AssistantMessage).filter(AssistantMessage.thread_id == self.thread_id).order_by(desc(AssistantMessage.created_at)).first()
+            message = self.get_message()
             if message:
                 message.content = content.content[0].text.value
                 self.db.commit()
@@ -0,0 +1,65 @@
+import os
+import sys
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 저장소 루트에서 실행하지 않아도 functions, routers 등을 import 할 수 있도록 경로 추가
+# utils/config.py 와 fcm_key.json 은 저장소에 포함되지 않으므로 실행 환경에 있어야 함
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+# models 와 utils 가 서로 import 하므로 main.py 처럼 utils 부터 불러옴
+import utils # noqa: E402, F401
+
+# 실행 시간을 비교하는 테스트는 기기 상태에 따라 결과가 달라지므로 --benchmark 옵션을 줄 때만 실행
+def pytest_addoption(parser):
+    parser.addoption("--benchmark", action="store_true", default=False, help="benchmark 표시된 테스트도 실행")
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: 실행 시간 비교 (--benchmark 옵션을 줄 때만 실행)")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--benchmark"):
+        return
+    skip = pytest.mark.skip(reason="--benchmark 옵션을 줄 때만 실행")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+@pytest.fixture
+def engine():
+    # 운영은 MySQL, 테스트는 메모리 SQLite 에 같은 테이블을 만들어서 사용
+    from database import Base
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    yield session
+    session.close()
+
+class StatementCounter:
+    # engine 에서 실행된 SQL 문 수
+    def __init__(self, engine):
+        self.count = 0
+        self.engine = engine
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+    def close(self):
+        event.remove(self.engine, "before_cursor_execute", self.on_execute)
+
+@pytest.fixture
+def statements(engine):
+    counter = StatementCounter(engine)
+    yield counter
+    counter.close()
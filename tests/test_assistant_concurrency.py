@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from sqlalchemy.orm import sessionmaker
+from models import User, AssistantThread, AssistantMessage
+from routers import assistant
+
+# Assistants api 로컬 mock, SSE 이벤트마다 CHUNK_LATENCY 초씩 늦게 보냄 (모델 생성 지연)
+CHUNK_LATENCY = 0.02
+RUN_COUNT = 10
+REPLY = ["안녕", "하세요", ", 애비", "입니다"]
+
+def sse(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+def run_data(status):
+    return {
+        "id": "run_1", "object": "thread.run", "created_at": 0, "thread_id": "thread", "assistant_id": "asst",
+        "status": status, "model": "model", "instructions": "", "tools": [], "parallel_tool_calls": True,
+        "response_format": "auto", "tool_choice": "auto",
+    }
+
+def message_data(status, text=""):
+    return {
+        "id": "msg_1", "object": "thread.message", "created_at": 0, "thread_id": "thread", "status": status,
+        "role": "assistant", "content": [{"type": "text", "text": {"value": text, "annotations": []}}] if text else [],
+        "attachments": [], "metadata": {}, "assistant_id": "asst", "run_id": "run_1",
+    }
+
+def run_stream():
+    chunks = [sse("thread.run.created", run_data("queued")), sse("thread.message.created", message_data("in_progress"))]
+    for text in REPLY:
+        chunks.append(sse("thread.message.delta", {"id": "msg_1", "object": "thread.message.delta", "delta": {"content": [{"index": 0, "type": "text", "text": {"value": text, "annotations": []}}]}}))
+    chunks.append(sse("thread.message.completed", message_data("completed", "".join(REPLY))))
+    chunks.append(sse("thread.run.completed", run_data("completed")))
+    chunks.append("event: done\ndata: [DONE]\n\n")
+    return chunks
+
+async def handle(request: httpx.Request):
+    async def body():
+        for chunk in run_stream():
+            await asyncio.sleep(CHUNK_LATENCY)
+            yield chunk.encode()
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    client = AsyncOpenAI(api_key="test", base_url="http://assistant.test/v1", http_client=httpx.AsyncClient(transport=httpx.MockTransport(handle)))
+    monkeypatch.setattr(assistant, "client", client)
+    return client
+
+@pytest.fixture
+def threads(engine):
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    thread_ids = []
+    for i in range(RUN_COUNT * 2):
+        user = User(user_real_name="사용자", user_uuid=f"user-{i}", password_hash="-", user_type="senior")
+        db.add(user)
+        db.flush()
+        db.add(AssistantThread(thread_id=f"thread_{i}", user_id=user.user_id))
+        thread_ids.append(f"thread_{i}")
+    db.commit()
+    db.close()
+    return Session, thread_ids
+
+async def reply(Session, thread_id):
+    db = Session()
+    try:
+        deltas = [delta async for delta in assistant.run_assistant(db, thread_id)]
+        saved = db.query(AssistantMessage.content).filter(AssistantMessage.thread_id == thread_id).scalar()
+        return "".join(deltas), saved
+    finally:
+        db.close()
+
+@pytest.mark.benchmark
+def test_concurrent_runs_benchmark(fake_openai, threads):
+    Session, thread_ids = threads
+
+    # 기준 : 같은 AsyncOpenAI client 로 run 을 하나씩 순서대로 await
+    async def sequential():
+        return [await reply(Session, thread_id) for thread_id in thread_ids[:RUN_COUNT]]
+
+    async def concurrent():
+        return await asyncio.gather(*[reply(Session, thread_id) for thread_id in thread_ids[RUN_COUNT:]])
+
+    start = time.perf_counter()
+    sequential_results = asyncio.run(sequential())
+    sequential_time = time.perf_counter() - start
+    start = time.perf_counter()
+    concurrent_results = asyncio.run(concurrent())
+    concurrent_time = time.perf_counter() - start
+
+    expected = ("".join(REPLY), "".join(REPLY))
+    assert all(result == expected for result in sequential_results + list(concurrent_results))
+    assert concurrent_time < sequential_time / 4, f"sequential {sequential_time:.2f} s, concurrent {concurrent_time:.2f} s"
+
+def test_concurrent_runs_saved(fake_openai, threads):
+    # 동시에 실행해도 스레드마다 자기 답변만 저장됨
+    Session, thread_ids = threads
+
+    async def concurrent():
+        return await asyncio.gather(*[reply(Session, thread_id) for thread_id in thread_ids])
+
+    assert asyncio.run(concurrent()) == [("".join(REPLY), "".join(REPLY))] * len(thread_ids)
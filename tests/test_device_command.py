@@ -0,0 +1,42 @@
+import pytest
+from functions.device_command import match_device_command
+
+# (문장, tool 이름, 인자)
+COMMANDS = [
+    ("글씨 크게 해줘", "openFontSizeSettings", {}),
+    ("글자 작게 바꿔주세요", "openFontSizeSettings", {}),
+    ("카톡 열어줘", "launch_specific_app", {"app_name": "카카오톡"}),
+    ("애비야 카메라 켜줘", "launch_specific_app", {"app_name": "카메라"}),
+    ("밴드 실행해줘", "launch_specific_app", {"app_name": "네이버밴드"}),
+    ("아들한테 전화해줘", "call_contact", {"contact_name": "아들"}),
+    ("우리 딸에게 전화 좀 걸어주세요", "call_contact", {"contact_name": "딸"}),
+    ("영희한테 전화 연결해줘.", "call_contact", {"contact_name": "영희"}),
+]
+
+# 모델이 처리해야 하는 문장
+NOT_COMMANDS = [
+    "밥 먹었다고 아들한테 전화해줘", # 인용, 이름에 띄어쓰기
+    "김민수 씨한테 전화해줘",
+    "어제 딸한테 전화해",            # 지난 일
+    "누구한테 전화해줘",              # 의문사
+    "어디에 전화해줘",
+    "날씨 알려주고 카톡 켜줘",        # 앞에 다른 요청이 이어짐
+    "사진첩 열어서 보여줘",
+    "글씨 크게 쓰라고 해",            # 인용
+    "카톡 켜",                        # 부탁하는 말로 끝나지 않음
+    "카톡 말고 밴드 열어줘",          # 부정
+    "카톡 어떻게 열어?",
+    "카톡이랑 밴드 열어줘",           # 앱이 여러 개
+    "아들한테 전화할까",
+    "글씨 크게 하는 방법 알려줘",
+]
+
+@pytest.mark.parametrize("text,name,arguments", COMMANDS)
+def test_commands(text, name, arguments):
+    command = match_device_command(text)
+    assert command is not None
+    assert command[:2] == (name, arguments)
+
+@pytest.mark.parametrize("text", NOT_COMMANDS)
+def test_not_commands(text):
+    assert match_device_command(text) is None
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.orm import sessionmaker
+import message
+from models import ScheduledMessage
+
+NOW = datetime(2026, 1, 1, 9, 0)
+
+class FakeEvent:
+    # threading.Event 대신 대기 시간만 기록
+    def __init__(self):
+        self.timeouts = []
+
+    def wait(self, timeout):
+        self.timeouts.append(timeout)
+
+    def set(self):
+        pass
+
+    def clear(self):
+        pass
+
+@pytest.fixture
+def dispatch(engine, monkeypatch):
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(message, "get_db", Session)
+    sent = []
+    monkeypatch.setattr(message, "send_message", lambda message_ids: sent.append(message_ids))
+    monkeypatch.setattr(message.schedule, "idle_seconds", lambda: None)
+
+    clock = SimpleNamespace(now=NOW)
+    dispatcher = message.MessageDispatcher(clock=lambda: clock.now)
+    dispatcher._wakeup = FakeEvent()
+
+    def add(minutes, status="pending"):
+        with Session() as db:
+            scheduled = ScheduledMessage(user_id=1, title="알림", content=f"{minutes}분", scheduled_time=NOW + timedelta(minutes=minutes), status=status)
+            db.add(scheduled)
+            db.commit()
+            return scheduled.id
+
+    return SimpleNamespace(dispatcher=dispatcher, clock=clock, sent=sent, add=add)
+
+def test_due_messages_in_time_order(dispatch):
+    late = dispatch.add(3)
+    early = dispatch.add(-5)
+    dispatch.add(-10, status="sent")
+    middle = dispatch.add(0)
+
+    dispatch.dispatcher.run_pending()
+    assert dispatch.sent == [[early, middle]]
+
+    dispatch.clock.now = NOW + timedelta(minutes=3)
+    dispatch.dispatcher.run_pending()
+    assert dispatch.sent == [[early, middle], [late]]
+    # 이미 꺼낸 메세지는 다시 보내지 않음
+    dispatch.dispatcher.run_pending()
+    assert len(dispatch.sent) == 2
+
+def test_reload_every_refresh_interval(dispatch):
+    dispatch.dispatcher.run_pending()
+    # DB 에 직접 추가된 메세지는 다음 갱신 때 발송
+    added = dispatch.add(-1)
+    dispatch.clock.now = NOW + timedelta(minutes=9)
+    dispatch.dispatcher.run_pending()
+    assert dispatch.sent == []
+
+    dispatch.clock.now = NOW + timedelta(minutes=10)
+    dispatch.dispatcher.run_pending()
+    assert dispatch.sent == [[added]]
+
+def test_notify_reloads_immediately(dispatch):
+    dispatch.dispatcher.run_pending()
+    added = dispatch.add(-1)
+    dispatch.dispatcher.notify()
+    dispatch.dispatcher.run_pending()
+    assert dispatch.sent == [[added]]
+
+def test_sleeps_until_next_due(dispatch, monkeypatch):
+    dispatcher = dispatch.dispatcher
+    dispatch.add(2)
+    dispatcher.run_pending()
+    dispatcher.wait(NOW)
+    # 다음 메세지(2분 뒤)까지
+    assert dispatcher._wakeup.timeouts == [120.0]
+
+    # 메세지가 없으면 다음 갱신 시각까지, schedule 작업이 더 빠르면 그때까지
+    dispatch.clock.now = NOW + timedelta(minutes=2)
+    dispatcher.run_pending()
+    dispatcher.wait(dispatch.clock.now)
+    assert dispatcher._wakeup.timeouts[-1] == 480.0
+    monkeypatch.setattr(message.schedule, "idle_seconds", lambda: 30.0)
+    dispatcher.wait(dispatch.clock.now)
+    assert dispatcher._wakeup.timeouts[-1] == 30.0
+
+def test_waits_for_dispatch_start_time(dispatch):
+    # 발송 시작 시각 전에는 지난 메세지도 보내지 않고 시작 시각까지 대기
+    midnight = datetime.combine(NOW.date(), message.DISPATCH_START_TIME) - timedelta(minutes=5)
+    dispatch.clock.now = midnight
+    scheduled = dispatch.add(-(NOW - midnight).total_seconds() / 60 - 60)
+    dispatch.dispatcher.run_pending()
+    assert dispatch.sent == []
+    dispatch.dispatcher.wait(midnight)
+    assert dispatch.dispatcher._wakeup.timeouts == [300.0]
+
+    dispatch.clock.now = midnight + timedelta(minutes=5)
+    dispatch.dispatcher.run_pending()
+    assert dispatch.sent == [[scheduled]]
@@ -0,0 +1,162 @@
+import asyncio
+import time
+import httpx
+import pytest
+from functions import emergency
+from functions.hospital_cache import HospitalDetailCache
+from functions.hospital_index import HospitalIndex
+
+# HIRA api 로컬 mock, 모든 요청은 HIRA_LATENCY 초 뒤에 응답
+HIRA_LATENCY = 0.05
+HOSPITAL_COUNT = 10
+
+class Context:
+    thread_id = "thread"
+    latitude = 37.5
+    longitude = 127.0
+
+def hospital_item(i: int):
+    return (
+        f"<item><yadmNm>병원{i}</yadmNm><addr>주소{i}</addr><clCdNm>의원</clCdNm><telno>02-000-000{i}</telno>"
+        f"<distance>{100 * i}.5</distance><drTotCnt>{i}</drTotCnt><XPos>127.0</XPos><YPos>37.5</YPos><ykiho>Y{i}</ykiho></item>"
+    )
+
+# 인증키, 트래픽 초과 등은 HTTP 200 에 이 형식으로 옴
+QUOTA_ERROR = (
+    "<OpenAPI_ServiceResponse><cmmMsgHeader><errMsg>SERVICE ERROR</errMsg>"
+    "<returnAuthMsg>LIMITED_NUMBER_OF_SERVICE_REQUESTS_EXCEEDS_ERROR</returnAuthMsg>"
+    "<returnReasonCode>22</returnReasonCode></cmmMsgHeader></OpenAPI_ServiceResponse>"
+).encode()
+
+def hira_body(items: str):
+    return f"<response><header><resultCode>00</resultCode><resultMsg>NORMAL SERVICE.</resultMsg></header><body><items>{items}</items></body></response>".encode()
+
+class MockHira:
+    def __init__(self, latency: float = HIRA_LATENCY):
+        self.latency = latency
+        self.calls = 0
+        self.timeout_paths = ()
+        self.error = None # 상세정보 요청에 대신 돌려줄 응답
+
+    async def __call__(self, request: httpx.Request):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        path = request.url.path
+        if path.endswith("getHospBasisList"):
+            return httpx.Response(200, content=hira_body("".join(hospital_item(i) for i in range(HOSPITAL_COUNT))))
+        if self.error is not None:
+            return self.error
+        if path.endswith(self.timeout_paths):
+            raise httpx.ReadTimeout("timed out", request=request)
+        if path.endswith("getDtlInfo2.7"):
+            return httpx.Response(200, content=hira_body("<item><rcvSat>09:00~13:00</rcvSat><trmtMonStart>0900</trmtMonStart><trmtMonEnd>1800</trmtMonEnd></item>"))
+        if path.endswith("getSpclDiagInfo2.7"):
+            return httpx.Response(200, content=hira_body("<item><srchCdNm>척추</srchCdNm></item>"))
+        return httpx.Response(200, content=hira_body("<item><lineNo>1</lineNo><trafNm>버스</trafNm><arivPlc>정류장</arivPlc><dir>도보</dir><dist>100m</dist></item>"))
+
+@pytest.fixture
+def hira(monkeypatch, tmp_path):
+    mock = MockHira()
+    transport = httpx.MockTransport(mock)
+    client = httpx.AsyncClient(transport=transport, base_url=emergency.hira_client.base_url)
+    monkeypatch.setattr(emergency.hira_client, "_get_client", lambda: client)
+    monkeypatch.setattr(emergency, "hospital_detail_cache", HospitalDetailCache(str(tmp_path / "hospital_detail.db")))
+    monkeypatch.setattr(emergency, "HOSPITAL_LOCAL_SEARCH", False)
+    return mock
+
+async def search_sequential(dgsbjtCd):
+    # 병렬화 이전 방식 : 병원마다 상세정보 3건을 차례로 호출
+    response = await emergency.hira_client.get('/hospInfoServicev2/getHospBasisList', params={'dgsbjtCd': dgsbjtCd})
+    hospitals = emergency.parseHiraItems(response.content, emergency.HospBasis_schema)
+    for hospital in hospitals:
+        for func in (emergency.getDtInfo, emergency.getSpclDiagInfo, emergency.getTrnsprtInfo):
+            await func(hospital['ykiho'])
+    return hospitals
+
+def test_detail_calls(hira):
+    # 목록 1회 + 병원마다 상세정보 3건
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+    assert result["status"] == "00" and len(result["data"]) == HOSPITAL_COUNT
+    assert hira.calls == 1 + HOSPITAL_COUNT * 3
+
+@pytest.mark.benchmark
+def test_detail_fanout_benchmark(hira):
+    start = time.perf_counter()
+    asyncio.run(search_sequential("01"))
+    sequential = time.perf_counter() - start
+    sequential_calls = hira.calls
+
+    hira.calls = 0
+    start = time.perf_counter()
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+    concurrent = time.perf_counter() - start
+
+    assert result["status"] == "00"
+    assert hira.calls == sequential_calls == 1 + HOSPITAL_COUNT * 3
+    # 목록 1회 + 상세정보 (30건 / DETAIL_CONCURRENCY) 회 만큼의 지연
+    assert concurrent < sequential / 4, f"sequential {sequential:.2f} s, concurrent {concurrent:.2f} s"
+
+def test_partial_results_when_detail_times_out(hira):
+    hira.timeout_paths = ("getTrnsprtInfo2.7",)
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+
+    assert result["status"] == "00"
+    assert len(result["data"]) == HOSPITAL_COUNT
+    for hospital in result["data"]:
+        assert hospital["교통정보"] == []
+        assert hospital["특수진단정보"] == ["척추"]
+        assert hospital["접수 시간_토요일"] == "09:00~13:00"
+
+@pytest.mark.parametrize("error", [
+    httpx.Response(200, content=QUOTA_ERROR),
+    httpx.Response(500, content=b"<html><body>Internal Server Error</body></html>"),
+    httpx.Response(200, content=hira_body("").replace(b"<resultCode>00</resultCode>", b"<resultCode>99</resultCode>")),
+])
+def test_failed_detail_is_not_cached(hira, error):
+    hira.error = error
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+    assert result["status"] == "00"
+    assert all(hospital["교통정보"] == [] and "접수 시간_토요일" not in hospital for hospital in result["data"])
+    assert emergency.hospital_detail_cache.stats()["errors"] == HOSPITAL_COUNT * 3
+
+    # 오류가 캐시되지 않았으므로 다음 검색에서 상세정보를 다시 조회함
+    hira.error = None
+    hira.calls = 0
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+    assert hira.calls == 1 + HOSPITAL_COUNT * 3
+    for hospital in result["data"]:
+        assert hospital["특수진단정보"] == ["척추"]
+        assert hospital["접수 시간_토요일"] == "09:00~13:00"
+
+def test_quota_error_on_hospital_list(hira, monkeypatch):
+    async def quota(request):
+        return httpx.Response(200, content=QUOTA_ERROR)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(quota), base_url=emergency.hira_client.base_url)
+    monkeypatch.setattr(emergency.hira_client, "_get_client", lambda: client)
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+    assert result["status"] == "103"
+    assert "22" in result["message"]
+
+def test_local_search_falls_back_when_stale(hira, monkeypatch, tmp_path):
+    monkeypatch.setattr(emergency, "HOSPITAL_LOCAL_SEARCH", True)
+    monkeypatch.setattr(emergency, "hospital_index", HospitalIndex(str(tmp_path / "snapshot.db")))
+    refreshing = []
+    monkeypatch.setattr(emergency, "scheduleHospitalSnapshotRefresh", refreshing.append)
+
+    # 스냅샷이 없으면 원격 api 로 조회하고 갱신을 예약
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+    assert result["status"] == "00" and len(result["data"]) == HOSPITAL_COUNT
+    assert hira.calls == 1 + HOSPITAL_COUNT * 3
+    assert refreshing == ["01"]
+
+    # 스냅샷이 있으면 목록 api 는 호출하지 않음
+    emergency.hospital_index.replace("01", [{
+        "yadmNm": "병원", "addr": "주소", "clCdNm": "의원", "telno": "02-000-0000", "distance": 0.0, "drTotCnt": 1,
+        "XPos": "127.0", "YPos": "37.501", "ykiho": "Z0",
+    }])
+    hira.calls = 0
+    result = asyncio.run(emergency.getHospBasisList("01", context=Context()))
+    assert [hospital["이름"] for hospital in result["data"]] == ["병원"]
+    assert result["data"][0]["거리"] == 111
+    assert hira.calls == 3
+    assert refreshing == ["01"]
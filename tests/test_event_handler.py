@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import desc
+from models import User, AssistantThread, AssistantMessage
+from routers.assistant import EventHandler
+
+# 스트리밍 답변 1건(delta 200개)을 저장하는 동안 실행되는 SQL 문 수 비교
+DELTA_COUNT = 200
+DELTA_TEXT = "안녕하세요"
+
+def add_thread(db, thread_id):
+    user = User(user_real_name="사용자", user_uuid=thread_id, password_hash="-", user_type="senior")
+    db.add(user)
+    db.flush()
+    db.add(AssistantThread(thread_id=thread_id, user_id=user.user_id))
+    db.commit()
+
+def stream_events(thread_id):
+    # (이벤트, text delta) 순서, text delta 는 thread.message.delta 이벤트마다 하나
+    yield SimpleNamespace(event="thread.run.created", data=SimpleNamespace(id="run_1")), None
+    yield SimpleNamespace(event="thread.run.in_progress", data=SimpleNamespace(id="run_1")), None
+    yield SimpleNamespace(event="thread.message.created", data=None), None
+    for _ in range(DELTA_COUNT):
+        yield SimpleNamespace(event="thread.message.delta", data=None), SimpleNamespace(value=DELTA_TEXT)
+    yield SimpleNamespace(event="thread.message.completed", data=None), None
+    yield SimpleNamespace(event="thread.run.completed", data=SimpleNamespace(id="run_1")), None
+
+def final_message():
+    return SimpleNamespace(content=[SimpleNamespace(text=SimpleNamespace(value=DELTA_TEXT * DELTA_COUNT))])
+
+# 이전 EventHandler : 이벤트마다 최신 메세지 조회 + run_state 저장, delta 마다 메세지 조회 + 저장
+class LegacyHandler:
+    def __init__(self, db, thread_id):
+        self.db = db
+        self.thread_id = thread_id
+
+    def latest(self):
+        return self.db.query(AssistantMessage).filter(AssistantMessage.thread_id == self.thread_id).order_by(desc(AssistantMessage.created_at)).first()
+
+    def on_event(self, event):
+        if self.latest():
+            self.db.query(AssistantThread).filter(AssistantThread.thread_id == self.thread_id).update({"run_state": event.event})
+            self.db.commit()
+        if event.event == "thread.run.created":
+            message = AssistantMessage(thread_id=self.thread_id, sender_type="assistant", content="", created_at=datetime.utcnow())
+            self.db.add(message)
+            self.db.commit()
+            self.db.refresh(message)
+
+    def on_text_delta(self, delta):
+        message = self.latest()
+        if message:
+            message.content = message.content + delta.value
+            self.db.commit()
+
+    def on_message_done(self, content):
+        message = self.latest()
+        if message:
+            message.content = content.content[0].text.value
+            self.db.commit()
+
+def run_legacy(db, thread_id):
+    handler = LegacyHandler(db, thread_id)
+    for stream_event, delta in stream_events(thread_id):
+        handler.on_event(stream_event)
+        if delta is not None:
+            handler.on_text_delta(delta)
+        if stream_event.event == "thread.message.completed":
+            handler.on_message_done(final_message())
+
+async def run_current(db, thread_id):
+    handler = EventHandler(db, thread_id)
+    for stream_event, delta in stream_events(thread_id):
+        await handler.on_event(stream_event)
+        if delta is not None:
+            await handler.on_text_delta(delta, None)
+        if stream_event.event == "thread.message.completed":
+            await handler.on_message_done(final_message())
+    await handler.on_end()
+
+def saved_content(db, thread_id):
+    db.expire_all()
+    return db.query(AssistantMessage.content).filter(AssistantMessage.thread_id == thread_id).scalar()
+
+def test_streamed_reply_round_trips(statements, db):
+    add_thread(db, "thread_legacy")
+    add_thread(db, "thread_current")
+
+    statements.count = 0
+    run_legacy(db, "thread_legacy")
+    legacy = statements.count
+    statements.count = 0
+    asyncio.run(run_current(db, "thread_current"))
+    current = statements.count
+
+    assert saved_content(db, "thread_legacy") == saved_content(db, "thread_current") == DELTA_TEXT * DELTA_COUNT
+    thread = db.query(AssistantThread).filter(AssistantThread.thread_id == "thread_current").one()
+    assert (thread.run_state, thread.run_id) == ("thread.run.completed", "run_1")
+    # delta 수와 관계없이 run 상태 변화, 메세지 생성, 최종 저장만 남음
+    assert legacy > DELTA_COUNT * 2
+    assert current <= 20, f"legacy {legacy} statements, current {current} statements"
+
+def test_partial_text_saved_without_message_done(engine, db):
+    # 메세지 완료 이벤트 없이 스트림이 끝나도 버퍼에 남은 내용을 저장
+    add_thread(db, "thread_partial")
+    async def run():
+        handler = EventHandler(db, "thread_partial")
+        await handler.on_event(SimpleNamespace(event="thread.run.created", data=SimpleNamespace(id="run_2")))
+        for _ in range(3):
+            await handler.on_text_delta(SimpleNamespace(value=DELTA_TEXT), None)
+        await handler.on_end()
+    asyncio.run(run())
+    assert saved_content(db, "thread_partial") == DELTA_TEXT * 3
+
+def test_get_message_same_created_at(db):
+    # 같은 시각에 저장된 메세지(로컬 답변 등)는 나중에 추가된 메세지를 사용
+    add_thread(db, "thread_tie")
+    now = datetime.utcnow()
+    db.add_all([
+        AssistantMessage(thread_id="thread_tie", sender_type="user", content="질문", created_at=now),
+        AssistantMessage(thread_id="thread_tie", sender_type="assistant", content="답변", created_at=now),
+    ])
+    db.commit()
+    assert EventHandler(db, "thread_tie").get_message().content == "답변"
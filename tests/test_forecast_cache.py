@@ -0,0 +1,76 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+import functions.cache as cache_module
+from functions.cache import ForecastCache, forecastExpiry
+
+BASE_TIME = datetime(2026, 1, 1, 10, 30)
+KEY = (60, 127, "20260101", "1030")
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=BASE_TIME.timestamp())
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return ForecastCache(cache_dir=str(tmp_path))
+
+def test_concurrent_loads_share_one_fetch(cache):
+    calls = []
+
+    async def load():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"T1H": {"20260101_1100": "-2"}}
+
+    async def main():
+        first = await asyncio.gather(*[cache.get_or_load(KEY, load, forecastExpiry(BASE_TIME)) for _ in range(2)])
+        # 이후 요청은 캐시에서 반환
+        return first, await cache.get_or_load(KEY, load, forecastExpiry(BASE_TIME))
+
+    (a, b), c = asyncio.run(main())
+    assert a == b == c == {"T1H": {"20260101_1100": "-2"}}
+    assert len(calls) == 1
+    assert cache._inflight == {}
+
+def test_failed_load_not_cached(cache):
+    results = [None, {"T1H": {}}]
+
+    async def load():
+        return results.pop(0)
+
+    assert asyncio.run(cache.get_or_load(KEY, load, forecastExpiry(BASE_TIME))) is None
+    assert asyncio.run(cache.get_or_load(KEY, load, forecastExpiry(BASE_TIME))) == {"T1H": {}}
+
+def test_file_tier_shared_until_expiry(tmp_path, cache, clock):
+    cache.set(KEY, {"T1H": {}}, forecastExpiry(BASE_TIME))
+    # 다른 프로세스(message.py)의 캐시도 같은 파일을 읽음
+    other = ForecastCache(cache_dir=str(tmp_path))
+    assert other.get(KEY) == {"T1H": {}}
+
+    clock.value = forecastExpiry(BASE_TIME).timestamp()
+    assert cache.get(KEY) is None
+    assert ForecastCache(cache_dir=str(tmp_path)).get(KEY) is None
+
+def test_evict_expired(tmp_path, clock):
+    cache = ForecastCache(cache_dir=str(tmp_path), max_files=2)
+    cache.set(KEY, {}, forecastExpiry(BASE_TIME - timedelta(minutes=30)))
+    for i, base_time in enumerate(["1100", "1130", "1200"]):
+        key = (60, 127, "20260101", base_time)
+        cache.set(key, {}, forecastExpiry(BASE_TIME))
+        os.utime(cache._filename(key), (clock.value + i, clock.value + i))
+    # 이전 형식의 캐시 파일은 수정 시각 기준으로 만료
+    legacy = tmp_path / "60_127_20260101_0900.xml"
+    legacy.write_text("<response/>")
+    old = clock.value - timedelta(hours=1).total_seconds()
+    os.utime(legacy, (old, old))
+
+    clock.value += timedelta(minutes=20).total_seconds()
+    # 만료된 파일 2개 + max_files 를 넘는 가장 오래된 파일 1개
+    assert cache.evict_expired() == 3
+    assert sorted(os.listdir(tmp_path)) == ["60_127_20260101_1130.json", "60_127_20260101_1200.json"]
+    assert KEY not in cache._memory
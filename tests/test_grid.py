@@ -0,0 +1,51 @@
+import sqlite3
+import numpy as np
+import pytest
+from functions.grid import LocationGridIndex, haversine
+
+DB_PATH = 'database/location_grid.db'
+
+@pytest.fixture(scope="module")
+def grid_rows():
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        return conn.execute("SELECT x, y, latitude_s_per_100, longitude_s_per_100 FROM location_grid").fetchall()
+    finally:
+        conn.close()
+
+@pytest.fixture(scope="module")
+def grid_index():
+    return LocationGridIndex(DB_PATH)
+
+def brute_force(rows, latitude, longitude):
+    # 인덱스 도입 전 getUltraSrtFcst 의 방식 (전체 행을 순서대로 비교, 먼저 나온 행 우선)
+    nearest, min_distance = None, float('inf')
+    for x, y, lat, lon in rows:
+        if lat is None or lon is None:
+            continue
+        distance = haversine(latitude, longitude, lat, lon)
+        if distance < min_distance:
+            nearest, min_distance = (x, y), distance
+    return nearest
+
+def sample_points():
+    rng = np.random.default_rng(0)
+    points = list(zip(rng.uniform(33.0, 38.6, 300).tolist(), rng.uniform(124.5, 131.0, 300).tolist()))
+    # 한반도 밖 좌표는 인덱스 범위 밖에서 전체 비교로 처리됨
+    return points + [(0.0, 0.0), (40.0, 140.0), (-30.0, 10.0), (37.5665, 126.978)]
+
+def test_nearest_matches_brute_force(grid_rows, grid_index):
+    mismatches = [
+        (lat, lon) for lat, lon in sample_points()
+        if grid_index.nearest(lat, lon) != brute_force(grid_rows, lat, lon)
+    ]
+    assert mismatches == []
+
+def test_nearest_many_matches_brute_force(grid_rows, grid_index):
+    points = sample_points()
+    nx, ny = grid_index.nearest_many([p[0] for p in points], [p[1] for p in points])
+    mismatches = [
+        (lat, lon) for (lat, lon), x, y in zip(points, nx.tolist(), ny.tolist())
+        if (x, y) != brute_force(grid_rows, lat, lon)
+    ]
+    assert mismatches == []
@@ -0,0 +1,70 @@
+import json
+import timeit
+import pytest
+from functions.emergency import parseHiraItems, HiraError, HospBasis_schema, SpclDiagInfo_schema, DtInfo_schema
+
+# getHospBasisList 응답과 같은 형식 (item 당 필드 약 20개, schema 에 없는 필드 포함)
+def hospital_item(i: int):
+    return (
+        f"<item><addr>서울특별시 중구 세종대로 {i}</addr><clCd>31</clCd><clCdNm>의원</clCdNm><cmdcGdrCnt>0</cmdcGdrCnt>"
+        f"<cmdcIntnCnt>0</cmdcIntnCnt><cmdcResdntCnt>0</cmdcResdntCnt><cmdcSdrCnt>0</cmdcSdrCnt><detyGdrCnt>0</detyGdrCnt>"
+        f"<detyIntnCnt>0</detyIntnCnt><detySdrCnt>0</detySdrCnt><distance>{120 * i}.{i}</distance><drTotCnt>{i % 5 + 1}</drTotCnt>"
+        f"<estbDd>20100101</estbDd><hospUrl>http://example.com/{i}</hospUrl><mdeptGdrCnt>0</mdeptGdrCnt><mdeptSdrCnt>{i % 5 + 1}</mdeptSdrCnt>"
+        f"<postNo>04524</postNo><sgguCd>110001</sgguCd><sgguCdNm>중구</sgguCdNm><sidoCd>110000</sidoCd><sidoCdNm>서울</sidoCdNm>"
+        f"<telno>02-000-{i:04d}</telno><XPos>126.97{i:02d}</XPos><YPos>37.56{i:02d}</YPos><yadmNm>병원{i}</yadmNm><ykiho>JDQ4MTYyMiM{i}</ykiho></item>"
+    )
+
+def hira_response(items: str, total: int):
+    return (
+        "<response><header><resultCode>00</resultCode><resultMsg>NORMAL SERVICE.</resultMsg></header>"
+        f"<body><items>{items}</items><numOfRows>10</numOfRows><pageNo>1</pageNo><totalCount>{total}</totalCount></body></response>"
+    ).encode()
+
+# 이전 방식 : xmltodict 로 dict 를 만들고 json 으로 한번 더 변환 (비교 측정용)
+def parse_legacy(content: bytes):
+    import xmltodict
+    data = json.loads(json.dumps(xmltodict.parse(content)))
+    items = data['response']['body']['items']
+    if not items:
+        return []
+    items = items['item']
+    return items if isinstance(items, list) else [items]
+
+def typed(records, schema):
+    return [{key: schema[key](value) for key, value in record.items() if key in schema} for record in records]
+
+def test_parse_hospitals():
+    content = hira_response("".join(hospital_item(i) for i in range(1, 3)), 2)
+    # schema 에 있는 필드만 타입을 변환해서 반환
+    assert parseHiraItems(content, HospBasis_schema) == [
+        {"addr": "서울특별시 중구 세종대로 1", "clCdNm": "의원", "distance": 120.1, "drTotCnt": 2, "telno": "02-000-0001",
+         "XPos": "126.9701", "YPos": "37.5601", "yadmNm": "병원1", "ykiho": "JDQ4MTYyMiM1"},
+        {"addr": "서울특별시 중구 세종대로 2", "clCdNm": "의원", "distance": 240.2, "drTotCnt": 3, "telno": "02-000-0002",
+         "XPos": "126.9702", "YPos": "37.5602", "yadmNm": "병원2", "ykiho": "JDQ4MTYyMiM2"},
+    ]
+
+def test_single_and_empty_items():
+    # item 이 하나일 때도 리스트로 반환
+    single = hira_response("<item><srchCdNm>척추</srchCdNm></item>", 1)
+    assert parseHiraItems(single, SpclDiagInfo_schema) == [{"srchCdNm": "척추"}]
+
+    empty = hira_response("", 0)
+    assert parseHiraItems(empty, DtInfo_schema) == []
+
+    # 값이 비어있는 필드는 None
+    blank = hira_response("<item><rcvSat/><rcvWeek>09:00~18:00</rcvWeek></item>", 1)
+    assert parseHiraItems(blank, DtInfo_schema) == [{"rcvSat": None, "rcvWeek": "09:00~18:00"}]
+
+def test_error_response_raises():
+    error = hira_response("", 0).replace(b"<resultCode>00</resultCode>", b"<resultCode>30</resultCode>")
+    with pytest.raises(HiraError):
+        parseHiraItems(error, HospBasis_schema)
+
+@pytest.mark.benchmark
+def test_parse_benchmark():
+    pytest.importorskip("xmltodict")
+    content = hira_response("".join(hospital_item(i) for i in range(10)), 10)
+    legacy = min(timeit.repeat(lambda: typed(parse_legacy(content), HospBasis_schema), number=200, repeat=5)) / 200
+    current = min(timeit.repeat(lambda: parseHiraItems(content, HospBasis_schema), number=200, repeat=5)) / 200
+    # 측정 편차를 고려해서 여유있게 확인
+    assert current < legacy * 0.7, f"xmltodict + json {legacy * 1e6:.0f} us, parseHiraItems {current * 1e6:.0f} us"
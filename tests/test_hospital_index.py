@@ -0,0 +1,84 @@
+import asyncio
+import sys
+from datetime import timedelta
+from types import SimpleNamespace
+import pytest
+from functions import emergency
+from functions.hospital_index import HospitalIndex
+
+LATITUDE = 37.5
+LONGITUDE = 127.0
+
+def hospital(i: int, lat_offset: float):
+    # 위도 0.001 도 = 약 111 m
+    return {"yadmNm": f"병원{i}", "ykiho": f"Y{i}", "XPos": str(LONGITUDE), "YPos": str(LATITUDE + lat_offset)}
+
+@pytest.fixture
+def clock(monkeypatch):
+    # functions.hospital_index 는 같은 이름의 인스턴스로 다시 export 되므로 모듈은 sys.modules 에서 가져옴
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(sys.modules["functions.hospital_index"], "time", SimpleNamespace(time=lambda: now.value))
+    return now
+
+@pytest.fixture
+def index(tmp_path, clock):
+    return HospitalIndex(str(tmp_path / "hospital_detail.db"), max_age=timedelta(days=7))
+
+def test_search_radius_and_k(index):
+    # 먼 순서로 넣어도 가까운 순서로 반환, 좌표가 없는 병원은 제외
+    records = [hospital(i, 0.001 * i) for i in range(9, -1, -1)] + [{"yadmNm": "좌표없음", "ykiho": "Y99", "XPos": None, "YPos": None}]
+    index.replace("01", records)
+
+    within = index.search("01", LATITUDE, LONGITUDE, radius=500, k=10)
+    assert [item["yadmNm"] for item in within] == ["병원0", "병원1", "병원2", "병원3", "병원4"]
+    assert within[1]["distance"] == pytest.approx(111.2, abs=1)
+
+    nearest = index.search("01", LATITUDE, LONGITUDE, radius=30000, k=3)
+    assert [item["yadmNm"] for item in nearest] == ["병원0", "병원1", "병원2"]
+    assert index.search("01", LATITUDE + 1, LONGITUDE, radius=500) == []
+
+def test_missing_and_stale_snapshot(index, clock):
+    assert not index.is_fresh("01")
+    assert index.search("01", LATITUDE, LONGITUDE) is None
+
+    index.replace("01", [hospital(0, 0)])
+    assert index.is_fresh("01")
+    clock.value += timedelta(days=7).total_seconds()
+    assert not index.is_fresh("01")
+    assert index.search("01", LATITUDE, LONGITUDE) is None
+
+def test_reload_after_other_process_refresh(tmp_path, index, clock):
+    index.replace("01", [hospital(0, 0)])
+    clock.value += timedelta(days=8).total_seconds()
+    assert index.search("01", LATITUDE, LONGITUDE) is None
+
+    # message.py 에서 같은 파일의 스냅샷을 갱신하면 오래된 인덱스 대신 새로 읽음
+    HospitalIndex(index.db_path).replace("01", [hospital(1, 0.001)])
+    assert [item["yadmNm"] for item in index.search("01", LATITUDE, LONGITUDE)] == ["병원1"]
+    assert index.codes() == ["01"]
+
+def test_one_refresh_per_department(monkeypatch):
+    started = []
+
+    async def refresh(dgsbjtCd, client=None):
+        started.append(dgsbjtCd)
+        await asyncio.sleep(0.05)
+        return 0
+
+    monkeypatch.setattr(emergency, "refreshHospitalSnapshot", refresh)
+
+    async def main():
+        for _ in range(3):
+            emergency.scheduleHospitalSnapshotRefresh("01")
+        emergency.scheduleHospitalSnapshotRefresh("02")
+        running = dict(emergency._snapshot_refreshing)
+        await asyncio.gather(*running.values())
+        # 완료 후에는 다시 갱신할 수 있음
+        emergency.scheduleHospitalSnapshotRefresh("01")
+        await asyncio.gather(*emergency._snapshot_refreshing.values())
+        return running
+
+    running = asyncio.run(main())
+    assert sorted(running) == ["01", "02"]
+    assert started == ["01", "02", "01"]
+    assert emergency._snapshot_refreshing == {}
@@ -0,0 +1,32 @@
+import asyncio
+import httpx
+from functions.http_client import AsyncHttpClient
+
+def ok(request: httpx.Request):
+    return httpx.Response(200, content=b"ok")
+
+def test_client_closed_when_loop_finishes():
+    # message.py 작업처럼 asyncio.run 을 반복해도 이전 루프의 커넥션 풀이 남지 않아야 함
+    client = AsyncHttpClient(base_url="http://stub", transport=httpx.MockTransport(ok))
+    used = []
+
+    async def job():
+        response = await client.get("/")
+        # 같은 루프 안에서는 같은 client 를 재사용
+        assert client._get_client() is client._get_client()
+        used.append(client._get_client())
+        return response.status_code
+
+    assert [asyncio.run(job()) for _ in range(3)] == [200, 200, 200]
+    assert len(set(map(id, used))) == 3
+    assert all(http_client.is_closed for http_client in used)
+    assert len(client._clients) <= 1
+
+def test_aclose_current_loop():
+    async def main():
+        async with AsyncHttpClient(base_url="http://stub", transport=httpx.MockTransport(ok)) as client:
+            await client.get("/")
+            http_client = client._get_client()
+        return client, http_client
+    client, http_client = asyncio.run(main())
+    assert http_client.is_closed and client._clients == {}
@@ -0,0 +1,80 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from models import User, AssistantThread, AssistantMessage, AssistantMemory
+from functions.memory import compact_thread
+
+MESSAGE_COUNT = 30
+KEEP_RECENT = 10
+
+class FakeOpenAI:
+    """
+    요약과 스레드 생성/삭제만 흉내내는 client
+    on_summarize 는 요약하는 동안 실행됨 (그 사이에 들어오는 사용자 메세지 재현)
+    """
+    def __init__(self, on_summarize=None):
+        self.on_summarize = on_summarize
+        self.created = []
+        self.deleted = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.summarize))
+        self.beta = SimpleNamespace(threads=SimpleNamespace(create=self.create_thread, delete=self.delete_thread))
+
+    async def summarize(self, model, messages):
+        if self.on_summarize is not None:
+            self.on_summarize()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="요약"))])
+
+    async def create_thread(self, messages):
+        thread_id = f"thread_new_{len(self.created)}"
+        self.created.append((thread_id, messages))
+        return SimpleNamespace(id=thread_id)
+
+    async def delete_thread(self, thread_id):
+        self.deleted.append(thread_id)
+
+def add_conversation(db, thread_id="thread_old"):
+    user = User(user_real_name="사용자", user_uuid=thread_id, password_hash="-", user_type="senior")
+    db.add(user)
+    db.flush()
+    thread = AssistantThread(thread_id=thread_id, user_id=user.user_id)
+    db.add(thread)
+    start = datetime.utcnow() - timedelta(days=1)
+    db.add_all([
+        AssistantMessage(thread_id=thread_id, sender_type="user" if i % 2 == 0 else "assistant", content=f"메세지 {i}", created_at=start + timedelta(minutes=i))
+        for i in range(MESSAGE_COUNT)
+    ])
+    db.commit()
+    return thread, user.user_id
+
+def test_compact_rotates_thread(db):
+    thread, user_id = add_conversation(db)
+    client = FakeOpenAI()
+    new_thread_id = asyncio.run(compact_thread(db, client, thread, keep_recent=KEEP_RECENT))
+
+    assert new_thread_id == "thread_new_0"
+    assert client.deleted == ["thread_old"]
+    # 요약 + 최근 메세지로 새 스레드 시작
+    assert len(client.created[0][1]) == 1 + KEEP_RECENT
+    assert db.query(AssistantThread.thread_id).filter(AssistantThread.user_id == user_id).scalar() == new_thread_id
+    assert db.query(AssistantMessage).filter(AssistantMessage.thread_id == new_thread_id).count() == MESSAGE_COUNT
+    memory = db.query(AssistantMemory).filter(AssistantMemory.user_id == user_id).one()
+    assert memory.summary == "요약"
+
+def test_compact_skips_when_message_arrives(engine, db):
+    thread, user_id = add_conversation(db)
+
+    def new_message():
+        # 요약하는 동안 api 서버에서 저장한 메세지 (다른 세션)
+        from sqlalchemy.orm import Session
+        with Session(engine) as other:
+            other.add(AssistantMessage(thread_id="thread_old", sender_type="user", content="방금 보낸 메세지", created_at=datetime.utcnow()))
+            other.commit()
+
+    client = FakeOpenAI(on_summarize=new_message)
+    assert asyncio.run(compact_thread(db, client, thread, keep_recent=KEEP_RECENT)) is None
+
+    # 새 스레드는 지우고 기존 스레드와 메세지는 그대로 둠
+    assert client.deleted == ["thread_new_0"]
+    assert db.query(AssistantThread.thread_id).filter(AssistantThread.user_id == user_id).scalar() == "thread_old"
+    assert db.query(AssistantMessage).filter(AssistantMessage.thread_id == "thread_old").count() == MESSAGE_COUNT + 1
+    assert db.query(AssistantMemory).filter(AssistantMemory.user_id == user_id).first() is None
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from fastapi import HTTPException
+from models import User, AssistantThread, AssistantMessage
+from routers.assistant import get_messages_by_thread
+
+START = datetime(2026, 1, 1, 9, 0)
+# (초, 내용), 같은 시각에 저장된 메세지가 페이지 경계에 걸치도록 구성
+# 마지막 두개는 먼저 저장되었지만 created_at 은 더 늦음
+MESSAGES = [(0, "a"), (0, "b"), (0, "c"), (1, "d"), (1, "e"), (3, "h"), (3, "i"), (2, "f"), (2, "g")]
+ORDERED = ["a", "b", "c", "d", "e", "f", "g", "h", "i"]
+
+def add_user(db, name):
+    user = User(user_real_name="사용자", user_uuid=name, password_hash="-", user_type="senior")
+    db.add(user)
+    db.flush()
+    db.add(AssistantThread(thread_id=f"thread_{name}", user_id=user.user_id))
+    return user
+
+@pytest.fixture
+def user(db):
+    user = add_user(db, "user")
+    for seconds, content in MESSAGES:
+        db.add(AssistantMessage(thread_id="thread_user", sender_type="user", content=content, created_at=START + timedelta(seconds=seconds)))
+        db.flush()
+    db.commit()
+    return user
+
+def page(db, user, **kwargs):
+    return asyncio.run(get_messages_by_thread(None, user=user, db=db, **kwargs))
+
+def test_pages_backward_through_ties(db, user):
+    contents = []
+    messages = page(db, user, limit=2)
+    while messages:
+        contents = [message.content for message in messages] + contents
+        messages = page(db, user, before=messages[0].message_id, limit=2)
+    assert contents == ORDERED
+
+def test_pages_forward_through_ties(db, user):
+    first = page(db, user, limit=len(MESSAGES))[0]
+    contents = [first.content]
+    messages = page(db, user, after=first.message_id, limit=2)
+    while messages:
+        contents += [message.content for message in messages]
+        messages = page(db, user, after=messages[-1].message_id, limit=2)
+    assert contents == ORDERED
+
+def test_invalid_cursor(db, user):
+    other = add_user(db, "other")
+    db.add(AssistantMessage(thread_id="thread_other", sender_type="user", content="x", created_at=START))
+    db.commit()
+    other_message_id = db.query(AssistantMessage.message_id).filter(AssistantMessage.thread_id == "thread_other").scalar()
+
+    # 다른 사용자의 메세지는 커서로 사용할 수 없음
+    with pytest.raises(HTTPException) as error:
+        page(db, user, before=other_message_id)
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        page(db, user, before=1, after=2)
+    assert error.value.status_code == 400
+    assert [message.content for message in page(db, other)] == ["x"]
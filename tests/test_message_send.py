@@ -0,0 +1,135 @@
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import and_
+from sqlalchemy.orm import sessionmaker
+import message
+from models import User, ScheduledMessage
+
+# FCM 호출마다 FCM_LATENCY 초가 걸리는 messaging stub
+FCM_LATENCY = 0.002
+MESSAGE_COUNT = 600
+
+class FakeMessaging:
+    def __init__(self, failing_tokens=()):
+        self.failing_tokens = set(failing_tokens)
+        self.calls = 0
+        self.sent = 0
+
+    def Message(self, data, android, token):
+        return SimpleNamespace(data=data, token=token)
+
+    def AndroidConfig(self, **kwargs):
+        return SimpleNamespace(**kwargs)
+
+    def send(self, data):
+        self.calls += 1
+        time.sleep(FCM_LATENCY)
+        if data.token in self.failing_tokens:
+            raise ValueError("invalid token")
+        self.sent += 1
+        return "message-id"
+
+    def send_each(self, data):
+        assert len(data) <= message.FCM_BATCH_SIZE
+        self.calls += 1
+        time.sleep(FCM_LATENCY)
+        responses = [SimpleNamespace(success=item.token not in self.failing_tokens, exception=None) for item in data]
+        self.sent += sum(response.success for response in responses)
+        return SimpleNamespace(responses=responses)
+
+@pytest.fixture
+def messages(engine, monkeypatch):
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(message, "get_db", Session)
+    db = Session()
+    db.add_all([
+        User(user_id=i, user_real_name="사용자", user_uuid=f"user-{i}", password_hash="-", user_type="senior", fcm_token=f"token-{i}" if i % 100 else None)
+        for i in range(MESSAGE_COUNT)
+    ])
+    scheduled_time = datetime.now() - timedelta(seconds=1)
+    db.add_all([ScheduledMessage(user_id=i, title="알림", content="약 드실 시간이에요", scheduled_time=scheduled_time) for i in range(MESSAGE_COUNT)])
+    db.commit()
+    ids = [row[0] for row in db.query(ScheduledMessage.id).all()]
+    db.close()
+    return Session, ids
+
+def statuses(Session):
+    db = Session()
+    try:
+        result = {}
+        for (status,) in db.query(ScheduledMessage.status):
+            result[status] = result.get(status, 0) + 1
+        return result
+    finally:
+        db.close()
+
+# 배치 발송 이전 방식 : 메세지마다 messaging.send 와 commit
+def send_message_legacy(message_ids):
+    with message.get_db() as db:
+        rows = db.query(ScheduledMessage, User.fcm_token).join(User, User.user_id == ScheduledMessage.user_id).filter(
+            and_(ScheduledMessage.id.in_(message_ids), ScheduledMessage.status == 'pending')
+        ).all()
+        for scheduled, token in rows:
+            data = message.messaging.Message(
+                data={'type': 'showOverlay', 'title': scheduled.title, 'body': scheduled.content},
+                android=message.messaging.AndroidConfig(direct_boot_ok=True),
+                token=token,
+            )
+            try:
+                message.messaging.send(data)
+                scheduled.status = "sent"
+            except Exception:
+                scheduled.status = "failed"
+            db.commit()
+
+def run(statements, monkeypatch, send, ids, fake):
+    monkeypatch.setattr(message, "messaging", fake)
+    statements.count = 0
+    start = time.perf_counter()
+    send(ids)
+    return time.perf_counter() - start, statements.count
+
+def reset_pending(Session):
+    db = Session()
+    db.query(ScheduledMessage).update({"status": "pending"})
+    db.commit()
+    db.close()
+
+def test_batched_send_round_trips(statements, messages, monkeypatch):
+    Session, ids = messages
+    # 토큰이 없으면 FCM 에서 오류
+    legacy_fcm = FakeMessaging(failing_tokens={None})
+    _, legacy_sql = run(statements, monkeypatch, send_message_legacy, ids, legacy_fcm)
+    legacy_status = statuses(Session)
+
+    reset_pending(Session)
+    batched_fcm = FakeMessaging()
+    _, batched_sql = run(statements, monkeypatch, message.send_message, ids, batched_fcm)
+
+    # 토큰이 없는 사용자(100명 중 1명)의 메세지는 failed
+    assert legacy_status == statuses(Session) == {"sent": MESSAGE_COUNT - MESSAGE_COUNT // 100, "failed": MESSAGE_COUNT // 100}
+    assert legacy_fcm.calls == MESSAGE_COUNT
+    assert batched_fcm.calls == -(-MESSAGE_COUNT // message.FCM_BATCH_SIZE)
+    assert batched_sql < 20 < legacy_sql
+
+@pytest.mark.benchmark
+def test_batched_send_benchmark(statements, messages, monkeypatch):
+    Session, ids = messages
+    legacy_time, _ = run(statements, monkeypatch, send_message_legacy, ids, FakeMessaging(failing_tokens={None}))
+    reset_pending(Session)
+    batched_time, _ = run(statements, monkeypatch, message.send_message, ids, FakeMessaging())
+    assert batched_time < legacy_time / 4, f"per message {legacy_time:.2f} s, batched {batched_time:.2f} s"
+
+def test_failed_results_marked_and_not_resent(engine, messages, monkeypatch):
+    Session, ids = messages
+    fake = FakeMessaging(failing_tokens={"token-1", "token-2"})
+    monkeypatch.setattr(message, "messaging", fake)
+    message.send_message(ids)
+    assert statuses(Session) == {"sent": MESSAGE_COUNT - MESSAGE_COUNT // 100 - 2, "failed": MESSAGE_COUNT // 100 + 2}
+
+    # 이미 처리된 메세지는 다시 보내지 않음
+    calls = fake.calls
+    message.send_message(ids)
+    assert fake.calls == calls
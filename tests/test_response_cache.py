@@ -0,0 +1,51 @@
+import pytest
+from functions.response_cache import ResponseCache, classify
+
+def test_answers_are_not_shared_between_users():
+    cache = ResponseCache(enabled=True)
+    assert cache.store(1, "안녕 애비야", "안녕하세요 김영희 어르신")
+    assert cache.lookup(1, "안녕") == "안녕하세요 김영희 어르신"
+    assert cache.lookup(1, "애비야 안녕!") == "안녕하세요 김영희 어르신"
+    # 다른 사용자에게는 저장된 답변이 없음
+    assert cache.lookup(2, "안녕 애비야") is None
+    assert cache.stats()["users"] == 1
+
+def test_personal_and_tool_queries_bypass():
+    cache = ResponseCache(enabled=True)
+    assert not cache.store(1, "내 이름이 뭐야?", "김영희 어르신이에요")
+    assert not cache.store(1, "오늘 날씨 어때?", "맑아요")
+    assert cache.stats()["size"] == 0
+
+def test_least_recent_user_evicted():
+    cache = ResponseCache(enabled=True, max_users=2)
+    cache.store(1, "고마워", "천만에요 1")
+    cache.store(2, "고마워", "천만에요 2")
+    cache.lookup(1, "고마워")
+    cache.store(3, "고마워", "천만에요 3")
+    assert cache.lookup(1, "고마워") == "천만에요 1"
+    assert cache.lookup(2, "고마워") is None
+    assert cache.lookup(3, "고마워") == "천만에요 3"
+
+@pytest.mark.parametrize("text,intent", [
+    ("안녕 애비야", "greeting"),
+    ("좋은 아침이야", "greeting"),
+    ("정말 고마워요", "thanks"),
+    ("너는 누구야?", "identity"),
+    ("이름이 뭐야", "identity"),
+    ("너 뭘 할 수 있니", "help"),
+    # 인사말 단어가 들어있지만 다른 내용의 질문
+    ("대통령이 누구야", None),
+    ("그 사람 이름이 뭐야", None),
+    ("반가운 소식이 있어", None),
+    ("감사원은 뭐하는 곳이야", None),
+    ("안녕히 가세요 하고 인사했어", None),
+])
+def test_classify_whole_phrase(text, intent):
+    assert classify(text)[1] == intent
+
+def test_question_with_intent_word_not_cached():
+    cache = ResponseCache(enabled=True)
+    cache.store(1, "너는 누구야", "저는 애비예요")
+    assert not cache.store(1, "대통령이 누구야", "대통령은 ...")
+    assert cache.lookup(1, "대통령이 누구야") is None
+    assert cache.stats()["bypasses"] == {"intent": 1}
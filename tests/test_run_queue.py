@@ -0,0 +1,87 @@
+import asyncio
+from functions.run_queue import RunQueue
+
+RUN_TIME = 0.1
+
+# /assistant/message 와 같은 순서로 run_queue 사용
+async def request(queue: RunQueue, user_id, content, log, delay=0.0, resolve=True):
+    await asyncio.sleep(delay)
+    batch, leader = queue.join(user_id, content)
+    if batch is None:
+        return "BUSY"
+    if not leader:
+        return await batch.wait()
+    async with queue.run(user_id, batch) as merged:
+        log.append(("start", user_id, merged, asyncio.get_running_loop().time()))
+        await asyncio.sleep(RUN_TIME)
+        log.append(("end", user_id, merged, asyncio.get_running_loop().time()))
+        if resolve:
+            batch.resolve(f"reply:{merged}")
+    return f"reply:{merged}" if resolve else None
+
+def spans(log, user_id):
+    starts = [entry[3] for entry in log if entry[0] == "start" and entry[1] == user_id]
+    ends = [entry[3] for entry in log if entry[0] == "end" and entry[1] == user_id]
+    return list(zip(starts, ends))
+
+def test_serial_per_user_parallel_across_users():
+    async def main():
+        queue = RunQueue(merge_window=0)
+        log = []
+        results = await asyncio.gather(
+            request(queue, 1, "a", log),
+            request(queue, 1, "b", log, delay=0.01),
+            request(queue, 2, "x", log, delay=0.02),
+        )
+        return queue, log, results
+    queue, log, results = asyncio.run(main())
+
+    assert results == ["reply:a", "reply:b", "reply:x"]
+    # 같은 사용자의 실행은 겹치지 않고 들어온 순서대로
+    (a_start, a_end), (b_start, b_end) = spans(log, 1)
+    assert [entry[2] for entry in log if entry[0] == "start" and entry[1] == 1] == ["a", "b"]
+    assert b_start >= a_end
+    # 다른 사용자는 앞선 실행을 기다리지 않음
+    (x_start, _), = spans(log, 2)
+    assert x_start < a_end
+    assert queue._locks == {} and queue._batches == {}
+
+def test_merge_window():
+    async def main():
+        queue = RunQueue(merge_window=0.05)
+        log = []
+        results = await asyncio.gather(
+            request(queue, 1, "a", log),
+            request(queue, 1, "b", log, delay=0.01),
+            request(queue, 1, "c", log, delay=0.02),
+            # 첫 실행 중에 들어온 요청들은 다음 실행 하나로 합쳐짐
+            request(queue, 1, "d", log, delay=0.1),
+            request(queue, 1, "e", log, delay=0.12),
+        )
+        return queue, log, results
+    queue, log, results = asyncio.run(main())
+
+    assert [entry[2] for entry in log if entry[0] == "start"] == ["a\nb\nc", "d\ne"]
+    assert results == ["reply:a\nb\nc"] * 3 + ["reply:d\ne"] * 2
+    assert queue._locks == {} and queue._batches == {}
+
+def test_max_waiting_returns_busy():
+    async def main():
+        queue = RunQueue(merge_window=0, max_waiting=3)
+        log = []
+        return await asyncio.gather(*[request(queue, 1, str(i), log, delay=i * 0.01) for i in range(5)])
+    results = asyncio.run(main())
+    assert results == ["reply:0", "reply:1", "reply:2", "BUSY", "BUSY"]
+
+def test_followers_get_none_when_leader_fails():
+    async def main():
+        queue = RunQueue(merge_window=0.05)
+        log = []
+        results = await asyncio.gather(
+            request(queue, 1, "a", log, resolve=False),
+            request(queue, 1, "b", log, delay=0.01),
+        )
+        return queue, results
+    queue, results = asyncio.run(main())
+    assert results == [None, None]
+    assert queue._locks == {} and queue._batches == {}
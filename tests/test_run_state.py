@@ -0,0 +1,85 @@
+import asyncio
+import time
+from types import SimpleNamespace
+import pytest
+from openai import OpenAIError
+from models import User, AssistantThread, AssistantMessage
+from functions.run_state import RunStateStore
+from routers import assistant
+
+# 도구 호출이 한번 있는 run 의 스트림 이벤트 순서, 두번째 값은 DB 에 저장해야 하는지
+RUN_EVENTS = [
+    ("thread.run.queued", False),
+    ("thread.run.created", True),
+    ("thread.run.in_progress", False),
+    ("thread.run.step.created", False),
+    ("thread.message.delta", False),
+    ("thread.run.requires_action", True),
+    ("thread.run.in_progress", False),
+    ("thread.run.in_progress", False),
+    ("thread.run.step.completed", False),
+    ("thread.run.completed", True),
+]
+
+def test_only_transitions_persisted():
+    store = RunStateStore()
+    assert [store.set("thread", state) for state, _ in RUN_EVENTS] == [persist for _, persist in RUN_EVENTS]
+
+@pytest.mark.parametrize("state", ["thread.run.completed", "thread.run.failed", "thread.run.cancelled", "thread.run.expired", "thread.run.incomplete"])
+def test_finished_run_dropped(state):
+    store = RunStateStore()
+    store.set("thread", "thread.run.in_progress")
+    assert store.is_active("thread")
+    assert store.set("thread", state)
+    assert not store.is_active("thread")
+    assert store._states == {}
+
+def test_stale_active_state_expires():
+    store = RunStateStore(timeout=0.05)
+    store.set("thread", "thread.run.in_progress")
+    assert store.is_active("thread")
+    time.sleep(0.06)
+    assert not store.is_active("thread")
+
+class FakeMessages:
+    def __init__(self, error=None):
+        self.error = error
+        self.created = []
+
+    async def create(self, thread_id, role, content):
+        if self.error is not None:
+            raise self.error
+        self.created.append((thread_id, content))
+
+@pytest.fixture
+def user_thread(db, monkeypatch):
+    monkeypatch.setattr(assistant, "run_state_store", RunStateStore())
+    user = User(user_real_name="사용자", user_uuid="user", password_hash="-", user_type="senior")
+    db.add(user)
+    db.flush()
+    db.add(AssistantThread(thread_id="thread_1", user_id=user.user_id))
+    db.commit()
+    return user
+
+def use_messages(monkeypatch, messages):
+    monkeypatch.setattr(assistant, "client", SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(messages=messages))))
+
+def test_admission_while_run_active(db, user_thread, monkeypatch):
+    messages = FakeMessages()
+    use_messages(monkeypatch, messages)
+
+    thread, response = asyncio.run(assistant.add_user_message(None, "안녕", user_thread, db))
+    assert thread.thread_id == "thread_1" and response is None
+    # 응답이 끝나기 전에 들어온 요청은 실행하지 않음
+    assert asyncio.run(assistant.add_user_message(None, "날씨 알려줘", user_thread, db)) == (None, assistant.BUSY_RESPONSE)
+    assert messages.created == [("thread_1", "안녕")]
+
+    assistant.run_state_store.set("thread_1", "thread.run.completed")
+    thread, response = asyncio.run(assistant.add_user_message(None, "날씨 알려줘", user_thread, db))
+    assert response is None
+    assert db.query(AssistantMessage).filter(AssistantMessage.thread_id == "thread_1").count() == 2
+
+def test_admission_released_when_message_fails(db, user_thread, monkeypatch):
+    use_messages(monkeypatch, FakeMessages(error=OpenAIError("unavailable")))
+    assert asyncio.run(assistant.add_user_message(None, "안녕", user_thread, db)) == (None, assistant.FAILED_RESPONSE)
+    assert not assistant.run_state_store.is_active("thread_1")
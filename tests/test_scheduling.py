@@ -0,0 +1,39 @@
+from datetime import datetime, date, time, timedelta
+from sqlalchemy.orm import sessionmaker
+import message
+from models import User, UserSchedule, MedicationReminder, ScheduledMessage
+
+def add_user(db, user_id, fcm_token):
+    db.add(User(user_id=user_id, user_real_name="사용자", user_uuid=f"user-{user_id}", password_hash="-", user_type="senior", fcm_token=fcm_token))
+
+def test_default_schedule_and_medication_messages(engine, monkeypatch):
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(message, "get_db", Session)
+    monkeypatch.setattr(message.dispatcher, "notify", lambda: None)
+
+    db = Session()
+    add_user(db, 1, "token-1") # 식사 시간 없음 -> 기본값 추가
+    add_user(db, 2, "token-2") # 식사 시간 등록됨
+    add_user(db, 3, None)      # 토큰 없음 -> 알림 대상 아님
+    db.add(UserSchedule(user_id=2, morning_time=time(6, 0), breakfast_time=time(7, 0), lunch_time=time(11, 0), dinner_time=time(17, 0), bedtime_time=time(21, 0)))
+    today = date.today()
+    doses = {field: False for field in message.MEDICATION_TIMES}
+    for user_id in (1, 2):
+        db.add(MedicationReminder(user_id=user_id, content="혈압약", start_date=today - timedelta(days=1), end_date=today + timedelta(days=1), **{**doses, "dose_morning": True}))
+    db.commit()
+
+    before = datetime.utcnow()
+    message.scheduling_messages()
+
+    db.expire_all()
+    schedules = {schedule.user_id: schedule for schedule in db.query(UserSchedule)}
+    assert set(schedules) == {1, 2}
+    assert schedules[1].morning_time == message.DEFAULT_USER_SCHEDULE["morning_time"]
+    # 한번에 추가한 기본값도 ORM 으로 만든 행처럼 생성/수정 시각이 있어야 함
+    assert schedules[1].created_at is not None and schedules[1].created_at >= before - timedelta(seconds=1)
+    assert schedules[1].updated_at == schedules[1].created_at
+    assert schedules[2].morning_time == time(6, 0)
+
+    scheduled = {row.user_id: row.scheduled_time.time() for row in db.query(ScheduledMessage)}
+    assert scheduled == {1: time(7, 30), 2: time(6, 0)}
+    db.close()
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+from sqlalchemy.orm import sessionmaker
+from functions import tools
+from functions.context import ToolContext
+from functions.tools import ToolRegistry, CONCURRENCY_LIMITS
+from routers import assistant
+
+CONTEXT = ToolContext(thread_id="thread", user_id=1)
+
+class Concurrency:
+    # 동시에 실행중인 tool 수 (스레드에서 실행되는 동기 tool 포함)
+    def __init__(self):
+        self.current = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        with self._lock:
+            self.current += 1
+            self.max = max(self.max, self.current)
+
+    def __exit__(self, *exc_info):
+        with self._lock:
+            self.current -= 1
+
+@pytest.fixture
+def registry(engine, monkeypatch):
+    # 동기 tool 이 스레드에서 여는 세션도 테스트 DB 사용
+    monkeypatch.setattr(tools, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    return ToolRegistry()
+
+def call_all(registry, calls):
+    async def main():
+        semaphores = registry.semaphores()
+        return await asyncio.gather(*[registry.call(name, None, CONTEXT, arguments, semaphores) for name, arguments in calls])
+    return asyncio.run(main())
+
+def test_unknown_tool(registry):
+    result = asyncio.run(registry.call("deleteEverything", None, CONTEXT, {}))
+    assert result["status"] == "error" and result["data"] == {"tool": "deleteEverything"}
+
+def test_exception_returns_error(registry):
+    @registry.register()
+    async def broken(db=None, context=None):
+        raise ValueError("잘못된 응답")
+
+    result = asyncio.run(registry.call("broken", None, CONTEXT, {}))
+    assert result == {"status": "error", "message": "broken 실행 중 오류가 발생했습니다: 잘못된 응답", "data": {"tool": "broken"}}
+    assert registry.stats()["broken"]["errors"] == 1
+
+def test_per_tool_timeout(registry):
+    @registry.register(timeout=0.05)
+    async def slow(db=None, context=None):
+        await asyncio.sleep(1)
+
+    @registry.register(timeout=0.05)
+    def slow_sync(db=None, context=None):
+        time.sleep(0.2)
+
+    @registry.register(timeout=1.0)
+    async def fast(db=None, context=None):
+        await asyncio.sleep(0.1)
+        return {"status": "00"}
+
+    start = time.perf_counter()
+    results = call_all(registry, [("slow", {}), ("slow_sync", {}), ("fast", {})])
+    # 스레드에서 실행중인 동기 tool 은 끝날 때까지 기다리지 않음
+    assert time.perf_counter() - start < 0.5
+    assert results[0] == {"status": "timeout", "message": "slow 응답 시간이 초과되었습니다.", "data": {"tool": "slow", "timeout": 0.05}}
+    assert results[1]["status"] == "timeout"
+    assert results[2] == {"status": "00"}
+    assert registry.stats()["slow"]["timeouts"] == registry.stats()["slow_sync"]["timeouts"] == 1
+
+def test_concurrency_limits(registry):
+    running = {name: Concurrency() for name in CONCURRENCY_LIMITS}
+
+    @registry.register()
+    async def io_tool(db=None, context=None):
+        with running["io"]:
+            await asyncio.sleep(0.02)
+
+    @registry.register()
+    def db_tool(db=None, context=None):
+        with running["db"]:
+            time.sleep(0.02)
+
+    @registry.register(concurrency="device")
+    def device_tool(db=None, context=None):
+        with running["device"]:
+            time.sleep(0.02)
+
+    assert [registry.get(name).concurrency for name in ("io_tool", "db_tool", "device_tool")] == ["io", "db", "device"]
+    call_all(registry, [(name, {}) for name in ("io_tool", "db_tool", "device_tool") for _ in range(8)])
+    assert {name: counter.max for name, counter in running.items()} == CONCURRENCY_LIMITS
+
+def test_unknown_concurrency_rejected(registry):
+    with pytest.raises(ValueError):
+        @registry.register(concurrency="gpu")
+        async def render(db=None, context=None):
+            pass
+
+def test_cache_by_thread_and_arguments(registry):
+    calls = []
+
+    @registry.register(cacheable=True, cache_ttl=60)
+    async def forecast(city: str, db=None, context=None):
+        calls.append(city)
+        return {"status": "00" if city != "없는곳" else "104", "data": city}
+
+    async def main():
+        for city in ("서울", "서울", "부산", "없는곳", "없는곳"):
+            await registry.call("forecast", None, CONTEXT, {"city": city})
+        await registry.call("forecast", None, ToolContext(thread_id="other"), {"city": "서울"})
+
+    asyncio.run(main())
+    # 실패한 결과는 캐시하지 않고, 스레드가 다르면 따로 호출
+    assert calls == ["서울", "부산", "없는곳", "없는곳", "서울"]
+    assert registry.stats()["forecast"]["cache_hits"] == 1
+
+def test_cache_by_location(registry):
+    # 날씨, 병원 검색처럼 context 의 위치를 사용하는 tool
+    locations = []
+
+    @registry.register(cacheable=True, cache_ttl=60)
+    async def nearby(db=None, context=None):
+        locations.append((context.latitude, context.longitude))
+        return {"status": "00"}
+
+    async def main():
+        for latitude, longitude in ((37.5, 127.0), (37.50001, 127.00001), (35.1, 129.0), (37.5, 127.0)):
+            await registry.call("nearby", None, ToolContext(thread_id="thread", latitude=latitude, longitude=longitude), {})
+
+    asyncio.run(main())
+    # 위치를 옮기면 다시 호출하고, 거의 같은 위치는 캐시 사용
+    assert locations == [(37.5, 127.0), (35.1, 129.0)]
+
+def test_definitions(registry):
+    @registry.register(description="예보 조회")
+    async def forecast(city: str, days=3, db=None, context=None):
+        pass
+
+    assert registry.definitions() == [{
+        "type": "function",
+        "function": {
+            "name": "forecast",
+            "description": "예보 조회",
+            "parameters": {"type": "object", "properties": {"city": {"type": "string"}, "days": {"type": "integer"}}, "required": ["city"]},
+        },
+    }]
+
+def test_sync_assistant_tools(monkeypatch, registry):
+    @registry.register(description="예보 조회")
+    async def forecast(city: str, db=None, context=None):
+        pass
+
+    updates = []
+
+    async def retrieve(assistant_id):
+        return SimpleNamespace(tools=[
+            SimpleNamespace(type="file_search", model_dump=lambda exclude_none: {"type": "file_search"}),
+            SimpleNamespace(type="function", model_dump=lambda exclude_none: {"type": "function", "function": {"name": "removed"}}),
+        ])
+
+    async def update(assistant_id, tools):
+        updates.append(tools)
+
+    monkeypatch.setattr(assistant, "tool_registry", registry)
+    monkeypatch.setattr(assistant, "client", SimpleNamespace(beta=SimpleNamespace(assistants=SimpleNamespace(retrieve=retrieve, update=update))))
+    assert asyncio.run(assistant.sync_assistant_tools(assistant.ADMIN_PASSWORD)) == {"tools": ["forecast"]}
+    # function 이 아닌 tool 은 유지하고 function 목록은 등록된 tool 로 교체
+    assert updates == [[{"type": "file_search"}] + registry.definitions()]
@@ -0,0 +1,157 @@
+import asyncio
+from datetime import datetime
+import httpx
+import pytest
+from functions import http_client, weather
+from functions.cache import ForecastCache
+from functions.http_client import AsyncHttpClient
+from functions.weather import KMA_BASE_URL, FORECAST_ATTEMPTS, FORECAST_HEDGE, requestUltraSrtFcst, fetchUltraSrtFcst
+
+ROUNDED_TIME = datetime(2026, 1, 1, 10, 30)
+
+def forecast_body(base_time: str, result_code: str = "00", result_msg: str = "NORMAL_SERVICE"):
+    items = "" if result_code != "00" else "".join(
+        f"<item><baseDate>20260101</baseDate><baseTime>{base_time}</baseTime><category>{category}</category>"
+        f"<fcstDate>20260101</fcstDate><fcstTime>1100</fcstTime><fcstValue>{value}</fcstValue><nx>60</nx><ny>127</ny></item>"
+        for category, value in (("T1H", "-2"), ("WSD", "3.0"), ("SKY", "1"))
+    )
+    return (
+        f"<response><header><resultCode>{result_code}</resultCode><resultMsg>{result_msg}</resultMsg></header>"
+        f"<body><dataType>XML</dataType><items>{items}</items></body></response>"
+    ).encode()
+
+class KmaStub:
+    """
+    base_time 별 응답을 정해두는 초단기예보 mock
+    responses : base_time -> 응답 함수, 없는 base_time 은 NO_DATA
+    """
+    def __init__(self, responses=None, latency=0.01):
+        self.responses = responses or {}
+        self.latency = latency
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, request: httpx.Request):
+        base_time = request.url.params["base_time"]
+        self.requests.append(base_time)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency.get(base_time, 0.01) if isinstance(self.latency, dict) else self.latency)
+            respond = self.responses.get(base_time)
+            if respond is None:
+                return httpx.Response(200, content=forecast_body(base_time, "03", "NO_DATA"))
+            return respond(request)
+        finally:
+            self.in_flight -= 1
+
+def kma(stub, retries=1):
+    return AsyncHttpClient(base_url=KMA_BASE_URL, retries=retries, backoff=0.01, transport=httpx.MockTransport(stub))
+
+def valid(base_time):
+    return lambda request: httpx.Response(200, content=forecast_body(base_time))
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    # 재시도 간격 기록
+    delays = []
+    sleep = asyncio.sleep
+    async def record(delay, *args, **kwargs):
+        delays.append(delay)
+        return await sleep(0)
+    monkeypatch.setattr(http_client.asyncio, "sleep", record)
+    return delays
+
+def test_retry_with_backoff(sleeps):
+    statuses = [503, 429, 200]
+    def handler(request):
+        return httpx.Response(statuses.pop(0), content=b"ok")
+    client = AsyncHttpClient(base_url="http://stub", retries=2, backoff=0.2, transport=httpx.MockTransport(handler))
+    response = asyncio.run(client.get("/"))
+    assert response.status_code == 200 and statuses == []
+    assert sleeps == [0.2, 0.4]
+
+def test_last_retry_status_returned(sleeps):
+    calls = []
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+    client = AsyncHttpClient(base_url="http://stub", retries=1, transport=httpx.MockTransport(handler))
+    assert asyncio.run(client.get("/")).status_code == 503
+    assert len(calls) == 2
+
+def test_non_retry_status_not_retried(sleeps):
+    calls = []
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(404)
+    client = AsyncHttpClient(base_url="http://stub", retries=2, transport=httpx.MockTransport(handler))
+    assert asyncio.run(client.get("/")).status_code == 404
+    assert len(calls) == 1 and sleeps == []
+
+def test_transport_error_raised_after_retries(sleeps):
+    calls = []
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("refused", request=request)
+    client = AsyncHttpClient(base_url="http://stub", retries=1, transport=httpx.MockTransport(handler))
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.get("/"))
+    assert len(calls) == 2
+
+def raise_error(error):
+    def respond(request):
+        raise error("failed", request=request)
+    return respond
+
+@pytest.mark.parametrize("respond,expected", [
+    (raise_error(httpx.ReadTimeout), ("103", "API request timed out")),
+    (raise_error(httpx.ConnectError), ("103", "API request failed: failed")),
+    (lambda request: httpx.Response(500), ("103", "API request failed with status 500")),
+    (lambda request: httpx.Response(200, content=b"<html>maintenance"), ("102", "Failed to parse XML response")),
+    (lambda request: httpx.Response(200, content=b"<OpenAPI_ServiceResponse><cmmMsgHeader><returnReasonCode>22</returnReasonCode></cmmMsgHeader></OpenAPI_ServiceResponse>"), ("102", "Failed to parse XML response")),
+    (lambda request: httpx.Response(200, content=forecast_body("1030", "03", "NO_DATA")), ("03", "NO_DATA")),
+])
+def test_request_error_codes(sleeps, respond, expected):
+    stub = KmaStub({"1030": respond})
+    assert asyncio.run(requestUltraSrtFcst(60, 127, ROUNDED_TIME, kma(stub))) == (None, expected)
+
+def test_newest_base_time_preferred():
+    # 이전 발표시각 응답이 먼저 와도 최신 발표시각 결과를 사용하고, 그 이상은 조회하지 않음
+    stub = KmaStub({"1030": valid("1030"), "1000": valid("1000")}, latency={"1030": 0.05, "1000": 0.01})
+    weather_summary, error = asyncio.run(fetchUltraSrtFcst(60, 127, ROUNDED_TIME, kma(stub)))
+    assert error is None and weather_summary["T1H"] == {"20260101_1100": "-2"}
+    assert stub.requests == ["1030", "1000"][:FORECAST_HEDGE]
+
+def test_falls_back_to_previous_base_time():
+    # 최신 발표가 아직 없으면 이전 발표시각 결과, 동시에 조회하는 발표시각은 FORECAST_HEDGE 개 이하
+    stub = KmaStub({"0930": valid("0930")})
+    weather_summary, error = asyncio.run(fetchUltraSrtFcst(60, 127, ROUNDED_TIME, kma(stub)))
+    assert error is None and weather_summary is not None
+    assert stub.requests[:3] == ["1030", "1000", "0930"]
+    assert len(stub.requests) <= 3 + FORECAST_HEDGE - 1
+    assert stub.max_in_flight <= FORECAST_HEDGE
+
+def test_no_valid_base_time(sleeps):
+    stub = KmaStub()
+    assert asyncio.run(fetchUltraSrtFcst(60, 127, ROUNDED_TIME, kma(stub))) == (None, ("104", "No valid weather data found after attempts"))
+    assert len(stub.requests) == FORECAST_ATTEMPTS
+    assert stub.max_in_flight <= FORECAST_HEDGE
+
+def test_prefetch_limits_requests(monkeypatch, tmp_path):
+    # 짝수 격자는 최신 발표가 있고, 홀수 격자는 바로 이전 발표시각만 있음
+    def newest(request):
+        if int(request.url.params["nx"]) % 2:
+            return httpx.Response(200, content=forecast_body("1030", "03", "NO_DATA"))
+        return httpx.Response(200, content=forecast_body("1030"))
+    stub = KmaStub({"1030": newest, "1000": valid("1000")})
+    monkeypatch.setattr(weather, "forecast_cache", ForecastCache(cache_dir=str(tmp_path)))
+    monkeypatch.setattr(weather, "AsyncHttpClient", lambda **kwargs: AsyncHttpClient(transport=httpx.MockTransport(stub), **kwargs))
+
+    grids = [(nx, 127) for nx in range(40)]
+    warmed = asyncio.run(weather.prefetchForecasts(grids, concurrency=4, current_time=datetime(2026, 1, 1, 10, 47)))
+    assert warmed == 40
+    # 격자마다 최대 PREFETCH_ATTEMPTS 번, 전체 동시 요청은 concurrency 이하
+    assert sorted(stub.requests) == sorted(["1030"] * 40 + ["1000"] * 20)
+    assert stub.max_in_flight <= 4
@@ -0,0 +1,71 @@
+import timeit
+import xml.etree.ElementTree as ET
+import pytest
+from functions.weather import parseWeatherXml, scanForecastItems
+
+# 단기예보(getVilageFcst) 응답과 같은 형식의 266개 item 응답
+CATEGORIES = [
+    ("TMP", "-3"), ("UUU", "1.1"), ("VVV", "-2"), ("VEC", "200"), ("WSD", "4.2"), ("SKY", "1"),
+    ("PTY", "0"), ("POP", "20"), ("WAV", "0"), ("PCP", "강수없음"), ("REH", "60"), ("SNO", "적설없음"),
+]
+
+def forecast_response(rows: int = 266):
+    items = []
+    hour = 0
+    while len(items) < rows:
+        for category, value in CATEGORIES:
+            if len(items) == rows:
+                break
+            items.append(
+                f"<item><baseDate>20260101</baseDate><baseTime>0500</baseTime><category>{category}</category>"
+                f"<fcstDate>2026010{1 + hour // 24}</fcstDate><fcstTime>{(hour % 24) * 100:04d}</fcstTime>"
+                f"<fcstValue>{value}</fcstValue><nx>60</nx><ny>127</ny></item>"
+            )
+        hour += 1
+    return (
+        "<response><header><resultCode>00</resultCode><resultMsg>NORMAL_SERVICE</resultMsg></header>"
+        f"<body><dataType>XML</dataType><items>{''.join(items)}</items><numOfRows>{rows}</numOfRows></body></response>"
+    ).encode()
+
+# 이전 parseWeatherData (item 마다 find 4번, 시각마다 체감온도 계산)
+def calc_temp_legacy(tmp, wind_speed):
+    return 13.12 + 0.6215 * float(tmp) - 11.37 * (float(wind_speed) ** 0.16) + 0.3965 * float(tmp) * (float(wind_speed) ** 0.16)
+
+def parse_legacy(content: bytes):
+    root = ET.fromstring(content)
+    weather_summaries = {}
+    for item in root.find('.//items').findall('item'):
+        category = item.find('category').text
+        datetime_key = f"{item.find('fcstDate').text}_{item.find('fcstTime').text}"
+        weather_summaries.setdefault(category, {})[datetime_key] = item.find('fcstValue').text
+    for datetime_key in weather_summaries.get('TMP', {}):
+        temp = float(weather_summaries['TMP'][datetime_key])
+        wind_speed = float(weather_summaries.get('WSD', {}).get(datetime_key, 0))
+        weather_summaries.setdefault('WCI', {})[datetime_key] = round(calc_temp_legacy(temp, wind_speed), 2)
+    return root.findtext('header/resultCode'), root.findtext('header/resultMsg'), weather_summaries
+
+def test_parse_matches_legacy_parser():
+    content = forecast_response()
+    assert parseWeatherXml(content) == parse_legacy(content)
+
+def test_scan_falls_back_to_tree():
+    indented = forecast_response(24).replace(b"><", b">\n  <")
+    assert scanForecastItems(indented) is not None
+    assert parseWeatherXml(indented) == parse_legacy(indented)
+
+    # 엔티티가 들어간 값이나 오류 응답은 ElementTree 로 처리
+    escaped = forecast_response(24).replace("강수없음".encode(), b"1.0mm &lt; 2.0mm")
+    assert scanForecastItems(escaped) is None
+    assert parseWeatherXml(escaped) == parse_legacy(escaped)
+    assert "1.0mm < 2.0mm" in parseWeatherXml(escaped)[2]["PCP"].values()
+    error = "<OpenAPI_ServiceResponse><cmmMsgHeader><errMsg>SERVICE ERROR</errMsg><returnReasonCode>22</returnReasonCode></cmmMsgHeader></OpenAPI_ServiceResponse>".encode()
+    assert scanForecastItems(error) is None
+    assert parseWeatherXml(error) == (None, None, {})
+
+@pytest.mark.benchmark
+def test_parse_benchmark():
+    content = forecast_response()
+    legacy = min(timeit.repeat(lambda: parse_legacy(content), number=100, repeat=5)) / 100
+    current = min(timeit.repeat(lambda: parseWeatherXml(content), number=100, repeat=5)) / 100
+    # 측정 편차를 고려해서 여유있게 확인 (로컬 측정 약 3.4배)
+    assert current < legacy * 0.6, f"legacy {legacy * 1e6:.0f} us, current {current * 1e6:.0f} us"
@@ -0,0 +1,16 @@
+# local only, not committed
+class _Variables:
+    ACCESS_TOKEN_EXPIRE_MINUTES = 30
+    REFRESH_TOKEN_EXPIRE_DAYS = 7
+    ALGORITHM = "HS256"
+    HASH_KEY = "local"
+    KDATA_KEY = "local"
+    WEATHER_KEY = "local"
+    MYSQL_HOST = "localhost"
+    MYSQL_PORT = 3306
+    MYSQL_USER = "local"
+    MYSQL_PASSWORD = "local"
+    OPENAI_API_KEY = "sk-local"
+    OPENAI_ASSISTANT_ID = "asst_local"
+    ORIGINS = ["*"]
+variables = _Variables()